@@ -4,16 +4,94 @@
 Markdownで書かれたテスト項目書をエクセルファイルに変換します。
 
 Usage:
-    MdToExcel.py [-f] <file>... [-m]
+    MdToExcel.py [-f] <file>... [-m] [--split-rows <n>] [--workers <n>] [--row-ranges <n>] [--engine <engine>] [--reproducible] [--diag-json <json>] [--pipeline-stats]
+    MdToExcel.py --manifest <manifest> [--summary <json>]
+    MdToExcel.py --changed-since <rev> [--md-dir <dir>] [--manifest <manifest>] [--summary <json>]
+    MdToExcel.py --update <workbook> <file>... [--output <xlsm>]
+    MdToExcel.py --export <dir> <file>... [--export-format <fmt>] [--workers <n>]
+    MdToExcel.py --preview <dir> <file>... [--split-rows <n>]
+    MdToExcel.py --rollup <file>... [--workers <n>] [--rollup-json <json>]
+    MdToExcel.py --merge <file>... --output <xlsm> [--workers <n>] [--limit <n>] [--merge-json <json>]
+    MdToExcel.py --index <db> <file>...
+    MdToExcel.py --search <db> <query> [--field <field>] [--limit <n>] [--json]
+    MdToExcel.py --roundtrip-check <file>... [--workers <n>] [--engine <engine>] [--roundtrip-json <json>]
+    MdToExcel.py --fmt <file>... [--check] [--workers <n>]
+    MdToExcel.py --duplicates <file>... [--threshold <t>] [--limit <n>] [--duplicates-json <json>]
+    MdToExcel.py --serve [--host <host>] [--port <port>] [--workers <n>] [--queue <n>] [--timeout <sec>]
 
 Options:
     -f, --file             入力ファイルパス
+    --split-rows <n>       1シートの行数の目安。超えた章はテスト観点（# / ##）の区切りで
+                           複数のシートに分割する（0 は分割しない） [default: 0]
+    --workers <n>          テスト項目シートを並列に生成するワーカープロセス数 [default: 1]
+    --row-ranges <n>       1シートの行を n 個の行範囲に分割し、行範囲ごとに --workers の
+                           ワーカープロセスで並列に生成する（1 は分割しない） [default: 1]
+    --engine <engine>      Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+                           xlsxwriter はシートを1行ずつ書き出すため、大きなブックを速く少ないメモリで
+                           生成できる（XlsxWriter が必要、--workers と --row-ranges は使わない） [default: openpyxl]
+    --reproducible         同じ入力・設定・テンプレートから常に同じバイト列のブックを出力する
+                           （ZIP の日時とエントリの順、ブックの作成・更新日時を固定する）
+    --diag-json <json>     警告を JSON（コード、ファイル、行番号、付加情報、メッセージ）で保存する
+    --pipeline-stats       変換のステージ（読み込み、解析、シートの生成、保存）ごとの処理時間と
+                           稼働率を表示する（稼働率の最も高いステージがボトルネック）
+    --manifest <manifest>  複数の変換をまとめて実行するジョブ定義ファイル
+                           （JSON / YAML / 改行区切りのファイルパス、`-` で標準入力から読み込む）
+    --summary <json>       ジョブごとの実行結果を JSON で保存する
+    --changed-since <rev>  指定したリビジョンから変更された Markdown ファイルのみ変換する
+                           （--manifest を指定した場合、変更された章を含むブックのみ再生成する）
+    --md-dir <dir>         --changed-since で対象とする Markdown フォルダ [default: markdown]
+    --update <workbook>    実施済みの Excel テスト項目書を Markdown の仕様で更新する
+                           （変更のない項目の実施結果を引き継ぐ）
+    --output <xlsm>        --update、--merge の保存先（--update で省略した場合は上書き保存する）
+    --export <dir>         Markdown のテスト項目表を分析用のファイル（items, test_intentions）に
+                           書き出す（フォルダを指定した場合はフォルダ内の Markdown をすべて対象にする）
+    --export-format <fmt>  --export の出力形式（parquet / csv / jsonl、省略時は pyarrow があれば
+                           parquet、なければ csv）
+    --preview <dir>        Markdown（フォルダを指定した場合はフォルダ内の Markdown すべて）を、
+                           Excel のテスト項目シートと同じ配置の HTML に変換して保存する
+                           （章ごとの HTML と一覧の index.html、Excel を開かずにレビューする場合に使う）
+    --rollup               実施済みの Excel テスト項目書（フォルダを指定した場合はフォルダ内の
+                           ブックすべて）の実施状況を、章・テスト環境枠・テスト観点ごとに集計する
+    --rollup-json <json>   --rollup の集計結果を JSON で保存する
+    --merge                同じ Excel テスト項目書をコピーして実施した複数のブック（フォルダを指定した
+                           場合はフォルダ内のブックすべて）の実施結果を、先頭のブックを基準に1つのブックに
+                           まとめる（同じセルに異なる値がある場合は先のブックの値を採用し、競合として表示する）
+    --merge-json <json>    --merge の競合を JSON で保存する
+    --index <db>           Markdown のテスト項目の全文検索の索引（SQLite）を作成・更新する
+                           （フォルダを指定した場合はフォルダ内の Markdown をすべて対象にし、
+                           内容が変更されたファイルのみ読み込み直す）
+    --search <db>          索引からテスト項目を検索する（空白区切りの語をすべて含む項目）
+    --field <field>        --search で検索する列（path / environment / precondition / steps /
+                           expected / notes、省略時はすべての列）
+    --limit <n>            --search で表示する項目数、--duplicates で表示するグループ数、
+                           および --merge で表示する競合の上限
+                           （0 は無制限） [default: 20]
+    --json                 --search の結果を JSON で出力する
+    --roundtrip-check      Markdown（フォルダを指定した場合はフォルダ内の Markdown すべて）を
+                           Excel に変換して Markdown に逆変換し、変換前と変換後の差分を章ごとに表示する
+                           （メモリ上で変換し、ファイルは保存しない）
+    --roundtrip-json <json>  --roundtrip-check の結果を JSON で保存する
+    --fmt                  Markdown（フォルダを指定した場合はフォルダ内の Markdown すべて）を、
+                           Excel に変換する内容を変えずに正規の書き方（手順の番号、改行の記号、
+                           行末の空白）に整形して上書きする
+    --check                --fmt で上書きせず、整形が必要な章がある場合は終了コード 1 を返す
+    --duplicates           Markdown（フォルダを指定した場合はフォルダ内の Markdown すべて）から、
+                           手順と確認が一致する、または似ているテスト項目を探す
+    --threshold <t>        --duplicates で似ているとみなす類似度（0 - 1、1 は一致のみ） [default: 0.8]
+    --duplicates-json <json>  --duplicates の結果を JSON で保存する
+    --serve                変換を HTTP で受け付けるサーバーとして起動する
+                           （--workers のワーカープロセスで変換する）
+    --host <host>          --serve で待ち受けるアドレス [default: 127.0.0.1]
+    --port <port>          --serve で待ち受けるポート [default: 8080]
+    --queue <n>            --serve で実行中の変換に加えて待機させる変換の上限 [default: 16]
+    --timeout <sec>        --serve の1件あたりの変換のタイムアウト（秒） [default: 120]
 
 Requirements:
     - pandas
     - openpyxl 3.0.0 or higher
     - PyYAML 5.0.0 or higher
     - docopt
+    - XlsxWriter（--engine xlsxwriter を指定する場合のみ）
 
 Notes:
     - 変換するMarkdownは以下の形式で記述してください
@@ -44,6 +122,10 @@ __date__ = "5 June 2024"
 
 import os
 import sys
+import glob
+import json
+import time
+import multiprocessing
 
 try:
     import yaml
@@ -60,84 +142,472 @@ assert (
     openpyxl.__version__ >= "3.0.0"
 ), "This program requires openpyxl>=3.0.0.\b$ pip install openpyxl==3.0.5"
 
-from markdown_operator import convert_md_to_df, convert_df_to_md
-from excel_operator import convert_df_to_excel, convert_excel_to_df
-from warningMsgProvider import MainAppStatus, WarningMsgProvider
-warning_msg_provider = WarningMsgProvider()
+from converter import load_config, get_output_dir, convert_markdown, convert_workbook
+from pipeline import print_stats
+from batch_runner import (
+    ManifestError,
+    read_manifest_text,
+    parse_manifest,
+    run_jobs,
+    print_summary,
+    write_summary,
+    get_exit_code,
+)
+from spec_updater import update_workbook
+from spec_export import ExportError, export_specs
+from html_preview import write_previews
+from progress_rollup import rollup_workbooks, build_report, print_report, write_report
+from result_merger import merge_workbooks, print_conflicts, write_conflicts
+from spec_index import SpecIndexError, update_index, search
+from roundtrip_checker import check_files, print_results, write_results
+from md_formatter import format_files, print_format_results, FORMAT_UNCHANGED
+from duplicate_finder import load_items, find_duplicates, print_clusters, write_clusters
+from git_changes import (
+    GitError,
+    apply_fragment_changes,
+    get_changed_markdown,
+    plan_changed_jobs,
+)
+from conversion_server import serve
+from warningMsgProvider import MainAppStatus, Diagnostics, ConversionError
 
 
-def resourcePath(filename):
-    if hasattr(sys, "_MEIPASS"):
-        return os.path.join(sys._MEIPASS, filename)
-    return os.path.join(filename)
+def isValidName(fn):
+    for char in ["<", ">", ":", '"', "/", "\\", "|", "?", "*"]:
+        if char in fn:
+            print("")
+            print(f"ファイル名に禁止文字 '{char}' が含まれています!")
+            return False
+    return True
+
+
+def confirm_overwrite(output_fn: str) -> bool:
+    print("\n保存先のファイルが既に存在します " + "(" + output_fn + ")")
+    while True:
+        user_input = input("→ 上書きしますか? (y/n): ").lower()
+        if user_input == 'y':
+            print("")
+            return True
+        elif user_input == 'n':
+            return False
+        else:
+            print("→ 'y' または 'n' いずれかのキーを押してください")
 
 
-def load_config() -> dict:
+def run_manifest(
+    manifest_path: str,
+    summary_path: str,
+    config: dict,
+    changed_since: str = None,
+    md_dir: str = None,
+) -> int:
     try:
-        with open(
-            resourcePath("resources/config.yaml"), "r", encoding="utf-8_sig"
-        ) as f:
-            config = yaml.load(f, Loader=yaml.FullLoader)
-    except FileNotFoundError:
-        msg = warning_msg_provider.buildMsg(MainAppStatus.ERROR_CODE_1.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        jobs = []
+        if manifest_path:
+            jobs = parse_manifest(read_manifest_text(manifest_path))
+    except (OSError, ManifestError) as e:
+        print("【 エラー 】")
+        print("ジョブ定義を読み込めません: " + str(e))
+        return 1
+
+    # 変更されたファイルに関係するジョブのみに絞り込む
+    if changed_since:
+        try:
+            changes = get_changed_markdown(changed_since, md_dir)
+            changes = apply_fragment_changes(
+                changes,
+                md_dir,
+                config["md"].get("mark_for_include", ""),
+                config["md"].get("include_cache_dir"),
+            )
+        except GitError as e:
+            print("【 エラー 】")
+            print("変更されたファイルを取得できません: " + str(e))
+            return 1
+        jobs, stale_outputs = plan_changed_jobs(changes, jobs, get_output_dir())
+        print(f"{changed_since} から変更された Markdown ファイル : {len(changes)} 件")
+        for path in stale_outputs:
+            if os.path.exists(path):
+                os.remove(path)
+                print("不要になった変換結果を削除しました : " + path)
+        print("")
+
+    results = run_jobs(jobs, config)
+    print_summary(results)
+    if summary_path:
+        write_summary(results, summary_path)
 
-    return config
+    return get_exit_code(results)
 
 
-def sort_by_specified_order(files) -> []:
-    order_index = []
+def run_update(workbook_path: str, files: list, output_fn: str, config: dict) -> int:
+    print("Excelファイル更新中 : " + workbook_path)
+    reports = update_workbook(files, workbook_path, config, output_fn)
+
+    print("")
+    print("【 更新結果 】")
+    for report in reports:
+        print(
+            "  {}: 追加 {} / 削除 {} / 変更 {} / 変更なし {}".format(
+                report["sheet_name"],
+                report["inserted"],
+                report["deleted"],
+                report["modified"],
+                report["unchanged"],
+            )
+        )
+        if report["lost_results"]:
+            print("    ※ 実施結果が入力されていた以下の項目は削除されました")
+            for item_id in report["lost_results"]:
+                print("      ID: " + item_id)
+        if report["cleared_results"]:
+            print("    ※ 実施結果が入力されていた以下の項目は仕様が変更されたため、実施結果を消去しました（要再実施）")
+            for item_id in report["cleared_results"]:
+                print("      ID: " + item_id)
+    print("")
+    print("完了")
+    return 0
+
+
+def run_export(output_dir: str, files: list, fmt: str, workers: int, config: dict) -> int:
+    md_files = []
     for file in files:
-        with open(file, "r", encoding="utf-8") as f:
-            for line in f:
-                count = 0
-                for char in line:
-                    if char == "=":
-                        count += 1
-                    else:
-                        break
-                if count > 0:
-                    order_index.append(count)
-                    break
+        if os.path.isdir(file):
+            md_files += sorted(glob.glob(os.path.join(file, "*.md")))
+        else:
+            md_files.append(file)
 
-    if len(files) != len(order_index):
-        return files
-    else:
-        # (order_index, files) のタプルのリストを作成する
-        lst = list(zip(order_index, files))
+    print(f"Markdownファイル読み込み中 : {len(md_files)} 件")
+    try:
+        output_fns, warnings = export_specs(
+            md_files, output_dir, config, fmt=fmt, workers=workers
+        )
+    except ExportError as e:
+        print("【 エラー 】")
+        print(str(e))
+        return 1
+
+    for output_fn in output_fns:
+        print("書き出しました : " + output_fn)
+    if len(warnings):
+        print("")
+        print("【 警告 】")
+        for msg in warnings.render():
+            print(msg)
+    print("")
+    print("完了")
+    return 0
 
-        # インデックスでソートし、同じインデックスの場合はファイルパスでソートする
-        sorted_lst = sorted(lst, key=lambda x: (x[0], x[1]))
 
-        # ソートされたリストからファイルパスのみを取り出す
-        sorted_files = [x[1] for x in sorted_lst]
-        return sorted_files
+def run_preview(output_dir: str, files: list, split_rows: int, config: dict) -> int:
+    md_files = []
+    for file in files:
+        if os.path.isdir(file):
+            md_files += sorted(glob.glob(os.path.join(file, "*.md")))
+        else:
+            md_files.append(file)
+
+    print(f"Markdownファイル読み込み中 : {len(md_files)} 件")
+    output_fns, warnings = write_previews(
+        md_files, output_dir, config, split_rows=split_rows
+    )
+
+    for output_fn in output_fns:
+        print("書き出しました : " + output_fn)
+    if len(warnings):
+        print("")
+        print("【 警告 】")
+        for msg in warnings.render():
+            print(msg)
+    print("")
+    print("完了")
+    return 0
+
+
+def run_rollup(files: list, workers: int, json_path: str, config: dict) -> int:
+    print("Excelファイル集計中 ...")
+    records, stats = rollup_workbooks(
+        files, config, workers=workers, cache_dir=config["rollup"].get("cache_dir")
+    )
+    report = build_report(records)
+    print_report(report, stats)
+    if json_path:
+        write_report(report, stats, json_path)
+    print("")
+    print("完了")
+    return 1 if stats["errors"] else 0
+
+
+def run_merge(
+    files: list, output_fn: str, workers: int, limit: int, json_path: str, config: dict
+) -> int:
+    print("Excelファイル統合中 ...")
+    conflicts, stats = merge_workbooks(files, output_fn, config, workers=workers)
+
+    print_conflicts(conflicts, stats, limit=limit)
+    if json_path:
+        write_conflicts(conflicts, stats, json_path)
+    if stats["errors"]:
+        return 1
+    print("")
+    print("書き出しました : " + output_fn)
+    print("")
+    print("完了")
+    return 0
+
+
+def run_index(db_path: str, files: list, config: dict) -> int:
+    print("索引更新中 : " + db_path)
+    try:
+        stats = update_index(db_path, files, config)
+    except SpecIndexError as e:
+        print("【 エラー 】")
+        print(str(e))
+        return 1
+
+    print(
+        "  ファイル {} 件（更新 {} 件 / 変更なし {} 件 / 削除 {} 件）、テスト項目 {} 件".format(
+            stats["files"],
+            stats["updated"],
+            stats["unchanged"],
+            stats["removed"],
+            stats["items"],
+        )
+    )
+    if stats["errors"]:
+        print("")
+        print("【 エラー 】")
+        print("以下のファイルは索引に含まれていません")
+        for path, error in stats["errors"].items():
+            print(f"  {path}: {error}")
+        return 1
+    print("")
+    print("完了")
+    return 0
+
+
+def run_search(db_path: str, query: str, field: str, limit: int, as_json: bool) -> int:
+    start = time.perf_counter()
+    try:
+        hits = search(db_path, query, field=field, limit=limit)
+    except SpecIndexError as e:
+        print("【 エラー 】")
+        print(str(e))
+        return 1
+    elapsed = time.perf_counter() - start
+
+    if as_json:
+        print(json.dumps(hits, ensure_ascii=False, indent=2))
+        return 0
+
+    # 検索語を含む行のみ表示する
+    terms = [term.lower() for term in query.split()]
+    for hit in hits:
+        print(f"{hit['file']}:{hit['line']}  [{hit['number']}] {hit['path']}")
+        for name in hit["matched"]:
+            for line in hit[name].rstrip("\n").split("\n"):
+                if any(term in line.lower() for term in terms):
+                    print(f"    {name:<12} {line}")
+    print("")
+    print(f"{len(hits)} 件（{elapsed * 1000:.1f} ms）")
+    return 0
+
+
+def run_roundtrip_check(
+    files: list, workers: int, engine: str, json_path: str, config: dict
+) -> int:
+    print("往復変換を確認中 ...")
+    print("")
+    results = check_files(files, config, workers=workers, engine=engine)
+    print_results(results)
+    if json_path:
+        write_results(results, json_path)
+    print("")
+    print("完了")
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+def run_fmt(files: list, check: bool, workers: int, config: dict) -> int:
+    print("整形が必要な章を確認中 ..." if check else "Markdownファイル整形中 ...")
+    print("")
+    results = format_files(files, config, workers=workers, check=check)
+    print_format_results(results, check)
+    print("")
+    print("完了")
+    if check:
+        return 0 if all(result["status"] == FORMAT_UNCHANGED for result in results) else 1
+    return 1 if any(result["error"] for result in results) else 0
+
+
+def run_duplicates(
+    files: list, threshold: float, limit: int, json_path: str, config: dict
+) -> int:
+    print("Markdownファイル読み込み中 ...")
+    items, errors = load_items(files, config)
+    clusters = find_duplicates(items, threshold)
+    print_clusters(clusters, len(items), limit)
+    if json_path:
+        write_clusters(clusters, json_path)
+    if errors:
+        print("")
+        print("【 エラー 】")
+        print("以下のファイルは対象に含まれていません")
+        for path, error in errors.items():
+            print(f"  {path}: {error}")
+        return 1
+    print("")
+    print("完了")
+    return 0
 
-def isValidName(fn):
-    for char in ["<", ">", ":", '"', "/", "\\", "|", "?", "*"]:
-        if char in fn:
-            print("")
-            print(f"ファイル名に禁止文字 '{char}' が含まれています!")
-            return False
-    return True
 
 def main():
     args = docopt(__doc__)
+    run_cli(args)
+
+
+def run_mode(args: dict, run, banner: bool = True, pause: bool = False) -> None:
+    """
+    設定を読み込んでモードの処理を実行し、処理の戻り値を終了コードとして終了します
+    変換できない Markdown などの ConversionError は、エラーを表示して終了コード 1 とする
+
+    Args:
+        args:       コマンドライン引数
+        run:        モードの処理（設定を受け取り、終了コードを返す関数）
+        banner:     起動を表示する（標準出力に結果のみ出力するモードでは表示しない）
+        pause:      エラーを表示した後にキー入力を待つ（対話で実行する変換のみ）
+    """
+    try:
+        config = load_config()
+        if args["--reproducible"]:
+            config["excel"]["reproducible"] = True
+        if banner:
+            print("")
+            print("MdToExcel ver." + __version__ + " 起動")
+            print("")
+        code = run(config)
+    except ConversionError as e:
+        print(e.render())
+        if pause:
+            input("何かキーを押してください...")
+        code = 1
+    sys.exit(code)
+
+
+def run_cli(args: dict):
+    workers = int(args["--workers"])
+    limit = int(args["--limit"])
+
+    if args["--serve"]:
+        run_mode(
+            args,
+            lambda config: serve(
+                host=args["--host"],
+                port=int(args["--port"]),
+                workers=workers,
+                max_queue=int(args["--queue"]),
+                timeout=float(args["--timeout"]),
+            ),
+            banner=False,
+        )
+    elif args["--update"]:
+        run_mode(
+            args,
+            lambda config: run_update(
+                args["--update"], args["<file>"], args["--output"], config
+            ),
+        )
+    elif args["--export"]:
+        run_mode(
+            args,
+            lambda config: run_export(
+                args["--export"], args["<file>"], args["--export-format"], workers, config
+            ),
+        )
+    elif args["--preview"]:
+        run_mode(
+            args,
+            lambda config: run_preview(
+                args["--preview"], args["<file>"], int(args["--split-rows"]), config
+            ),
+        )
+    elif args["--rollup"]:
+        run_mode(
+            args,
+            lambda config: run_rollup(
+                args["<file>"], workers, args["--rollup-json"], config
+            ),
+        )
+    elif args["--merge"]:
+        run_mode(
+            args,
+            lambda config: run_merge(
+                args["<file>"],
+                args["--output"],
+                workers,
+                limit,
+                args["--merge-json"],
+                config,
+            ),
+        )
+    elif args["--search"]:
+        run_mode(
+            args,
+            lambda config: run_search(
+                args["--search"], args["<query>"], args["--field"], limit, args["--json"]
+            ),
+            banner=False,
+        )
+    elif args["--roundtrip-check"]:
+        run_mode(
+            args,
+            lambda config: run_roundtrip_check(
+                args["<file>"], workers, args["--engine"], args["--roundtrip-json"], config
+            ),
+        )
+    elif args["--fmt"]:
+        run_mode(
+            args,
+            lambda config: run_fmt(args["<file>"], args["--check"], workers, config),
+        )
+    elif args["--duplicates"]:
+        run_mode(
+            args,
+            lambda config: run_duplicates(
+                args["<file>"],
+                float(args["--threshold"]),
+                limit,
+                args["--duplicates-json"],
+                config,
+            ),
+        )
+    elif args["--index"]:
+        run_mode(
+            args, lambda config: run_index(args["--index"], args["<file>"], config)
+        )
+    elif args["--manifest"] or args["--changed-since"]:
+        run_mode(
+            args,
+            lambda config: run_manifest(
+                args["--manifest"],
+                args["--summary"],
+                config,
+                changed_since=args["--changed-since"],
+                md_dir=args["--md-dir"],
+            ),
+        )
+    else:
+        run_mode(args, lambda config: run_convert(args, config), pause=True)
+
+
+def run_convert(args: dict, config: dict) -> int:
     files = args["<file>"]
-    excel_book_save_names = []
+    book_name = None
     convert_type = -1
     # -1:単一ファイル変換 → 単一ファイル保存
     #  0:複数ファイル変換 → 単一ファイル保存（複数シート展開）
     #  1:複数ファイル変換 → 複数ファイル保存
     #  2:逆変換（Excel to Markdown）
 
-    config = load_config()
-    print("")
-    print("MdToExcel ver." + __version__ + " 起動")
-    print("")
-
     # 引数に指定されたファイルの種類からオペレーション選択（変換 or 逆変換）
 
     md_file_cnt = excel_file_cnt = other_file_cnt = 0
@@ -151,10 +621,7 @@ def main():
             other_file_cnt += 1
 
     if other_file_cnt or (md_file_cnt and excel_file_cnt):
-        msg = warning_msg_provider.buildMsg(MainAppStatus.ERROR_CODE_2.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise Diagnostics().error(MainAppStatus.ERROR_CODE_2.value)
 
     # Markdown -> Excel 変換処理
     if md_file_cnt:
@@ -173,8 +640,6 @@ def main():
                 else:
                     continue
 
-            files = sort_by_specified_order(files)
-
             if convert_type == "0":
                 while True:
                     print("")
@@ -188,87 +653,33 @@ def main():
                             continue 
                         else:
                             break 
-                excel_book_save_names.append(save_name)
-
-            elif convert_type == "1":
-                for file in files:
-                    excel_book_save_names.append(
-                        os.path.splitext(os.path.basename(file))[0]
-                    )
-
-        elif len(files) == 1:
-            excel_book_save_names.append(
-                os.path.splitext(os.path.basename(files[0]))[0]
-            )
+                book_name = save_name
 
-        dfs = []
-        sheet_names = []
-        product_categories = []
-        summaries = []
-        test_env_frames = []
-        warnings = []
         print("")
-        for file in files:
-            print("Markdownファイル読み込み中 : " + file)
-            df, sheet_name, product_categorie, summary, test_env_frame, warning = convert_md_to_df(
-                file, config_md=config["md"]
-            )
-            dfs.append(df)
-            sheet_names.append(sheet_name)
-            product_categories.append(product_categorie)
-            summaries.append(summary)
-            test_env_frames.append(test_env_frame)
-            warnings.extend(warning)
-
-        for i in range(len(excel_book_save_names)):
-            # prefer Docker `/app/tmp` if it exists; otherwise use a local `./tmp` directory
-            docker_tmp = '/app/tmp'
-            local_tmp = os.path.join(os.getcwd(), 'tmp')
-            target_tmp = docker_tmp if os.path.isdir(docker_tmp) else local_tmp
-            os.makedirs(target_tmp, exist_ok=True)
-            output_fn = os.path.join(target_tmp, excel_book_save_names[i] + ".xlsm")
-            print("Excelファイル書き込み中 : " + output_fn)
-
-            tmp_dfs, tmp_sheet_names, tmp_product_categories, tmp_summaries, tmp_test_env_frames = (
-                [],
-                [],
-                [],
-                [],
-                [],
-            )
-            if len(excel_book_save_names) == 1:
-                tmp_dfs = dfs
-                tmp_sheet_names = sheet_names
-                tmp_product_categories = product_categories
-                tmp_summaries = summaries
-                tmp_test_env_frames = test_env_frames
-            else:
-                tmp_dfs.append(dfs[i])
-                tmp_sheet_names.append(sheet_names[i])
-                tmp_product_categories.append(product_categories[i])
-                tmp_summaries.append(summaries[i])
-                tmp_test_env_frames.append(test_env_frames[i])
-
-            convert_df_to_excel(
-                tmp_dfs,
-                tmp_sheet_names,
-                tmp_product_categories,
-                tmp_summaries,
-                tmp_test_env_frames,
-                config_excel=config["excel"],
-                input_path=resourcePath(
-                    "resources/" + config["excel"]["template_file_name"]
-                ),
-                output_fn=output_fn,
-                merge_cells=False,  # この機能は不要なため非サポートとしておく（将来的に削除したい）
-            )
+        pipeline_stats = {}
+        output_fns, warnings = convert_markdown(
+            files,
+            book_name=book_name,
+            config=config,
+            overwrite=confirm_overwrite,
+            split_rows=int(args["--split-rows"]),
+            workers=int(args["--workers"]),
+            row_ranges=int(args["--row-ranges"]),
+            engine=args["--engine"],
+            pipeline_stats=pipeline_stats,
+        )
+        if args["--pipeline-stats"]:
+            print_stats(pipeline_stats)
+
+        if args["--diag-json"]:
+            warnings.write_json(args["--diag-json"])
 
         if len(warnings):
             print("")
             print("【 警告 】")
             # print("Excel に変換されなかった行があります")
             # print("記述に間違いがないか確認してください")
-            for msg in warnings:
+            for msg in warnings.render():
                 print(msg)
             print("")
             input("何かキーを押してください...")
@@ -277,38 +688,30 @@ def main():
 
     # Excel -> Markdown 変換処理
     elif excel_file_cnt:
-        dfs_lst = []
-        product_categories_lst = []
-        warnings = []
         print("")
-        for file in files:
-            print("Excelファイル読み込み中 : " + file)
-            tmp_dfs, product_categorie = convert_excel_to_df(file)
-            dfs_lst.append(tmp_dfs)
-            product_categories_lst.append(product_categorie)
-
-        for idx, dfs in enumerate(dfs_lst):
-            sheet_pos_order = 0
-            for sheet_name, df in dfs.items():
-                file_name = sheet_name + ".md"
-                print("Markdownファイル書き込み中 : " + file_name)
-                sheet_pos_order += 1
-                warning = convert_df_to_md(df, config["md"], file_name, sheet_pos_order, product_categories_lst[idx])
-                if warning:
-                    warnings.extend(warning)
+        output_fns, warnings = convert_workbook(
+            files, config=config, overwrite=confirm_overwrite
+        )
+
+        if args["--diag-json"]:
+            warnings.write_json(args["--diag-json"])
 
         if len(warnings):
             print("")
             print("【 警告 】")
             print("Markdown に変換されなかった情報があります")
             print("記述に問題がないか確認してください")
-            for msg in warnings:
+            for msg in warnings.render():
                 print(msg)
             print("")
             input("何かキーを押してください...")
 
         print("完了")
 
+    return 0
+
 
 if __name__ == "__main__":
+    # exe 化した場合にワーカープロセスが起動できるようにする
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,214 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import sys
+import json
+import time
+import contextlib
+import yaml
+from converter import convert_markdown, convert_workbook
+from warningMsgProvider import ConversionError
+
+# 変換の方向
+DIRECTION_MD_TO_EXCEL = "md2excel"
+DIRECTION_EXCEL_TO_MD = "excel2md"
+
+# 複数の Markdown ファイルの展開方法
+GROUPING_BOOK = "book"  # 1つの Excelブック に 複数のシート で展開する（convert type 0）
+GROUPING_SEPARATE = "separate"  # 複数の Excelブック に 1シート ずつ展開する（convert type 1）
+
+# ジョブの実行結果
+JOB_STATUS_OK = "ok"
+JOB_STATUS_FAILED = "failed"
+
+
+class ManifestError(Exception):
+    pass
+
+
+def read_manifest_text(manifest_path: str) -> str:
+    """
+    ジョブ定義を読み込みます（`-` の場合は標準入力から読み込む）
+    """
+    if manifest_path == "-":
+        return sys.stdin.read()
+    with open(manifest_path, "r", encoding="utf-8_sig") as f:
+        return f.read()
+
+
+def parse_manifest(text: str) -> list[dict]:
+    """
+    ジョブ定義をジョブのリストに変換します
+
+    以下のいずれかの形式で記述できます
+      - JSON / YAML: ジョブのリスト、または `jobs` キーにジョブのリストを持つ辞書
+          jobs:
+            - inputs: [chapter_3.md, chapter_4.md]
+              grouping: book                 # book or separate（省略時は separate）
+              output: out/TestSpec.xlsm      # book の場合は保存ファイル、それ以外は保存先フォルダ
+            - inputs: TestSpec.xlsm          # 拡張子から変換の方向を判定する
+              direction: excel2md            # md2excel or excel2md（省略可）
+              output: markdown/
+      - 改行区切りのファイルパス（1行1ジョブ）
+    """
+    data = None
+    stripped = text.strip()
+    if stripped == "":
+        return []
+    try:
+        data = yaml.safe_load(stripped)  # JSON は YAML としても読み込める
+    except yaml.YAMLError:
+        data = None
+
+    # 改行区切りのパスは YAML では1つの文字列として読み込まれる
+    if data is None or isinstance(data, str):
+        data = [line.strip() for line in stripped.splitlines() if line.strip()]
+
+    if isinstance(data, dict):
+        if "jobs" not in data:
+            raise ManifestError("ジョブ定義に `jobs` がありません")
+        data = data["jobs"]
+    if not isinstance(data, list):
+        raise ManifestError("ジョブ定義の形式が不正です")
+
+    return [build_job(entry, idx) for idx, entry in enumerate(data)]
+
+
+def infer_direction(inputs: list) -> str:
+    exts = {os.path.splitext(file)[1] for file in inputs}
+    if exts and exts <= {".md"}:
+        return DIRECTION_MD_TO_EXCEL
+    elif exts and exts <= {".xlsm", ".xlsx"}:
+        return DIRECTION_EXCEL_TO_MD
+    return ""
+
+
+def build_job(entry, index: int) -> dict:
+    """
+    ジョブ定義の1要素を正規化します（不正な値は `error` に記録し、実行時に失敗扱いとする）
+    """
+    if isinstance(entry, str):
+        entry = {"inputs": [entry]}
+    if not isinstance(entry, dict):
+        entry = {}
+
+    inputs = entry.get("inputs", entry.get("input", []))
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    job = {
+        "name": str(entry.get("name", "job" + str(index + 1))),
+        "inputs": [str(file) for file in inputs],
+        "direction": entry.get("direction") or infer_direction(inputs),
+        "grouping": entry.get("grouping", GROUPING_SEPARATE),
+        "output": entry.get("output"),
+        "error": "",
+    }
+
+    if not job["inputs"]:
+        job["error"] = "入力ファイルが指定されていません"
+    elif job["direction"] not in [DIRECTION_MD_TO_EXCEL, DIRECTION_EXCEL_TO_MD]:
+        job["error"] = "変換の方向を判定できません（md と xlsm は同時に指定できません）"
+    elif job["grouping"] not in [GROUPING_BOOK, GROUPING_SEPARATE]:
+        job["error"] = "grouping には book または separate を指定してください"
+
+    return job
+
+
+def run_job(job: dict, config: dict):
+    if job["direction"] == DIRECTION_EXCEL_TO_MD:
+        return convert_workbook(job["inputs"], output_dir=job["output"], config=config)
+
+    output_dir = job["output"]
+    book_name = None
+    if job["grouping"] == GROUPING_BOOK:
+        output = job["output"] or job["name"]
+        output_dir = os.path.dirname(output) or None
+        book_name = os.path.splitext(os.path.basename(output))[0]
+
+    return convert_markdown(
+        job["inputs"], output_dir=output_dir, book_name=book_name, config=config
+    )
+
+
+def run_jobs(jobs: list[dict], config: dict) -> list[dict]:
+    """
+    ジョブを順に実行し、ジョブごとの結果を返します
+    1つのジョブが失敗しても残りのジョブは継続します
+
+    Returns:
+        results:    ジョブごとの結果（name, status, exit_code, elapsed, outputs, warnings, error, error_detail, log）
+    """
+    results = []
+    for job in jobs:
+        print("[" + job["name"] + "] " + ", ".join(job["inputs"]))
+        result = {
+            "name": job["name"],
+            "inputs": job["inputs"],
+            "direction": job["direction"],
+            "status": JOB_STATUS_FAILED,
+            "exit_code": 1,
+            "elapsed": 0.0,
+            "outputs": [],
+            "warnings": [],
+            "error": job["error"],
+            "error_detail": None,
+            "log": "",
+        }
+        start = time.perf_counter()
+        log = io.StringIO()
+        if not job["error"]:
+            try:
+                with contextlib.redirect_stdout(log):
+                    outputs, warnings = run_job(job, config)
+                result["status"] = JOB_STATUS_OK
+                result["exit_code"] = 0
+                result["outputs"] = outputs
+                result["warnings"] = warnings.to_dicts()
+            except ConversionError as e:
+                log.write(e.render())
+                result["error"] = str(e).splitlines()[0]
+                result["error_detail"] = e.to_dict()
+            except Exception as e:
+                result["error"] = type(e).__name__ + ": " + str(e)
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+        result["log"] = log.getvalue()
+        print(result["log"], end="")
+        results.append(result)
+
+    return results
+
+
+def print_summary(results: list[dict]) -> None:
+    print("")
+    print("【 実行結果 】")
+    for result in results:
+        line = "  {:<6} {:<20} {:>8.3f}s".format(
+            result["status"], result["name"], result["elapsed"]
+        )
+        if result["warnings"]:
+            line += "  警告 " + str(len(result["warnings"])) + " 件"
+        if result["error"]:
+            line += "  " + result["error"]
+        print(line)
+    ok_cnt = sum(1 for result in results if result["status"] == JOB_STATUS_OK)
+    print("")
+    print(f"  成功 {ok_cnt} / {len(results)} ジョブ")
+
+
+def write_summary(results: list[dict], summary_path: str) -> None:
+    summary = {
+        "exit_code": get_exit_code(results),
+        "jobs": results,
+    }
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+def get_exit_code(results: list[dict]) -> int:
+    return 0 if all(result["exit_code"] == 0 for result in results) else 1
@@ -0,0 +1,266 @@
+# coding: utf-8
+
+"""
+変換時間が入力の大きさに比例しない（2乗などで増える）書き方を検出します。
+
+極端な形の Markdown を大きさを変えて生成し、Markdown の読み込み（convert_md_to_df）、
+テスト項目シートの生成（write_test_specification）、Markdown への逆変換（convert_df_to_md）の
+時間とピークメモリを計測します。大きさに対する増え方（両対数の傾き）が --max-exponent を
+超えた場合は終了コード 1 を返します。
+
+形（--shapes）
+  items      ふつうのテスト項目の繰り返し（基準）
+  nested     1つのテスト項目に続く入れ子のリストの行
+  line_feed  改行の記号（行末の2文字の空白）で終わる長い行の連続
+  headings   テスト観点 lv1 -> lv6 の見出しの繰り返し
+  summary    概要欄の行
+
+Usage:
+    bench_complexity.py [--sizes <list>] [--shapes <list>] [--repeat <n>] [--max-exponent <x>] [--json <json>]
+
+Options:
+    --sizes <list>        生成する Markdown の行数（カンマ区切り） [default: 500,1000,2000,4000]
+    --shapes <list>       計測する形（カンマ区切り） [default: items,nested,line_feed,headings,summary]
+    --repeat <n>          計測回数（最も短い時間を採用する） [default: 2]
+    --max-exponent <x>    許容する増え方（時間・メモリが行数の x 乗に比例するまで） [default: 1.5]
+    --json <json>         計測結果を JSON で保存する
+"""
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import tracemalloc
+import pandas as pd
+from docopt import docopt
+
+# app フォルダのモジュールと resources を参照する
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+from converter import load_config  # noqa: E402
+from markdown_operator import convert_md_to_df, convert_df_to_md  # noqa: E402
+from excel_operator import write_test_specification, convert_excel_to_df  # noqa: E402
+
+# 計測する処理
+STAGES = ["parse", "write", "to_md"]
+
+# 長い行の文字数（line_feed）
+LONG_LINE_LEN = 500
+
+_HEADER = ["BENCH", "===", "", "変換時間の計測", "", "```", "環境1", "```", ""]
+
+
+def _item(idx: int) -> list:
+    return [
+        "###### ",
+        "> 環境",
+        f"+ PC {idx % 7}",
+        "> 手順",
+        f"1. 操作 {idx}",
+        "> 確認",
+        f"- 結果 {idx} が表示されること",
+        "> 備考",
+        "- [ ] ",
+    ]
+
+
+def generate_markdown(shape: str, line_num: int) -> str:
+    """
+    形 shape の部分がおよそ line_num 行の Markdown を生成します
+    """
+    lines = list(_HEADER)
+    if shape == "items":
+        lines.append("# 機能")
+        for idx in range(line_num // len(_item(0))):
+            lines += _item(idx)
+    elif shape == "nested":
+        lines += ["# 機能", "> 手順", "1. 操作する", "> 確認", "- 結果"]
+        for idx in range(line_num):
+            level = idx % 3
+            lines.append(
+                "    " * (level + 1) + ("1. " if idx % 2 else "- ") + f"入れ子 {idx}"
+            )
+    elif shape == "line_feed":
+        lines += ["# 機能", "> 手順", "1. 操作する", "> 確認"]
+        lines.append("- " + "長" * LONG_LINE_LEN + "  ")
+        for idx in range(line_num - 1):
+            lines.append(f"{idx:>6}" + "行" * LONG_LINE_LEN + "  ")
+    elif shape == "headings":
+        for idx in range(line_num // 6):
+            for lv in range(1, 7):
+                lines.append("#" * lv + f" 観点 {idx}-{lv}")
+            lines += _item(idx)[1:]
+    elif shape == "summary":
+        lines = lines[:4] + [f"概要 {idx}" for idx in range(line_num)] + lines[4:]
+        lines.append("# 機能")
+        lines += _item(0)
+    else:
+        raise ValueError(f"未定義の形です : {shape}")
+    return "\n".join(lines) + "\n"
+
+
+def run_stages(md_text: str, config: dict) -> dict:
+    """
+    Markdown の読み込み、シートの生成、逆変換を順に行い、処理ごとの時間を返します
+    """
+    timings = {}
+    start = time.perf_counter()
+    df, sheet_name, product_categorie, summary, test_env_frame, _ = convert_md_to_df(
+        io.StringIO(md_text), config["md"], name="bench.md"
+    )
+    timings["parse"] = time.perf_counter() - start
+
+    book = io.BytesIO()
+    writer = pd.ExcelWriter(book, engine="openpyxl")
+    start = time.perf_counter()
+    write_test_specification(
+        df, sheet_name, summary, test_env_frame, writer, config["excel"], False
+    )
+    timings["write"] = time.perf_counter() - start
+    writer.close()
+
+    dfs, _ = convert_excel_to_df(book.getvalue())
+    start = time.perf_counter()
+    convert_df_to_md(
+        dfs[sheet_name], config["md"], io.StringIO(), 1, product_categorie, name="bench.md"
+    )
+    timings["to_md"] = time.perf_counter() - start
+    return timings
+
+
+def measure_memory(md_text: str, config: dict) -> dict:
+    """
+    処理ごとのピークメモリ（tracemalloc で追跡した Python の割り当て、MB）を返します
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        df, sheet_name, product_categorie, summary, test_env_frame, _ = convert_md_to_df(
+            io.StringIO(md_text), config["md"], name="bench.md"
+        )
+        peaks["parse"] = tracemalloc.get_traced_memory()[1]
+
+        book = io.BytesIO()
+        writer = pd.ExcelWriter(book, engine="openpyxl")
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        write_test_specification(
+            df, sheet_name, summary, test_env_frame, writer, config["excel"], False
+        )
+        peaks["write"] = tracemalloc.get_traced_memory()[1] - base
+        writer.close()
+        del writer, df
+
+        dfs, _ = convert_excel_to_df(book.getvalue())
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        convert_df_to_md(
+            dfs[sheet_name], config["md"], io.StringIO(), 1, product_categorie, name="bench.md"
+        )
+        peaks["to_md"] = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return {stage: peak / 1e6 for stage, peak in peaks.items()}
+
+
+def growth_exponent(sizes: list, values: list) -> float:
+    """
+    大きさに対する増え方（両対数の最小二乗の傾き、1 は比例、2 は2乗）を返します
+    """
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(v, 1e-9)) for v in values]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    num = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    den = sum((x - x_mean) ** 2 for x in xs)
+    return num / den if den else 0.0
+
+
+def main():
+    args = docopt(__doc__)
+    sizes = sorted(int(v) for v in args["--sizes"].split(",") if v.strip())
+    shapes = [v.strip() for v in args["--shapes"].split(",") if v.strip()]
+    repeat = max(1, int(args["--repeat"]))
+    max_exponent = float(args["--max-exponent"])
+
+    config = load_config()
+
+    print(
+        "{:<10} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "shape",
+            "lines",
+            "parse[s]",
+            "write[s]",
+            "to_md[s]",
+            "parse[MB]",
+            "write[MB]",
+            "to_md[MB]",
+        )
+    )
+    results = []
+    failures = []
+    for shape in shapes:
+        rows = []
+        for size in sizes:
+            md_text = generate_markdown(shape, size)
+            runs = [run_stages(md_text, config) for _ in range(repeat)]
+            row = {
+                "shape": shape,
+                "lines": size,
+                "time": {stage: round(min(r[stage] for r in runs), 4) for stage in STAGES},
+                "memory": {k: round(v, 3) for k, v in measure_memory(md_text, config).items()},
+            }
+            rows.append(row)
+            print(
+                "{:<10} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+                    shape,
+                    size,
+                    *[row["time"][stage] for stage in STAGES],
+                    *[row["memory"][stage] for stage in STAGES],
+                )
+            )
+
+        exponents = {}
+        for kind in ["time", "memory"]:
+            for stage in STAGES:
+                exponent = growth_exponent(sizes, [row[kind][stage] for row in rows])
+                exponents[f"{stage}_{kind}"] = round(exponent, 2)
+                if len(sizes) > 1 and exponent > max_exponent:
+                    failures.append(
+                        f"{shape} / {stage} の{'時間' if kind == 'time' else 'メモリ'}"
+                        f"（{exponent:.2f} 乗）"
+                    )
+        print(
+            "{:<10} 増え方 : ".format("")
+            + "  ".join(f"{k} {v:.2f}" for k, v in exponents.items())
+        )
+        results.append({"shape": shape, "rows": rows, "exponents": exponents})
+
+    if args["--json"]:
+        with open(args["--json"], "w", encoding="utf-8") as f:
+            json.dump(
+                {"max_exponent": max_exponent, "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    print("")
+    if failures:
+        print(f"【 行数の {max_exponent} 乗を超えて増える処理 】")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print(f"すべての処理が行数の {max_exponent} 乗以内で増えています")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# coding: utf-8
+
+"""
+テスト環境枠の数を変えて、変換処理（Markdown の読み込み、Excel シートの生成）の時間を計測します。
+
+Usage:
+    bench_env_frames.py [--items <n>] [--frames <list>] [--repeat <n>] [--json <json>]
+
+Options:
+    --items <n>       1シートのテスト項目数 [default: 200]
+    --frames <list>   テスト環境枠の数（カンマ区切り） [default: 1,2,4,8,16,32,64]
+    --repeat <n>      計測回数（最も短い時間を採用する） [default: 3]
+    --json <json>     計測結果を JSON で保存する
+"""
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import sys
+import json
+import time
+from docopt import docopt
+
+# app フォルダのモジュールと resources を参照する
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+from converter import load_config, resourcePath  # noqa: E402
+from markdown_operator import convert_md_to_df  # noqa: E402
+from excel_operator import convert_df_to_excel  # noqa: E402
+
+
+def generate_markdown(item_num: int, frame_num: int) -> str:
+    """
+    テスト環境枠 frame_num 個、テスト項目 item_num 個の Markdown を生成します
+    （13 項目に1つは、いずれかのテスト環境で省略する、テスト項目は空白の lv6 見出しで区切る）
+    """
+    lines = ["BENCH", "===", "", "テスト環境枠の数による変換時間の計測", ""]
+    lines += ["```"] + [f"環境{i + 1}" for i in range(frame_num)] + ["```", ""]
+    for item_idx in range(item_num):
+        if item_idx % 100 == 0:
+            lines.append(f"# 機能 {item_idx // 100 + 1}")
+        if item_idx % 10 == 0:
+            lines.append(f"## 観点 {item_idx // 10 + 1}")
+        notes = "- [ ] "
+        if item_idx % 13 == 0:
+            notes = f"- [x] 環境{item_idx % frame_num + 1}"
+        lines += [
+            "###### ",
+            "> 環境",
+            f"+ PC {item_idx % 7}",
+            "> 準備",
+            "* 電源オン",
+            "> 手順",
+            f"1. 操作 {item_idx}",
+            "1. 確認する",
+            "> 確認",
+            f"- 結果 {item_idx} が表示されること",
+            "> 備考",
+            notes,
+            "---",
+            "",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def measure(md_text: str, config: dict, template: bytes) -> tuple[float, float]:
+    start = time.perf_counter()
+    df, sheet_name, product_categorie, summary, test_env_frame, _ = convert_md_to_df(
+        io.StringIO(md_text), config["md"], name="bench.md"
+    )
+    parsed = time.perf_counter()
+    convert_df_to_excel(
+        [df],
+        [sheet_name],
+        [product_categorie],
+        [summary],
+        [test_env_frame],
+        config_excel=config["excel"],
+        input_path=template,
+        output_fn=io.BytesIO(),
+        merge_cells=False,
+    )
+    written = time.perf_counter()
+    return parsed - start, written - parsed
+
+
+def main():
+    args = docopt(__doc__)
+    item_num = int(args["--items"])
+    frame_nums = [int(v) for v in args["--frames"].split(",") if v.strip()]
+    repeat = max(1, int(args["--repeat"]))
+
+    config = load_config()
+    with open(
+        resourcePath("resources/" + config["excel"]["template_file_name"]), "rb"
+    ) as f:
+        template = f.read()
+
+    res_col_num = len(config["excel"]["col_name_res_area"])
+    print(f"テスト項目数 : {item_num}")
+    print(
+        "{:>6} {:>8} {:>10} {:>10} {:>10} {:>12}".format(
+            "frames", "columns", "parse[s]", "write[s]", "total[s]", "write[us/cell]"
+        )
+    )
+    results = []
+    for frame_num in frame_nums:
+        md_text = generate_markdown(item_num, frame_num)
+        timings = [measure(md_text, config, template) for _ in range(repeat)]
+        parse_time = min(t[0] for t in timings)
+        write_time = min(t[1] for t in timings)
+        col_num = len(config["excel"]["col_name"]) - 1 + res_col_num * frame_num
+        # テスト観点行を含むおおよそのセル数
+        cell_num = col_num * (item_num + item_num // 10 + item_num // 100 + 1)
+        result = {
+            "frames": frame_num,
+            "columns": col_num,
+            "items": item_num,
+            "parse": round(parse_time, 4),
+            "write": round(write_time, 4),
+            "total": round(parse_time + write_time, 4),
+            "write_us_per_cell": round(write_time / cell_num * 1e6, 2),
+        }
+        results.append(result)
+        print(
+            "{:>6} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.2f}".format(
+                frame_num,
+                col_num,
+                result["parse"],
+                result["write"],
+                result["total"],
+                result["write_us_per_cell"],
+            )
+        )
+
+    if args["--json"]:
+        with open(args["--json"], "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# coding: utf-8
+
+"""
+openpyxl エンジンと XlsxWriter エンジンで同じ Markdown を変換し、出力をセル単位で比較します。
+あわせて変換時間を計測します（差分がある場合は終了コード 1 を返す）。
+
+比較の対象は、Markdown フォルダの各ファイル（1ファイル1ブック、および全ファイルを1ブック）と、
+テスト環境枠の数を変えて生成した Markdown です。
+
+比較する内容
+  - シートの並び順、選択中のシート、行固定、タブの色、シートのコード名
+  - セルの値と書式（フォント、塗りつぶし、罫線、配置、表示形式、保護）
+  - 列幅（1 ピクセル未満の差は同じとみなす）、非表示の列、行の高さ、非表示の行
+  - フォームボタン（位置、マクロ、表示文字列）、VBA プロジェクト
+
+Usage:
+    compare_engines.py [--items <n>] [--frames <list>] [--md-dir <dir>] [--max-diffs <n>]
+
+Options:
+    --items <n>       生成する Markdown の1シートのテスト項目数 [default: 200]
+    --frames <list>   生成する Markdown のテスト環境枠の数（カンマ区切り） [default: 1,4,16]
+    --md-dir <dir>    比較する Markdown フォルダ [default: markdown]
+    --max-diffs <n>   表示する差分の上限 [default: 20]
+"""
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import re
+import sys
+import glob
+import time
+import zipfile
+import contextlib
+from copy import copy
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.utils import get_column_letter
+from docopt import docopt
+
+# app フォルダのモジュールと resources を参照する
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+from converter import (  # noqa: E402
+    load_config,
+    convert_markdown_in_memory,
+    ENGINE_OPENPYXL,
+    ENGINE_XLSXWRITER,
+)
+from xlsxwriter_engine import (  # noqa: E402
+    MAX_DIGIT_WIDTH,
+    convert_color,
+    parse_vml_buttons,
+)
+from bench_env_frames import generate_markdown  # noqa: E402
+
+
+def convert(sources: list, book_name: str, config: dict, engine: str):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outputs, _ = convert_markdown_in_memory(
+            sources, book_name=book_name, config=config, engine=engine
+        )
+    return outputs, time.perf_counter() - start
+
+
+def get_cell(ws, row: int, col: int, column_styles: dict):
+    """
+    セルを返します
+    保存されていないセルは、Excel と同じく列、行、ブックの既定の書式の順で書式を決める
+    """
+    cell = ws._cells.get((row, col))
+    if cell is not None:
+        return cell
+    cell = Cell(ws, row=row, column=col)
+    row_dim = ws.row_dimensions.get(row)
+    if col in column_styles:
+        cell._style = copy(column_styles[col])
+    elif row_dim is not None and row_dim.customFormat:
+        cell._style = copy(row_dim._style)
+    else:
+        cell._style = copy(ws.parent._cell_styles[0])
+    return cell
+
+
+def get_cell_key(cell) -> tuple:
+    """
+    セルの値と書式を比較用に正規化します（空文字列と空のセルは同じとみなす）
+    """
+    font = cell.font
+    fill = cell.fill
+    border = cell.border
+    alignment = cell.alignment
+    value = None if cell.value == "" else cell.value
+    pattern = getattr(fill, "patternType", None)
+    return (
+        ("value", value),
+        (
+            "font",
+            (
+                font.name,
+                float(font.sz or 0),
+                bool(font.b),
+                bool(font.i),
+                font.u,
+                bool(font.strike),
+                convert_color(font.color),
+            ),
+        ),
+        ("fill", (pattern, convert_color(fill.fgColor) if pattern else None)),
+        (
+            "border",
+            tuple(
+                (getattr(border, side).style, convert_color(getattr(border, side).color))
+                for side in ["left", "right", "top", "bottom"]
+            ),
+        ),
+        (
+            "alignment",
+            (
+                None if alignment.horizontal == "general" else alignment.horizontal,
+                alignment.vertical,
+                bool(alignment.wrap_text),
+                bool(alignment.shrink_to_fit),
+                int(alignment.text_rotation or 0),
+                int(alignment.indent or 0),
+            ),
+        ),
+        ("number_format", cell.number_format),
+        ("protection", (cell.protection.locked, bool(cell.protection.hidden))),
+    )
+
+
+def get_column_keys(ws) -> dict:
+    """
+    列ごとの幅と非表示を返します（列幅は Excel の表示と同じくピクセル単位で比較し、非表示の列は幅を比較しない）
+    隣り合う同じ設定の列は1つにまとめて保存されるため、列ごとに展開する
+    """
+    keys = {}
+    for dim in ws.column_dimensions.values():
+        width = None
+        if dim.customWidth and not dim.hidden:
+            width = int(dim.width * MAX_DIGIT_WIDTH + 0.5)
+        for col in range(dim.min, dim.max + 1):
+            keys[col] = (width, bool(dim.hidden))
+    return keys
+
+
+def get_column_styles(ws) -> dict:
+    styles = {}
+    for dim in ws.column_dimensions.values():
+        if dim.has_style:
+            for col in range(dim.min, dim.max + 1):
+                styles[col] = dim._style
+    return styles
+
+
+def get_row_keys(ws) -> dict:
+    """
+    行ごとの高さと非表示を返します（既定の行の高さと同じ高さは、指定なしとみなす）
+    """
+    keys = {}
+    for row, dim in ws.row_dimensions.items():
+        height = dim.ht if dim.customHeight else None
+        if height == ws.sheet_format.defaultRowHeight:
+            height = None
+        keys[row] = (height, bool(dim.hidden))
+    return keys
+
+
+def get_buttons(ws, book: zipfile.ZipFile) -> list:
+    if not ws.legacy_drawing:
+        return []
+    vml = book.read(ws.legacy_drawing.lstrip("/")).decode("utf-8", "replace")
+    # 表示文字列は空白と改行を除いて比較する
+    return [
+        (b["row"], b["col"], b.get("macro"), re.sub(r"\s", "", b["caption"]))
+        for b in parse_vml_buttons(vml)
+    ]
+
+
+def compare_workbooks(name: str, expected: bytes, actual: bytes) -> tuple[int, list]:
+    """
+    2つのブックを比較します
+
+    Returns:
+        cell_cnt:   比較したセルの数
+        diffs:      差分（"ブック/シート/位置: 内容" の文字列）のリスト
+    """
+    diffs = []
+    wb_expected = openpyxl.load_workbook(io.BytesIO(expected), keep_vba=True)
+    wb_actual = openpyxl.load_workbook(io.BytesIO(actual), keep_vba=True)
+    zip_expected = zipfile.ZipFile(io.BytesIO(expected))
+    zip_actual = zipfile.ZipFile(io.BytesIO(actual))
+
+    def check(where: str, item: str, v1, v2):
+        if v1 != v2:
+            diffs.append(f"{name}/{where}: {item} openpyxl={v1!r} xlsxwriter={v2!r}")
+
+    check("-", "sheets", wb_expected.sheetnames, wb_actual.sheetnames)
+    check("-", "active", wb_expected.active.title, wb_actual.active.title)
+    check(
+        "-",
+        "vbaProject.bin",
+        zip_expected.read("xl/vbaProject.bin"),
+        zip_actual.read("xl/vbaProject.bin"),
+    )
+
+    cell_cnt = 0
+    for ws1 in wb_expected.worksheets:
+        if ws1.title not in wb_actual.sheetnames:
+            continue
+        ws2 = wb_actual[ws1.title]
+        check(ws1.title, "freeze_panes", ws1.freeze_panes, ws2.freeze_panes)
+        check(
+            ws1.title,
+            "tab_color",
+            convert_color(ws1.sheet_properties.tabColor),
+            convert_color(ws2.sheet_properties.tabColor),
+        )
+        check(
+            ws1.title,
+            "zero_height",
+            bool(ws1.sheet_format.zeroHeight),
+            bool(ws2.sheet_format.zeroHeight),
+        )
+        # 追加したテスト項目シートのコード名は、保存したエンジンによって異なってよい
+        if ws1.sheet_properties.codeName:
+            check(
+                ws1.title,
+                "code_name",
+                ws1.sheet_properties.codeName,
+                ws2.sheet_properties.codeName,
+            )
+        check(
+            ws1.title,
+            "buttons",
+            get_buttons(ws1, zip_expected),
+            get_buttons(ws2, zip_actual),
+        )
+
+        columns1, columns2 = get_column_keys(ws1), get_column_keys(ws2)
+        for col in sorted(set(columns1) | set(columns2)):
+            check(
+                ws1.title + "/" + get_column_letter(col),
+                "column",
+                columns1.get(col, (None, False)),
+                columns2.get(col, (None, False)),
+            )
+        rows1, rows2 = get_row_keys(ws1), get_row_keys(ws2)
+        for row in sorted(set(rows1) | set(rows2)):
+            check(
+                ws1.title + "/" + str(row),
+                "row",
+                rows1.get(row, (None, False)),
+                rows2.get(row, (None, False)),
+            )
+
+        max_row = max(ws1.max_row, ws2.max_row)
+        max_col = max(ws1.max_column, ws2.max_column)
+        column_styles1, column_styles2 = get_column_styles(ws1), get_column_styles(ws2)
+        for row in range(1, max_row + 1):
+            for col in range(1, max_col + 1):
+                cell1 = get_cell(ws1, row, col, column_styles1)
+                cell2 = get_cell(ws2, row, col, column_styles2)
+                cell_cnt += 1
+                for (item, v1), (_, v2) in zip(get_cell_key(cell1), get_cell_key(cell2)):
+                    check(ws1.title + "/" + cell1.coordinate, item, v1, v2)
+
+    return cell_cnt, diffs
+
+
+def main():
+    args = docopt(__doc__)
+    item_num = int(args["--items"])
+    frame_nums = [int(v) for v in args["--frames"].split(",") if v.strip()]
+    max_diffs = int(args["--max-diffs"])
+
+    config = load_config()
+
+    # 比較するブック（ブック名, (ファイル名, 内容) のリスト, 1つのブックに展開するかどうか）
+    corpus = []
+    md_files = sorted(glob.glob(os.path.join(args["--md-dir"], "*.md")))
+    sources = []
+    for file in md_files:
+        with open(file, "r", encoding="utf-8_sig") as f:
+            sources.append((os.path.basename(file), f.read()))
+    if sources:
+        corpus.append(("separate", sources, None))
+        corpus.append(("book", sources, "Book"))
+    for frame_num in frame_nums:
+        corpus.append(
+            (
+                f"frames{frame_num}",
+                [(f"frames{frame_num}.md", generate_markdown(item_num, frame_num))],
+                None,
+            )
+        )
+
+    print(
+        "{:<12} {:>6} {:>10} {:>14} {:>16} {:>6}".format(
+            "corpus", "books", "cells", "openpyxl[s]", "xlsxwriter[s]", "diffs"
+        )
+    )
+    all_diffs = []
+    total_times = [0.0, 0.0]
+    for corpus_name, corpus_sources, book_name in corpus:
+        expected, expected_time = convert(
+            corpus_sources, book_name, config, ENGINE_OPENPYXL
+        )
+        actual, actual_time = convert(
+            corpus_sources, book_name, config, ENGINE_XLSXWRITER
+        )
+        total_times[0] += expected_time
+        total_times[1] += actual_time
+
+        cell_cnt = 0
+        diffs = []
+        for (name, data1), (_, data2) in zip(expected, actual):
+            cnt, book_diffs = compare_workbooks(name, data1, data2)
+            cell_cnt += cnt
+            diffs += book_diffs
+        all_diffs += diffs
+        print(
+            "{:<12} {:>6} {:>10} {:>14.3f} {:>16.3f} {:>6}".format(
+                corpus_name, len(expected), cell_cnt, expected_time, actual_time, len(diffs)
+            )
+        )
+
+    print(
+        "{:<12} {:>6} {:>10} {:>14.3f} {:>16.3f} {:>6}".format(
+            "total", "", "", total_times[0], total_times[1], len(all_diffs)
+        )
+    )
+
+    if all_diffs:
+        print("")
+        print("【 差分 】")
+        for diff in all_diffs[:max_diffs]:
+            print("  " + diff)
+        if len(all_diffs) > max_diffs:
+            print(f"  ... ほか {len(all_diffs) - max_diffs} 件")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import json
+import time
+import asyncio
+import zipfile
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs, quote
+from converter import (
+    load_config,
+    resourcePath,
+    convert_markdown_in_memory,
+    convert_workbook_in_memory,
+)
+from warningMsgProvider import ConversionError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# 受け付けるファイルの最大サイズ
+MAX_BODY_BYTES = 50 * 1024 * 1024
+# リクエストのヘッダー・本文の受信待ちの上限（秒）
+READ_TIMEOUT = 30
+# レイテンシのパーセンタイルを計算する直近の件数
+LATENCY_WINDOW = 1000
+# 応答を書き出す単位
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    ".xlsm": "application/vnd.ms-excel.sheet.macroEnabled.12",
+    ".md": "text/markdown; charset=utf-8",
+    ".zip": "application/zip",
+}
+
+STATUS_TEXTS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+# ワーカーの起動時に、遅延読み込みされるモジュールを含めて一通り読み込むための Markdown
+WARMUP_MD = "WARMUP\n===\n\n# warmup\n> 手順\n1. step\n> 確認\n- expected\n"
+
+# ワーカープロセスごとに読み込んでおく設定
+_worker_config = None
+
+
+def _init_worker() -> None:
+    """
+    ワーカープロセスの初期化（設定・テンプレートの読み込みと、小さなファイルの変換による準備運転）
+    """
+    global _worker_config
+    _worker_config = load_config()
+    with open(
+        resourcePath("resources/" + _worker_config["excel"]["template_file_name"]),
+        "rb",
+    ) as f:
+        f.read()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = convert_markdown_in_memory(
+            [("warmup.md", WARMUP_MD)], config=_worker_config
+        )
+        convert_workbook_in_memory(result.outputs[0][1], config=_worker_config)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def check_upload(file_name: str, data: bytes) -> dict:
+    """
+    アップロードされたファイルを読み込めるか確認します
+
+    Returns:
+        error:      読み込めない場合のエラー（ConversionError.to_dict() と同じ形式）、読み込める場合は None
+    """
+    if os.path.splitext(file_name)[1] == ".md":
+        try:
+            data.decode("utf-8")
+        except UnicodeDecodeError as e:
+            return ConversionError(
+                f"{file_name} を UTF-8 として読み込めません（{e.start} バイト目）"
+            ).to_dict()
+        return None
+
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            is_workbook = "xl/workbook.xml" in zf.namelist()
+    except zipfile.BadZipFile:
+        is_workbook = False
+    if not is_workbook:
+        return ConversionError(f"{file_name} は Excel ブック（.xlsm / .xlsx）ではありません").to_dict()
+    return None
+
+
+def convert_upload(file_name: str, data: bytes) -> dict:
+    """
+    アップロードされたファイルをディスクに読み書きせずに変換します（ワーカープロセスで実行する）
+
+    Args:
+        file_name:  ファイル名（Markdown はファイル名がシート名になる）
+        data:       ファイルの内容
+
+    Returns:
+        {"file_name": 変換結果のファイル名, "body": 変換結果, "warnings": 警告, "error": 中止した場合のエラー,
+         "status": 中止した場合の HTTP ステータス（読み込めないファイルは 400、変換できない内容は 422）}
+        逆変換で複数のシートがある場合は、Markdown を zip にまとめて返す
+    """
+    # UTF-8 でない Markdown、Excel ブックでないファイルは、変換の前にクライアントの誤りとして返す
+    error = check_upload(file_name, data)
+    if error:
+        return {"error": error, "status": 400}
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if os.path.splitext(file_name)[1] == ".md":
+                result = convert_markdown_in_memory(
+                    [(file_name, data)], config=_worker_config
+                )
+            else:
+                result = convert_workbook_in_memory(data, config=_worker_config)
+    except ConversionError as e:
+        return {"error": e.to_dict(), "status": 422}
+
+    outputs = [
+        (name, body if isinstance(body, bytes) else body.encode("utf-8"))
+        for name, body in result.outputs
+    ]
+    if len(outputs) == 1:
+        out_name, body = outputs[0]
+    else:
+        out_name = os.path.splitext(file_name)[0] + ".zip"
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, output in outputs:
+                zf.writestr(name, output)
+        body = buf.getvalue()
+
+    return {
+        "file_name": out_name,
+        "body": body,
+        "warnings": result.diagnostics.to_dicts(),
+        "error": None,
+    }
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    最近傍順位法によるパーセンタイル（sorted_values は昇順）
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-pct * len(sorted_values) // 100)))
+    return sorted_values[rank - 1]
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionServer:
+    """
+    変換を受け付ける HTTP サーバー
+
+    - POST /convert?name=<ファイル名>  本文にファイルの内容（.md / .xlsm）を送ると、変換結果を返す
+    - GET  /health                      稼働状況
+    - GET  /metrics                     件数とレイテンシのパーセンタイル
+                                        （requests は converted / rejected（503）/ failed（その他のエラー）の合計）
+
+    変換は起動時に準備運転を済ませたワーカープロセスで行い、
+    実行中・待機中の変換が workers + max_queue 件に達した場合は 503 を返す
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        workers: int = 1,
+        max_queue: int = 16,
+        timeout: float = 120,
+    ):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.executor = None
+        self.in_flight = 0
+        self.started = time.time()
+        self.counts = {
+            "requests": 0,
+            "converted": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+        }
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start_pool(self) -> None:
+        """
+        ワーカープロセスを起動し、全ワーカーの準備運転が終わるまで待ちます
+        """
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker
+        )
+        await asyncio.gather(
+            *[loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)]
+        )
+
+    async def serve_forever(self) -> None:
+        await self.start_pool()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(
+            f"変換サーバーを起動しました : http://{self.host}:{self.port}"
+            f" (workers={self.workers}, queue={self.max_queue}, timeout={self.timeout}s)"
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future) -> None:
+        self.in_flight -= 1
+
+    async def convert(self, file_name: str, data: bytes) -> dict:
+        if self.in_flight >= self.workers + self.max_queue:
+            raise HttpError(503, "変換の待ち行列がいっぱいです")
+
+        loop = asyncio.get_running_loop()
+        # タイムアウトしてもワーカーでの変換は止められないため、
+        # 実際に変換が終わるまで実行中として数える
+        self.in_flight += 1
+        try:
+            future = loop.run_in_executor(self.executor, convert_upload, file_name, data)
+        except BrokenProcessPool:
+            self.in_flight -= 1
+            await self.start_pool()
+            raise HttpError(503, "ワーカープロセスを再起動しています")
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            raise HttpError(504, f"変換が {self.timeout} 秒以内に終わりませんでした")
+        except BrokenProcessPool:
+            await self.start_pool()
+            raise HttpError(500, "ワーカープロセスが異常終了しました")
+
+    def metrics(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            **self.counts,
+            "latency": {
+                "samples": len(latencies),
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0,
+            },
+        }
+
+    async def handle(self, reader, writer) -> None:
+        try:
+            try:
+                method, path, query, headers = await asyncio.wait_for(
+                    self.read_head(reader), READ_TIMEOUT
+                )
+                await self.route(method, path, query, headers, reader, writer)
+            except asyncio.TimeoutError:
+                raise HttpError(408, "リクエストの受信がタイムアウトしました")
+        except HttpError as e:
+            await self.send_json(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await self.send_json(writer, 500, {"error": type(e).__name__ + ": " + str(e)})
+        finally:
+            writer.close()
+
+    async def read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "ヘッダーが長すぎます")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "リクエスト行が不正です")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), headers
+
+    async def route(self, method, path, query, headers, reader, writer) -> None:
+        if path == "/health":
+            status = "ok" if self.executor is not None else "starting"
+            await self.send_json(
+                writer,
+                200,
+                {"status": status, "in_flight": self.in_flight, "workers": self.workers},
+            )
+            return
+        if path == "/metrics":
+            await self.send_json(writer, 200, self.metrics())
+            return
+        if path != "/convert":
+            raise HttpError(404, "Not Found")
+        if method != "POST":
+            raise HttpError(405, "POST で送信してください")
+
+        self.counts["requests"] += 1
+        try:
+            await self.route_convert(query, headers, reader, writer)
+        except HttpError as e:
+            # 待ち行列がいっぱい・ワーカーの再起動中（503）は rejected、それ以外は failed として数える
+            self.counts["rejected" if e.status == 503 else "failed"] += 1
+            raise
+        except Exception:
+            self.counts["failed"] += 1
+            raise
+
+    async def route_convert(self, query, headers, reader, writer) -> None:
+        file_name = os.path.basename(
+            (query.get("name") or [headers.get("x-file-name", "")])[0]
+        )
+        if os.path.splitext(file_name)[1] not in [".md", ".xlsm", ".xlsx"]:
+            raise HttpError(400, "name に .md / .xlsm のファイル名を指定してください")
+        if "content-length" not in headers:
+            raise HttpError(411, "Content-Length を指定してください")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "Content-Length が不正です")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "ファイルが大きすぎます")
+        data = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT)
+
+        start = time.perf_counter()
+        res = await self.convert(file_name, data)
+        if res["error"]:
+            self.counts["failed"] += 1
+            await self.send_json(writer, res["status"], {"error": res["error"]})
+            return
+        self.counts["converted"] += 1
+        self.latencies.append(round(time.perf_counter() - start, 3))
+
+        ext = os.path.splitext(res["file_name"])[1]
+        await self.send(
+            writer,
+            200,
+            res["body"],
+            CONTENT_TYPES.get(ext, "application/octet-stream"),
+            {
+                "Content-Disposition": "attachment; filename*=UTF-8''"
+                + quote(res["file_name"]),
+                "X-Diagnostics-Count": str(len(res["warnings"])),
+            },
+        )
+
+    async def send(
+        self, writer, status: int, body: bytes, content_type: str, extra_headers: dict = None
+    ) -> None:
+        headers = {
+            "Content-Type": content_type,
+            "Content-Length": str(len(body)),
+            "Connection": "close",
+            **(extra_headers or {}),
+        }
+        head = f"HTTP/1.1 {status} {STATUS_TEXTS.get(status, '')}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("utf-8"))
+        for pos in range(0, len(body), CHUNK_SIZE):
+            writer.write(body[pos : pos + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+    async def send_json(self, writer, status: int, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await self.send(writer, status, body, "application/json; charset=utf-8")
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = 1,
+    max_queue: int = 16,
+    timeout: float = 120,
+) -> None:
+    server = ConversionServer(host, port, workers, max_queue, timeout)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("変換サーバーを停止しました")
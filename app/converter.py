@@ -0,0 +1,681 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+from markdown_operator import convert_md_to_df, convert_df_to_md
+from excel_operator import (
+    build_excel_book,
+    build_sheet_payload,
+    save_excel_book,
+    convert_excel_to_df,
+    is_overwritable,
+)
+from pipeline import Stage, run_pipeline, DEFAULT_QUEUE_SIZE
+import xlsxwriter_engine
+from sheet_builder import (
+    expand_sheets,
+    build_sheet_payloads,
+    build_row_range_fragments,
+)
+from warningMsgProvider import (
+    MainAppStatus,
+    ExOpStatus,
+    MdOpStatus,
+    Diagnostics,
+    InputFileError,
+)
+
+# ライブラリとして呼び出した場合の変換結果
+#   outputs:        保存したファイルのパス
+#   diagnostics:    変換は完了したが確認が必要な警告（Diagnostics）
+ConversionResult = namedtuple("ConversionResult", ["outputs", "diagnostics"])
+
+# Excel ブックの出力エンジン
+ENGINE_OPENPYXL = "openpyxl"  # テンプレートを開いてテスト項目シートを追記する
+ENGINE_XLSXWRITER = "xlsxwriter"  # テンプレートの内容とテスト項目シートを1行ずつ書き出す（XlsxWriter が必要）
+ENGINES = [ENGINE_OPENPYXL, ENGINE_XLSXWRITER]
+
+
+def resourcePath(filename):
+    if hasattr(sys, "_MEIPASS"):
+        return os.path.join(sys._MEIPASS, filename)
+    return os.path.join(filename)
+
+
+def load_config() -> dict:
+    try:
+        with open(
+            resourcePath("resources/config.yaml"), "r", encoding="utf-8_sig"
+        ) as f:
+            config = yaml.load(f, Loader=yaml.FullLoader)
+    except FileNotFoundError:
+        raise Diagnostics().error(MainAppStatus.ERROR_CODE_1.value)
+
+    return config
+
+
+def get_title_level(lines) -> int:
+    """
+    タイトル行（= の行）の = の数を返します（シートの並び順に使う、タイトル行がない場合は 0）
+    """
+    for line in lines:
+        count = 0
+        for char in line:
+            if char == "=":
+                count += 1
+            else:
+                break
+        if count > 0:
+            return count
+    return 0
+
+
+def sort_by_specified_order(files) -> []:
+    order_index = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            count = get_title_level(f)
+            if count > 0:
+                order_index.append(count)
+
+    if len(files) != len(order_index):
+        return files
+    else:
+        # (order_index, files) のタプルのリストを作成する
+        lst = list(zip(order_index, files))
+
+        # インデックスでソートし、同じインデックスの場合はファイルパスでソートする
+        sorted_lst = sorted(lst, key=lambda x: (x[0], x[1]))
+
+        # ソートされたリストからファイルパスのみを取り出す
+        sorted_files = [x[1] for x in sorted_lst]
+        return sorted_files
+
+
+def get_output_dir() -> str:
+    # prefer Docker `/app/tmp` if it exists; otherwise use a local `./tmp` directory
+    docker_tmp = "/app/tmp"
+    local_tmp = os.path.join(os.getcwd(), "tmp")
+    target_tmp = docker_tmp if os.path.isdir(docker_tmp) else local_tmp
+    os.makedirs(target_tmp, exist_ok=True)
+    return target_tmp
+
+
+def convert_md_files(
+    files: list,
+    excel_book_save_names: list,
+    config: dict,
+    output_dir: str = None,
+    overwrite=False,
+    split_rows: int = 0,
+    workers: int = 1,
+    row_ranges: int = 1,
+    engine: str = ENGINE_OPENPYXL,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    pipeline_stats: dict = None,
+) -> tuple[list, list]:
+    """
+    Markdown ファイルを読み込み、Excel ブックに変換します
+    ファイルの読み込み、Markdown の解析、シートの生成、ブックの保存（圧縮と書き込み）は
+    ステージごとのスレッドで並行して行う（ブック N を保存している間に、次のファイルを読み込み・解析する）
+
+      read（読み込み） → parse（解析） → build（シートの生成） → save（保存）
+
+    全ファイルを1つのブックにまとめる場合に workers を指定すると、解析の済んだ章から順に
+    ワーカープロセスでシートを生成し（シートの XML まで）、すべての章がそろった後に
+    テンプレートのブックへシートの並び順で組み込む
+
+    Args:
+        files:                  Markdown ファイルのパス（シートの並び順）
+        excel_book_save_names:  保存する Excel ブック名（拡張子を除く）
+                                1つの場合は全ファイルを1ブックに、ファイル数と同じ場合は1ファイル1ブックに展開する
+        config:                 設定
+        output_dir:             保存先フォルダ（省略時は get_output_dir()）
+        overwrite:              保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+        split_rows:             1シートの最大行数の目安（超えた章はテスト観点の区切りで複数シートに分割する、0 は分割しない）
+        workers:                テスト項目シートを並列に生成するワーカープロセス数（1 は並列化しない）
+        row_ranges:             1シートを行範囲に分割して並列に生成する場合の行範囲の数（1 は分割しない）
+        engine:                 Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+        queue_size:             ステージ間のキューの長さ（前のステージが先行して処理できるファイル・ブックの数）
+        pipeline_stats:         辞書を渡すと、ステージごとの処理時間と稼働率（run_pipeline() の stats）を格納する
+
+    Returns:
+        output_fns:             保存した Excel ファイルのパス
+        warnings:               Markdownの記述、その他に関する警告（Diagnostics）
+    """
+    if output_dir is None:
+        output_dir = get_output_dir()
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    if engine not in ENGINES:
+        raise Diagnostics().error(ExOpStatus.ERROR_CODE_3.value, "", engine)
+
+    output_fns = [
+        os.path.join(output_dir, name + ".xlsm") for name in excel_book_save_names
+    ]
+    # 上書きの確認は変換を始める前にまとめて行う（並行して処理している途中で入力を求めない）
+    writable = [is_overwritable(output_fn, overwrite) for output_fn in output_fns]
+    single_book = len(excel_book_save_names) == 1
+
+    warnings = Diagnostics()
+    chapters = []
+
+    # 1つのブックにまとめる場合は、章の解析と並行してワーカープロセスでシートを生成する
+    # （行範囲に分割する場合と xlsxwriter の場合は、ブックの生成時にまとめて処理する）
+    executor = None
+    payloads = []
+    if (
+        single_book
+        and writable[0]
+        and workers > 1
+        and row_ranges <= 1
+        and engine == ENGINE_OPENPYXL
+    ):
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    def read(file):
+        print("Markdownファイル読み込み中 : " + file)
+        try:
+            with open(file, "rb") as f:
+                return [(file, f.read())]
+        except FileNotFoundError:
+            raise Diagnostics(file).error(MdOpStatus.ERROR_CODE_1.value)
+
+    def parse(item):
+        file, data = item
+        df, sheet_name, product_categorie, summary, test_env_frame, warning = convert_md_to_df(
+            data,
+            config_md=config["md"],
+            name=file,
+            include_dir=os.path.dirname(file),
+        )
+        warnings.extend(warning)
+        return [(df, sheet_name, product_categorie, summary, test_env_frame)]
+
+    def build_book_at(book_idx, book_chapters, payloads=None):
+        if not writable[book_idx]:
+            return []
+        print("Excelファイル書き込み中 : " + output_fns[book_idx])
+        pending = build_book(
+            book_chapters,
+            output_fns[book_idx],
+            config,
+            overwrite=True,
+            split_rows=split_rows,
+            workers=workers,
+            row_ranges=row_ranges,
+            engine=engine,
+            payloads=payloads,
+        )
+        return [pending] if pending is not None else []
+
+    def build(chapter):
+        # 1つのブックにまとめる場合は、すべての章がそろってからブックを生成する
+        if single_book:
+            chapters.append(chapter)
+            if executor is not None:
+                for df, sheet_name, _, summary, test_env_frame in expand_sheets(
+                    [chapter], split_rows, config["md"]
+                ):
+                    payloads.append(
+                        executor.submit(
+                            build_sheet_payload,
+                            df,
+                            sheet_name,
+                            summary,
+                            test_env_frame,
+                            config["excel"],
+                            False,
+                        )
+                    )
+            return []
+        book_idx = len(chapters)
+        chapters.append(None)
+        return build_book_at(book_idx, [chapter])
+
+    def build_rest():
+        if not single_book:
+            return []
+        if executor is not None:
+            return build_book_at(0, chapters, [future.result() for future in payloads])
+        return build_book_at(0, chapters)
+
+    def save(pending):
+        save_excel_book(pending)
+        return []
+
+    try:
+        _, stats = run_pipeline(
+            files,
+            [
+                Stage("read", read),
+                Stage("parse", parse),
+                Stage("build", build, build_rest),
+                Stage("save", save),
+            ],
+            queue_size=queue_size,
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if pipeline_stats is not None:
+        pipeline_stats.update(stats)
+
+    return output_fns, warnings
+
+
+def write_excel_book(
+    chapters: list,
+    output_fn,
+    config: dict,
+    overwrite=False,
+    split_rows: int = 0,
+    workers: int = 1,
+    row_ranges: int = 1,
+    engine: str = ENGINE_OPENPYXL,
+) -> None:
+    """
+    章（convert_md_to_df() の戻り値）を、1つの Excel ブックの複数シートに展開して保存します
+    （引数は build_book() と同じ）
+    """
+    pending = build_book(
+        chapters,
+        output_fn,
+        config,
+        overwrite=overwrite,
+        split_rows=split_rows,
+        workers=workers,
+        row_ranges=row_ranges,
+        engine=engine,
+    )
+    if pending is not None:
+        save_excel_book(pending)
+
+
+def build_book(
+    chapters: list,
+    output_fn,
+    config: dict,
+    overwrite=False,
+    split_rows: int = 0,
+    workers: int = 1,
+    row_ranges: int = 1,
+    engine: str = ENGINE_OPENPYXL,
+    payloads: list = None,
+):
+    """
+    章（convert_md_to_df() の戻り値）を、1つの Excel ブックの複数シートに展開します
+    保存は save_excel_book() で行う（xlsxwriter の場合はシートを書き出しながら保存するため、保存まで行う）
+
+    Args:
+        chapters:       (df, sheet_name, product_categorie, summary, test_env_frame) のリスト（シートの並び順）
+        output_fn:      保存先のファイル、またはバイナリのファイルオブジェクト
+        config:         設定
+        overwrite:      保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+        split_rows:     1シートの最大行数の目安（0 は分割しない）
+        workers:        テスト項目シートを並列に生成するワーカープロセス数（1 は並列化しない）
+        row_ranges:     1シートを行範囲に分割して並列に生成する場合の行範囲の数（1 は分割しない）
+        engine:         Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+                        xlsxwriter の場合、workers と row_ranges は使わない
+        payloads:       ワーカープロセスで生成済みのシート（build_sheet_payload() の戻り値、シートの並び順）
+                        省略時は workers が 2 以上の場合にここで生成する
+
+    Returns:
+        pending:        保存前のブック（excel_operator.PendingBook、保存済み・保存しない場合は None）
+    """
+    # 行数の多い章は複数のシートに分割する
+    sheets = expand_sheets(chapters, split_rows, config["md"])
+    tmp_dfs = [sheet[0] for sheet in sheets]
+    tmp_sheet_names = [sheet[1] for sheet in sheets]
+    tmp_product_categories = [sheet[2] for sheet in sheets]
+    tmp_summaries = [sheet[3] for sheet in sheets]
+    tmp_test_env_frames = [sheet[4] for sheet in sheets]
+
+    if engine not in ENGINES:
+        raise Diagnostics().error(ExOpStatus.ERROR_CODE_3.value, "", engine)
+
+    if engine == ENGINE_XLSXWRITER:
+        # シートを1行ずつ書き出すため、並列に生成せずに直接書き出す
+        xlsxwriter_engine.convert_df_to_excel(
+            tmp_dfs,
+            tmp_sheet_names,
+            tmp_product_categories,
+            tmp_summaries,
+            tmp_test_env_frames,
+            config_excel=config["excel"],
+            input_path=resourcePath("resources/" + config["excel"]["template_file_name"]),
+            output_fn=output_fn,
+            overwrite=overwrite,
+        )
+        return None
+
+    # テスト項目シートを並列に生成する（生成済みの場合を除く）
+    row_fragments = None
+    if payloads is None and row_ranges > 1:
+        # 1シートの行を行範囲に分割し、行範囲ごとに並列に生成する
+        row_fragments = build_row_range_fragments(
+            [
+                (
+                    tmp_dfs[idx],
+                    tmp_sheet_names[idx],
+                    tmp_summaries[idx],
+                    tmp_test_env_frames[idx],
+                    config["excel"],
+                )
+                for idx in range(len(tmp_dfs))
+            ],
+            workers,
+            row_ranges,
+        )
+    elif payloads is None and workers > 1:
+        payloads = build_sheet_payloads(
+            [
+                (
+                    tmp_dfs[idx],
+                    tmp_sheet_names[idx],
+                    tmp_summaries[idx],
+                    tmp_test_env_frames[idx],
+                    config["excel"],
+                    False,
+                )
+                for idx in range(len(tmp_dfs))
+            ],
+            workers,
+        )
+
+    return build_excel_book(
+        tmp_dfs,
+        tmp_sheet_names,
+        tmp_product_categories,
+        tmp_summaries,
+        tmp_test_env_frames,
+        config_excel=config["excel"],
+        input_path=resourcePath("resources/" + config["excel"]["template_file_name"]),
+        output_fn=output_fn,
+        merge_cells=False,  # この機能は不要なため非サポートとしておく（将来的に削除したい）
+        overwrite=overwrite,
+        payloads=payloads,
+        row_fragments=row_fragments,
+    )
+
+
+def convert_excel_files(
+    files: list, config: dict, output_dir: str = None, overwrite=False
+) -> tuple[list, list]:
+    """
+    Excel ブックを読み込み、シートごとに Markdown ファイルに変換します
+
+    Args:
+        files:          Excel ファイルのパス
+        config:         設定
+        output_dir:     保存先フォルダ（省略時はカレントディレクトリ）
+        overwrite:      保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+
+    Returns:
+        output_fns:     保存した Markdown ファイルのパス
+        warnings:       Markdown に変換されなかった情報に関する警告（Diagnostics）
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    dfs_lst = []
+    product_categories_lst = []
+    warnings = Diagnostics()
+    output_fns = []
+    for file in files:
+        print("Excelファイル読み込み中 : " + file)
+        tmp_dfs, product_categorie = convert_excel_to_df(file)
+        dfs_lst.append(tmp_dfs)
+        product_categories_lst.append(product_categorie)
+
+    for idx, dfs in enumerate(dfs_lst):
+        sheet_pos_order = 0
+        for sheet_name, df in dfs.items():
+            file_name = sheet_name + ".md"
+            if output_dir:
+                file_name = os.path.join(output_dir, file_name)
+            print("Markdownファイル書き込み中 : " + file_name)
+            sheet_pos_order += 1
+            warning = convert_df_to_md(
+                df,
+                config["md"],
+                file_name,
+                sheet_pos_order,
+                product_categories_lst[idx],
+                overwrite=overwrite,
+            )
+            if warning:
+                warnings.extend(warning)
+            output_fns.append(file_name)
+
+    return output_fns, warnings
+
+
+def _check_input_files(files: list, exts: list) -> None:
+    for file in files:
+        if os.path.splitext(file)[1] not in exts:
+            raise Diagnostics().error(MainAppStatus.ERROR_CODE_2.value)
+    for file in files:
+        if not os.path.isfile(file):
+            if ".md" in exts:
+                raise Diagnostics(file).error(MdOpStatus.ERROR_CODE_1.value)
+            raise InputFileError("Excelファイルが見つかりません\n\nファイル名：" + file)
+
+
+def convert_markdown(
+    md_files,
+    output_dir: str = None,
+    book_name: str = None,
+    config: dict = None,
+    overwrite=True,
+    split_rows: int = 0,
+    workers: int = 1,
+    row_ranges: int = 1,
+    engine: str = ENGINE_OPENPYXL,
+    pipeline_stats: dict = None,
+) -> ConversionResult:
+    """
+    Markdown ファイルを Excel テスト項目書に変換します（他のプログラムから呼び出すための入口）
+    入力を求めたり終了したりせず、変換を中止するエラーは ConversionError の派生クラスとして送出します
+
+    Args:
+        md_files:       Markdown ファイルのパス（1つの場合は文字列でもよい）
+        output_dir:     保存先フォルダ（省略時は get_output_dir()）
+        book_name:      指定した場合は全ファイルを1つのブック（拡張子を除くファイル名）に複数シートで展開する
+                        省略時は1ファイル1ブックに展開する
+        config:         設定（省略時は config.yaml を読み込む）
+        overwrite:      保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+        split_rows:     1シートの最大行数の目安（0 は分割しない）
+        workers:        テスト項目シートを並列に生成するワーカープロセス数
+        row_ranges:     1シートを行範囲に分割して並列に生成する場合の行範囲の数（1 は分割しない）
+        engine:         Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+        pipeline_stats: 辞書を渡すと、ステージごとの処理時間と稼働率を格納する（convert_md_files() を参照）
+
+    Returns:
+        ConversionResult(outputs, diagnostics)
+
+    Raises:
+        ConfigError, InputFileError, MarkdownSyntaxError, OutputFileError, UnexpectedError
+    """
+    if isinstance(md_files, str):
+        md_files = [md_files]
+    _check_input_files(md_files, [".md"])
+    if config is None:
+        config = load_config()
+
+    files = sort_by_specified_order(md_files)
+    if book_name:
+        book_names = [book_name]
+    else:
+        book_names = [os.path.splitext(os.path.basename(file))[0] for file in files]
+
+    outputs, diagnostics = convert_md_files(
+        files,
+        book_names,
+        config,
+        output_dir=output_dir,
+        overwrite=overwrite,
+        split_rows=split_rows,
+        workers=workers,
+        row_ranges=row_ranges,
+        engine=engine,
+        pipeline_stats=pipeline_stats,
+    )
+    return ConversionResult(outputs, diagnostics)
+
+
+def convert_workbook(
+    workbooks, output_dir: str = None, config: dict = None, overwrite=True
+) -> ConversionResult:
+    """
+    Excel テスト項目書をシートごとに Markdown ファイルに変換します（他のプログラムから呼び出すための入口）
+    入力を求めたり終了したりせず、変換を中止するエラーは ConversionError の派生クラスとして送出します
+
+    Args:
+        workbooks:      Excel ファイルのパス（1つの場合は文字列でもよい）
+        output_dir:     保存先フォルダ（省略時はカレントディレクトリ）
+        config:         設定（省略時は config.yaml を読み込む）
+        overwrite:      保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+
+    Returns:
+        ConversionResult(outputs, diagnostics)
+
+    Raises:
+        ConfigError, InputFileError, WorkbookFormatError, UnexpectedError
+    """
+    if isinstance(workbooks, str):
+        workbooks = [workbooks]
+    _check_input_files(workbooks, [".xlsm", ".xlsx"])
+    if config is None:
+        config = load_config()
+
+    outputs, diagnostics = convert_excel_files(
+        workbooks, config, output_dir=output_dir, overwrite=overwrite
+    )
+    return ConversionResult(outputs, diagnostics)
+
+
+def convert_markdown_in_memory(
+    sources: list,
+    book_name: str = None,
+    config: dict = None,
+    split_rows: int = 0,
+    workers: int = 1,
+    row_ranges: int = 1,
+    engine: str = ENGINE_OPENPYXL,
+) -> ConversionResult:
+    """
+    Markdown をディスクに読み書きせずに Excel テスト項目書に変換します
+
+    Args:
+        sources:        (ファイル名, 内容) のリスト
+                        ファイル名はシート名に使う、内容は Markdown のテキスト（str）/ bytes / ファイルオブジェクト
+        book_name:      指定した場合は全ファイルを1つのブックに複数シートで展開する
+                        省略時は1ファイル1ブックに展開する
+        config:         設定（省略時は config.yaml を読み込む）
+        split_rows:     1シートの最大行数の目安（0 は分割しない）
+        workers:        テスト項目シートを並列に生成するワーカープロセス数
+        row_ranges:     1シートを行範囲に分割して並列に生成する場合の行範囲の数（1 は分割しない）
+        engine:         Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+
+    Returns:
+        ConversionResult(outputs, diagnostics)
+        outputs は (ブック名.xlsm, ブックの内容の bytes) のリスト
+
+    Raises:
+        ConfigError, InputFileError, MarkdownSyntaxError, UnexpectedError
+    """
+    if config is None:
+        config = load_config()
+
+    texts = []
+    for name, source in sources:
+        if isinstance(source, str):
+            text = source
+        else:
+            data = source if isinstance(source, (bytes, bytearray)) else source.read()
+            text = data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else data
+        texts.append((name, io.StringIO(text, newline=None).read()))
+
+    # シートの並び順（タイトル行の = の数、同じ場合はファイル名の順）
+    levels = [get_title_level(io.StringIO(text)) for _, text in texts]
+    if all(levels):
+        texts = [t for _, t in sorted(zip(levels, texts), key=lambda x: (x[0], x[1][0]))]
+
+    chapters = []
+    diagnostics = Diagnostics()
+    for name, text in texts:
+        df, sheet_name, product_categorie, summary, test_env_frame, warning = convert_md_to_df(
+            io.StringIO(text), config_md=config["md"], name=name
+        )
+        chapters.append((df, sheet_name, product_categorie, summary, test_env_frame))
+        diagnostics.extend(warning)
+
+    if book_name:
+        books = [(book_name, chapters)]
+    else:
+        books = [
+            (os.path.splitext(os.path.basename(name))[0], [chapter])
+            for (name, _), chapter in zip(texts, chapters)
+        ]
+
+    outputs = []
+    for name, book_chapters in books:
+        buf = io.BytesIO()
+        write_excel_book(
+            book_chapters,
+            buf,
+            config,
+            split_rows=split_rows,
+            workers=workers,
+            row_ranges=row_ranges,
+            engine=engine,
+        )
+        outputs.append((name + ".xlsm", buf.getvalue()))
+
+    return ConversionResult(outputs, diagnostics)
+
+
+def convert_workbook_in_memory(source, config: dict = None) -> ConversionResult:
+    """
+    Excel テスト項目書をディスクに読み書きせずにシートごとの Markdown に変換します
+
+    Args:
+        source:         Excel ブックの内容（bytes、またはバイナリのファイルオブジェクト）
+        config:         設定（省略時は config.yaml を読み込む）
+
+    Returns:
+        ConversionResult(outputs, diagnostics)
+        outputs は (シート名.md, Markdown のテキスト) のリスト（シートの並び順）
+
+    Raises:
+        ConfigError, WorkbookFormatError, UnexpectedError
+    """
+    if config is None:
+        config = load_config()
+
+    dfs, product_categorie = convert_excel_to_df(source)
+    outputs = []
+    diagnostics = Diagnostics()
+    for sheet_pos_order, (sheet_name, df) in enumerate(dfs.items(), 1):
+        buf = io.StringIO()
+        warning = convert_df_to_md(
+            df,
+            config["md"],
+            buf,
+            sheet_pos_order,
+            product_categorie,
+            name=sheet_name + ".md",
+        )
+        diagnostics.extend(warning)
+        outputs.append((sheet_name + ".md", buf.getvalue()))
+
+    return ConversionResult(outputs, diagnostics)
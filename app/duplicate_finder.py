@@ -0,0 +1,214 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import re
+import json
+import zlib
+import hashlib
+import unicodedata
+import numpy as np
+from spec_index import ITEM_FIELDS, find_markdown_files, parse_items
+from warningMsgProvider import ConversionError
+
+# 類似度の既定のしきい値（手順と確認の文字 n-gram の Jaccard 係数）
+DEFAULT_THRESHOLD = 0.8
+
+# 文字 n-gram の文字数（日本語は単語の区切りがないため、文字単位で分割する）
+SHINGLE_LEN = 3
+
+# MinHash の関数の数と、LSH のバンド数（1バンドあたり MINHASH_NUM / LSH_BANDS 個）
+#   類似度 s の組がいずれかのバンドで同じバケットに入る確率は 1 - (1 - s^r)^b
+#   b = 16, r = 4 では s = 0.8 で 99.9%、s = 0.5 で 64%、s = 0.3 で 12%
+MINHASH_NUM = 64
+LSH_BANDS = 16
+
+# MinHash のハッシュ関数（a * x + b mod p）の係数（結果が実行ごとに変わらないよう固定の乱数列から生成する）
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240605)
+_HASH_A = _rng.randint(1, _PRIME, size=(MINHASH_NUM, 1)).astype(np.uint64)
+_HASH_B = _rng.randint(0, _PRIME, size=(MINHASH_NUM, 1)).astype(np.uint64)
+
+# 重複の種類
+KIND_EXACT = "exact"  # 手順と確認が（空白・番号・記号を除いて）一致する
+KIND_NEAR = "near"  # 手順と確認が似ている
+
+# 行頭の番号・記号（1. / ・）
+_LIST_MARK_PATTERN = re.compile(r"^\s*(?:[0-9]+\.\s|・)", re.MULTILINE)
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(steps: str, expected: str) -> str:
+    """
+    比較用に手順と確認を正規化します（全角・半角の統一、小文字化、行頭の番号・記号と空白の除去）
+    """
+    text = unicodedata.normalize("NFKC", steps + "\n\x1f\n" + expected).lower()
+    text = _LIST_MARK_PATTERN.sub("", text)
+    return _SPACE_PATTERN.sub("", text)
+
+
+def get_shingles(text: str) -> np.ndarray:
+    """
+    文字 n-gram のハッシュ値の集合を返します（SHINGLE_LEN 文字未満の場合は全体を1つとする）
+    """
+    if len(text) <= SHINGLE_LEN:
+        grams = {text}
+    else:
+        grams = {text[idx : idx + SHINGLE_LEN] for idx in range(len(text) - SHINGLE_LEN + 1)}
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) & _PRIME for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+def get_minhash(shingles: np.ndarray) -> np.ndarray:
+    return ((_HASH_A * shingles + _HASH_B) % _PRIME).min(axis=1)
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    inter = len(np.intersect1d(a, b, assume_unique=True))
+    return inter / (len(a) + len(b) - inter)
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, idx: int) -> int:
+        root = idx
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[idx] != root:
+            self.parent[idx], idx = root, self.parent[idx]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def load_items(paths: list, config: dict) -> tuple[list, dict]:
+    """
+    Markdown ファイルのテスト項目を読み込みます
+
+    Returns:
+        items:      ITEM_FIELDS をキーとする辞書のリスト（ファイル、行番号の順）
+        errors:     読み込めなかったファイル -> エラーメッセージ
+    """
+    items = []
+    errors = {}
+    for file in find_markdown_files(paths):
+        try:
+            with open(file, "rb") as f:
+                data = f.read()
+            records = parse_items(file, data, config["md"])
+        except OSError as e:
+            errors[file] = f"{type(e).__name__}: {e}"
+            continue
+        except ConversionError as e:
+            errors[file] = str(e)
+            continue
+        items += [dict(zip(ITEM_FIELDS, record)) for record in records]
+    return items, errors
+
+
+def find_duplicates(items: list, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    手順と確認が一致する、または似ているテスト項目をまとめます
+    項目数に対してほぼ線形の時間で処理する
+
+      1. 正規化した文字列のハッシュで、一致する項目をまとめる
+      2. 一致する項目の代表ごとに MinHash を求め、LSH のバケットに振り分ける
+      3. 同じバケットに入った代表を、バケットの先頭の代表と比較して（n-gram の Jaccard 係数）まとめる
+         バケット内のすべての組は比較しないため、似た項目が多く集まるバケットでも比較回数は増えない
+
+    Args:
+        items:      ITEM_FIELDS をキーとする辞書のリスト
+        threshold:  似ているとみなす類似度（0 - 1、1 以上の場合は一致する項目のみ）
+
+    Returns:
+        clusters:   {"kind", "similarity", "items"} のリスト（項目数の多い順）
+                    similarity はクラスター内の代表とその比較相手の類似度の最小値
+    """
+    # 1. 一致する項目
+    groups = {}
+    for item_idx, item in enumerate(items):
+        text = normalize_text(item["steps"], item["expected"])
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        if key not in groups:
+            groups[key] = (text, [])
+        groups[key][1].append(item_idx)
+    texts = [text for text, _ in groups.values()]
+    members = [idxs for _, idxs in groups.values()]
+
+    # 2, 3. 似ている項目（一致する項目の代表どうし）
+    uf = UnionFind(len(texts))
+    similarities = {}
+    if threshold < 1:
+        shingles = [get_shingles(text) for text in texts]
+        rows = MINHASH_NUM // LSH_BANDS
+        buckets = {}
+        for rep_idx, rep_shingles in enumerate(shingles):
+            signature = get_minhash(rep_shingles)
+            for band in range(LSH_BANDS):
+                key = (band, signature[band * rows : (band + 1) * rows].tobytes())
+                head = buckets.setdefault(key, rep_idx)
+                if head == rep_idx or uf.find(head) == uf.find(rep_idx):
+                    continue
+                similarity = jaccard(shingles[head], rep_shingles)
+                if similarity >= threshold:
+                    uf.union(head, rep_idx)
+                    similarities[rep_idx] = min(similarities.get(rep_idx, 1.0), similarity)
+
+    clusters = {}
+    for rep_idx in range(len(texts)):
+        clusters.setdefault(uf.find(rep_idx), []).append(rep_idx)
+
+    results = []
+    for rep_idxs in clusters.values():
+        item_idxs = sorted(idx for rep_idx in rep_idxs for idx in members[rep_idx])
+        if len(item_idxs) < 2:
+            continue
+        results.append(
+            {
+                "kind": KIND_EXACT if len(rep_idxs) == 1 else KIND_NEAR,
+                "similarity": round(
+                    min([similarities.get(rep_idx, 1.0) for rep_idx in rep_idxs]), 3
+                ),
+                "items": [items[idx] for idx in item_idxs],
+            }
+        )
+    results.sort(key=lambda c: (-len(c["items"]), c["items"][0]["file"], c["items"][0]["line"]))
+    return results
+
+
+def print_clusters(clusters: list, item_num: int, limit: int = 0) -> None:
+    print("")
+    print("【 重複しているテスト項目 】")
+    for cluster_idx, cluster in enumerate(clusters):
+        if limit > 0 and cluster_idx >= limit:
+            print(f"  ... ほか {len(clusters) - limit} 件")
+            break
+        kind = "一致" if cluster["kind"] == KIND_EXACT else f"類似 {cluster['similarity']:.0%}"
+        first_step = cluster["items"][0]["steps"].strip().split("\n")[0]
+        print("")
+        print(f"  #{cluster_idx + 1} {kind} {len(cluster['items'])} 件: {first_step}")
+        for item in cluster["items"]:
+            print(f"    {item['file']}:{item['line']}  [{item['number']}] {item['path']}")
+
+    exact_num = sum(1 for c in clusters if c["kind"] == KIND_EXACT)
+    dup_item_num = sum(len(c["items"]) for c in clusters)
+    print("")
+    print(
+        f"  テスト項目 {item_num} 件中 {dup_item_num} 件が重複"
+        f"（一致 {exact_num} グループ / 類似 {len(clusters) - exact_num} グループ）"
+    )
+
+
+def write_clusters(clusters: list, json_path: str) -> None:
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(clusters, f, ensure_ascii=False, indent=2)
@@ -4,16 +4,58 @@ __author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.
 __version__ = "2.1.0"
 __date__ = "5 June 2024"
 
-import sys
+import io
 import os.path
+import re
+import zipfile
+import datetime
+from collections import namedtuple
+from copy import copy
 from itertools import product
 import pandas as pd
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.styles.borders import BORDER_THIN, BORDER_THICK, BORDER_NONE
-from warningMsgProvider import ExOpStatus, WarningMsgProvider
-import shutil
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.cell.cell import Cell
+from openpyxl.utils import get_column_letter
+from openpyxl.cell._writer import write_cell
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.xml.functions import xmlfile, tostring
+from warningMsgProvider import ExOpStatus, Diagnostics
+from template_cache import get_compiled_template, TRAILING_SHEET_NUM
 import string
-warning_msg_provider = WarningMsgProvider()
+
+# シートを生成済みで保存前の Excel ブック（build_excel_book() の戻り値、save_excel_book() で保存する）
+#   writer:         テンプレートを開いた pd.ExcelWriter
+#   output_fn:      保存先のファイル、またはバイナリのファイルオブジェクト
+#   book:           writer の保存先（メモリ上のバッファ）
+#   sheet_rows:     保存後に行を挿入するシートの (ワークシート, 行) のリスト
+#   sheet_xmls:     保存後に XML を差し替えるシートの (ワークシート, XML) のリスト
+#   diagnostics:    保存時のエラーの生成に使う Diagnostics
+#   reproducible:   保存時に normalize_book() でブックを正規化するかどうか
+PendingBook = namedtuple(
+    "PendingBook",
+    ["writer", "output_fn", "book", "sheet_rows", "sheet_xmls", "diagnostics", "reproducible"],
+)
+
+# スタイル番号を参照する要素（セル、行、列）
+_STYLE_REF_PATTERN = re.compile(rb'(<(?:c|row) [^>]*?\bs="|<col [^>]*?\bstyle=")([0-9]+)"')
+# スタイル番号を省略した（既定のスタイルの）列
+_UNSTYLED_COL_PATTERN = re.compile(rb"<col (?![^>]*?\bstyle=)")
+
+# 再現可能な出力で、ZIP のエントリとブックのプロパティ（作成日時、更新日時）に設定する日時の既定値
+#   環境変数 SOURCE_DATE_EPOCH（UNIX 時間）を指定した場合はその日時を使う
+#   ZIP に記録できる最も古い日時（1980年1月1日）より前は指定できない
+REPRODUCIBLE_DATE_TIME = datetime.datetime(1980, 1, 1)
+
+# [Content_Types].xml の拡張子ごとの既定の形式（openpyxl は集合から書き出すため、並びが実行ごとに変わる）
+_CONTENT_TYPE_DEFAULTS_PATTERN = re.compile(rb"(?:<Default [^>]*/>)+")
+_CONTENT_TYPE_DEFAULT_PATTERN = re.compile(rb"<Default [^>]*/>")
+
+# ブックのプロパティの作成日時、更新日時
+_CORE_DATE_PATTERN = re.compile(
+    rb"(<dcterms:(?:created|modified)\b[^>]*>)[^<]*(</dcterms:(?:created|modified)>)"
+)
 
 
 def col_num_to_excel_col_name(index):
@@ -44,6 +86,302 @@ def create_combined_col_params(target1, target2, loop_num_of_target2):
     return combined_col_params
 
 
+def get_table_start_row(summary: list, config_excel: dict) -> int:
+    """
+    テスト項目表の見出し行の行番号を返します
+    概要 `summary` の行数に応じて、テスト項目表の開始位置を調整する
+    """
+    summary_line_cnt = len(summary)
+    if summary_line_cnt > config_excel["def_offset_row"]:
+        return summary_line_cnt + 2
+    else:
+        return config_excel["def_offset_row"] + 2
+
+
+def is_test_intention_col(col_idx: int, config_excel: dict) -> bool:
+    """
+    テスト仕様列群と結果列群の境界（各テスト環境枠の先頭列）かどうかを返します
+    """
+    col_num = col_idx + 1
+    remainder = (col_num - len(config_excel["col_name"])) % len(
+        config_excel["col_name_res_area"]
+    )
+    if col_num >= len(config_excel["col_name"]) and remainder == 0:
+        return True
+    else:
+        return False
+
+
+def get_sheet_layout(config_excel: dict, test_env_frame_num: int) -> dict:
+    """
+    テスト項目シートの列数と、列ごとの設定（色、幅、水平位置、垂直位置）を返します（出力エンジン共通）
+    """
+    # 合計列数取得
+    total_col_count = len(config_excel["col_name"]) - 1
+    total_col_count += len(config_excel["col_name_res_area"]) * test_env_frame_num
+
+    return {
+        "total_col_count": total_col_count,
+        # 列のカラーインデックス
+        "color": create_combined_col_params(
+            config_excel["header_color"],
+            config_excel["header_color_res_area"],
+            test_env_frame_num,
+        ),
+        # 列幅インデックス
+        "width": create_combined_col_params(
+            config_excel["width"], config_excel["width_res_area"], test_env_frame_num
+        ),
+        # 水平位置インデックス
+        "horizontal": create_combined_col_params(
+            config_excel["horizontal"],
+            config_excel["horizontal_res_area"],
+            test_env_frame_num,
+        ),
+        # 垂直位置インデックス
+        "vertical": create_combined_col_params(
+            config_excel["vertical"],
+            config_excel["vertical_res_area"],
+            test_env_frame_num,
+        ),
+        "test_intention_cols": [
+            is_test_intention_col(col_idx, config_excel)
+            for col_idx in range(total_col_count)
+        ],
+    }
+
+
+def iter_row_style_keys(
+    marks: list,
+    config_excel: dict,
+    layout: dict,
+    prev_marks: list = (),
+    total_row_num: int = None,
+):
+    """
+    テスト項目の行ごとに、列ごとのスタイルを返します（出力エンジン共通）
+    スタイルは (塗りつぶし色（なしは ""）, 罫線 (左, 右, 上, 下), 配置 (水平, 垂直, 折り返し, 縮小)) で表す
+
+    スタイルは行の種類（テスト観点のレベルと着色状態）だけで決まるため、種類ごとに1回だけ求め、
+    同じ種類の行には同じリストを返す（テスト環境枠が多い場合、結果列群のスタイルは同じものが繰り返される）
+
+    Args:
+        marks:          テスト項目の行ごとの種類（mark 列）
+        config_excel:   設定
+        layout:         get_sheet_layout() の戻り値
+        prev_marks:     marks より前の行の種類（行範囲ごとに生成する場合に、着色状態を引き継ぐために使う）
+        total_row_num:  全体の行数（省略時は len(prev_marks) + len(marks)）
+
+    Yields:
+        (row_key, style_keys):  行の種類、列ごとのスタイルのリスト
+    """
+    lv = list(config_excel["index"])
+    lv_color_fill_flag = [False] * len(config_excel["index"])
+    total_col_count = layout["total_col_count"]
+    arr_color_index = layout["color"]
+    if total_row_num is None:
+        total_row_num = len(prev_marks) + len(marks)
+
+    def update_lv_color_fill_flag(mark) -> bool:
+        """
+        背景の着色フラグを更新します（テスト観点行の場合は True を返す）
+        """
+        is_lv_row = mark in lv
+        if is_lv_row:
+            lv_idx = lv.index(mark)
+            lv_color_fill_flag[lv_idx] = True
+            lv_color_fill_flag[lv_idx + 1 :] = [False] * (
+                len(lv_color_fill_flag) - lv_idx - 1
+            )
+        return is_lv_row
+
+    def create_row_style_keys(mark, is_lv_row, is_last_row) -> list:
+        style_keys = []
+        fill_color = ""
+        # 列ループ
+        for col_idx in range(total_col_count):
+            # 背景色の設定
+            if col_idx < len(lv_color_fill_flag) and lv_color_fill_flag[col_idx]:
+                fill_color = arr_color_index[col_idx]
+            elif is_lv_row:
+                if any(
+                    lv_color_fill_flag[col_idx + 1 :]
+                ):  # 通常はないがテスト観点レベルの追い越しがあった場合の対応  ex. lv1-lv2-lv4
+                    fill_color = ""
+                else:
+                    pass
+            else:
+                fill_color = ""
+
+            # 罫線の設定
+            border_style = {
+                "left": BORDER_NONE,
+                "right": BORDER_NONE,
+                "top": BORDER_NONE,
+                "bottom": BORDER_NONE,
+            }
+
+            # 先頭列
+            if col_idx == 0:
+                border_style["left"] = BORDER_THIN
+            # 末尾列
+            if col_idx == total_col_count - 1:
+                border_style["right"] = BORDER_THIN
+            # 末尾行
+            if is_last_row:
+                border_style["bottom"] = BORDER_THIN
+
+            # テスト観点行
+            wrap_text = True
+            shrink_to_fit = False
+            if is_lv_row:
+                # テスト観点列の番号を必要に応じて縮小表示
+                if col_idx < len(config_excel["index"]):
+                    shrink_to_fit = True
+
+                wrap_text = False
+                if col_idx < len(lv_color_fill_flag) and lv_color_fill_flag[col_idx]:
+                    border_style["left"] = BORDER_THIN
+                    if any(
+                        lv_color_fill_flag[col_idx + 1 :]
+                    ):  # 通常はないがテスト観点レベルの追い越しがあった場合の対応  ex. lv1-lv2-lv4
+                        border_style["right"] = BORDER_THIN
+                    if col_idx == lv.index(mark):
+                        border_style["top"] = BORDER_THIN
+                elif col_idx > lv.index(mark):
+                    border_style["top"] = BORDER_THIN
+                    border_style["bottom"] = BORDER_THIN
+
+            # 項目行
+            else:
+                if col_idx < len(lv_color_fill_flag):
+                    if lv_color_fill_flag[col_idx]:
+                        border_style["left"] = BORDER_THIN
+                        border_style["right"] = BORDER_THIN
+                else:
+                    border_style["left"] = BORDER_THIN
+                    border_style["bottom"] = BORDER_THIN
+
+            # テスト仕様列群と結果列群の境界は太線
+            if layout["test_intention_cols"][col_idx]:
+                border_style["left"] = "medium"
+
+            style_keys.append(
+                (
+                    fill_color,
+                    tuple(border_style.values()),
+                    (
+                        layout["horizontal"][col_idx],
+                        layout["vertical"][col_idx],
+                        wrap_text,
+                        shrink_to_fit,
+                    ),
+                )
+            )
+        return style_keys
+
+    # 行範囲の開始行までの着色状態を引き継ぐ
+    for mark in prev_marks:
+        update_lv_color_fill_flag(mark)
+
+    row_style_keys = {}
+    # 行ループ
+    for row_idx, mark in enumerate(marks):
+        # 背景の着色フラグ準備
+        is_lv_row = update_lv_color_fill_flag(mark)
+        is_last_row = len(prev_marks) + row_idx == total_row_num - 1
+
+        row_key = (
+            mark if is_lv_row else "",
+            is_lv_row,
+            tuple(lv_color_fill_flag),
+            is_last_row,
+        )
+        if row_key not in row_style_keys:
+            row_style_keys[row_key] = create_row_style_keys(mark, is_lv_row, is_last_row)
+        yield row_key, row_style_keys[row_key]
+
+
+def create_row_styler(worksheet, config_excel: dict):
+    """
+    テスト項目の行に、iter_row_style_keys() のスタイルを設定する関数を返します
+    セルのスタイルはブック単位で共有されるため、行の種類ごとに列ごとのスタイル番号を1回だけ求めて登録し、
+    同じ種類の行では番号を付け替えるだけにする
+
+    Returns:
+        style_row:  style_row(row, row_key, style_keys, cols=None, border_only=False)
+                    row 行目の cols 列（列の添字のリスト、省略時は全列）にスタイルを設定する
+                    border_only を指定した場合は罫線のみ設定する（入力済みのセルの塗りつぶしなどを残す）
+    """
+    wb = worksheet.parent
+    font_id = wb._fonts.add(Font(name=config_excel["font"], color="000000", size=9))
+
+    # 塗りつぶし・罫線・配置の値 -> スタイル番号（結果列群のスタイルはテスト環境枠ごとに同じものを使う）
+    style_id_cache = {}
+    row_style_ids = {}
+
+    def get_style_id(collection, key, create):
+        if (collection, key) not in style_id_cache:
+            style_id_cache[(collection, key)] = getattr(wb, collection).add(create())
+        return style_id_cache[(collection, key)]
+
+    def create_row_style_ids(style_keys) -> list:
+        """
+        行のスタイル（列ごとの 塗りつぶし, 罫線, 配置 の番号）を求めます（塗りつぶしなしは None）
+        """
+        style_ids = []
+        for fill_color, border, alignment in style_keys:
+            fill_id = None
+            if fill_color:
+                fill_id = get_style_id(
+                    "_fills",
+                    fill_color,
+                    lambda: PatternFill(patternType="solid", fgColor=fill_color),
+                )
+            border_id = get_style_id(
+                "_borders",
+                border,
+                lambda: Border(
+                    left=Side(style=border[0]),
+                    right=Side(style=border[1]),
+                    top=Side(style=border[2]),
+                    bottom=Side(style=border[3]),
+                ),
+            )
+            alignment_id = get_style_id(
+                "_alignments",
+                alignment,
+                lambda: Alignment(
+                    horizontal=alignment[0],
+                    vertical=alignment[1],
+                    wrap_text=alignment[2],
+                    shrink_to_fit=alignment[3],
+                ),
+            )
+            style_ids.append((fill_id, border_id, alignment_id))
+        return style_ids
+
+    def style_row(row, row_key, style_keys, cols=None, border_only=False):
+        if row_key not in row_style_ids:
+            row_style_ids[row_key] = create_row_style_ids(style_keys)
+        style_ids = row_style_ids[row_key]
+        for col_idx in range(len(style_ids)) if cols is None else cols:
+            fill_id, border_id, alignment_id = style_ids[col_idx]
+            cell = worksheet.cell(row=row, column=col_idx + 1)
+            if not cell._style:
+                cell._style = StyleArray()
+            style = cell._style
+            style.borderId = border_id
+            if border_only:
+                continue
+            if fill_id is not None:
+                style.fillId = fill_id
+            style.alignmentId = alignment_id
+            style.fontId = font_id
+
+    return style_row
+
+
 def write_test_specification(
     df: pd.DataFrame,
     sheet_name: str,
@@ -52,26 +390,31 @@ def write_test_specification(
     writer: pd.ExcelWriter,
     config_excel: dict,
     merge_cells: bool,
+    row_range: tuple = None,
 ) -> None:
-    def is_test_intention_col(col_idx):
-        col_num = col_idx + 1
-        remainder = (col_num - len(config_excel["col_name"])) % len(
-            config_excel["col_name_res_area"]
-        )
-        if col_num >= len(config_excel["col_name"]) and remainder == 0:
-            return True
-        else:
-            return False
+    """
+    テスト項目シートを生成します
 
+    Args:
+        row_range:  書き出すテスト項目の行範囲 (開始, 終了)（省略時は全行）
+                    見出しなどの行範囲によらない部分は常に書き出す
+                    範囲の行は、テスト観点の着色状態を含めて全行を書き出した場合と同じ内容で
+                    見出し行の直後から詰めて書き出す（行範囲ごとに並列に生成する場合に使う）
+    """
     test_env_frame_num = len(test_env_frame)
 
-    df_excel = df.copy()
-    df_excel.rename(columns=config_excel["col_name"], inplace=True)
+    total_row_num = len(df)
+    prev_marks = []
+    if row_range:
+        prev_marks = df["mark"].iloc[: row_range[0]].tolist()
+        df = df.iloc[row_range[0] : row_range[1]]
+
+    # 列名はまとめて1回で変更する（テスト環境枠が多い場合に列ごとの変更とコピーが支配的になるため）
+    rename_map = dict(config_excel["col_name"])
     for idx in range(test_env_frame_num):
         for k, v in config_excel["col_name_res_area"].items():
-            tmp_k = k + "_" + str(idx + 1)
-            tmp_v = v + str(idx + 1)
-            df_excel.rename(columns={tmp_k: tmp_v}, inplace=True)
+            rename_map[k + "_" + str(idx + 1)] = v + str(idx + 1)
+    df_excel = df.rename(columns=rename_map, copy=False)
 
     # マージできるようにマルチインデックス化
     # ※ マルチインデックス化の機能は、運用上のため将来的に削除したい
@@ -100,12 +443,7 @@ def write_test_specification(
             output_cols.append(tmp_v)
 
     # 書き出し開始行の設定
-    #   概要 `summary` の行数に応じて、テスト項目表の開始位置を調整する
-    summary_line_cnt = len(summary)
-    if summary_line_cnt > config_excel["def_offset_row"]:
-        tb_start_row = summary_line_cnt + 2
-    else:
-        tb_start_row = config_excel["def_offset_row"] + 2
+    tb_start_row = get_table_start_row(summary, config_excel)
 
     # データフレームをエクセルシートに変換
     df_excel.to_excel(
@@ -125,14 +463,17 @@ def write_test_specification(
             len(config_excel["col_name"]) + len(config_excel["col_name_res_area"]) * i
         )
         for idx, key in enumerate(config_excel["col_name_res_area"]):
-            col = col_num_to_excel_col_name(start_col + idx)
-            __col_address = col + str(tb_start_row)
-            worksheet[__col_address].value = config_excel["col_name_res_area"][key]
+            worksheet.cell(
+                row=tb_start_row,
+                column=start_col + idx,
+                value=config_excel["col_name_res_area"][key],
+            )
 
             # テスト環境枠の名称を設定
             if idx == 0:
-                __col_address = col + str(tb_start_row - 1)
-                worksheet[__col_address].value = test_env_frame[i]
+                worksheet.cell(
+                    row=tb_start_row - 1, column=start_col + idx, value=test_env_frame[i]
+                )
 
     # 行固定
     worksheet.freeze_panes = "A" + str(tb_start_row + 1)
@@ -143,173 +484,422 @@ def write_test_specification(
 
     # ここからExcelデータの見た目を整えていく
 
-    # 合計列数取得
-    total_col_count = len(config_excel["col_name"]) - 1
-    total_col_count += len(config_excel["col_name_res_area"]) * test_env_frame_num
-
-    # 列のカラーインデックス作成
-    arr_color_index = create_combined_col_params(
-        config_excel["header_color"],
-        config_excel["header_color_res_area"],
-        test_env_frame_num,
-    )
+    layout = get_sheet_layout(config_excel, test_env_frame_num)
+    total_col_count = layout["total_col_count"]
 
     # ヘッダーのスタイル設定
+    header_font = Font(name=config_excel["font"], b=True, color="000000", size=9)
+    header_alignment = Alignment(
+        text_rotation=255, vertical="center", horizontal="center", wrap_text=True
+    )
     for col_idx in range(total_col_count):
-        col = col_num_to_excel_col_name(col_idx + 1)
-        __col_address = col + str(tb_start_row)
-        worksheet[__col_address].font = Font(
-            name=config_excel["font"], b=True, color="000000", size=9
-        )
-        worksheet[__col_address].alignment = Alignment(
-            text_rotation=255, vertical="center", horizontal="center", wrap_text=True
-        )
-        worksheet[__col_address].fill = PatternFill(
-            patternType="solid", fgColor=arr_color_index[col_idx]
+        header_cell = worksheet.cell(row=tb_start_row, column=col_idx + 1)
+        header_cell.font = header_font
+        header_cell.alignment = header_alignment
+        header_cell.fill = PatternFill(
+            patternType="solid", fgColor=layout["color"][col_idx]
         )
-        worksheet[__col_address].border = Border(
+        header_cell.border = Border(
             left=Side(
                 # テスト仕様列群と結果列群の境界は太線
-                style="medium" if is_test_intention_col(col_idx) else BORDER_THIN
+                style="medium" if layout["test_intention_cols"][col_idx] else BORDER_THIN
             ),
             right=Side(style=BORDER_THIN),
             top=Side(style=BORDER_THIN),
             bottom=Side(style=BORDER_THIN),
         )
-        worksheet[__col_address].value = worksheet[__col_address].value.rstrip()
-        worksheet.row_dimensions[tb_start_row].height = config_excel["height"]["header"]
+        header_cell.value = header_cell.value.rstrip()
+    worksheet.row_dimensions[tb_start_row].height = config_excel["height"]["header"]
 
-    # 列幅インデックス
-    arr_width_index = create_combined_col_params(
-        config_excel["width"], config_excel["width_res_area"], test_env_frame_num
-    )
+    # 列幅
     for col_idx in range(total_col_count):
         col_name = col_num_to_excel_col_name(col_idx + 1)
-        worksheet.column_dimensions[col_name].width = arr_width_index[col_idx]
+        worksheet.column_dimensions[col_name].width = layout["width"][col_idx]
 
     # データセルのスタイル調整
-
-    lv = list(config_excel["index"])
-    lv_color_fill_flag = [False] * len(config_excel["index"])
-    is_lv_row = False
+    style_row = create_row_styler(worksheet, config_excel)
+    marks = df_excel[config_excel["col_name"]["mark"]].tolist()
 
     # 行ループ
-    for row_idx in range(len(df_excel)):
-        # 背景の着色フラグ準備
-        mark = df_excel.iloc[row_idx]["MARK"]
-        is_lv_row = mark in lv
-        if is_lv_row:
-            lv_idx = lv.index(mark)
-            lv_color_fill_flag[lv_idx] = True
-            lv_color_fill_flag[lv_idx + 1 :] = [False] * (
-                len(lv_color_fill_flag) - lv_idx - 1
-            )
-        fill_color = ""
+    for row_idx, (row_key, style_keys) in enumerate(
+        iter_row_style_keys(marks, config_excel, layout, prev_marks, total_row_num)
+    ):
+        style_row(row_idx + 1 + tb_start_row, row_key, style_keys)
 
-        # 水平位置インデックス
-        arr_horizontal_index = create_combined_col_params(
-            config_excel["horizontal"],
-            config_excel["horizontal_res_area"],
-            test_env_frame_num,
+    # テスト項目の ID を表の右端の非表示列に埋め込む（仕様更新時に実施結果を引き継ぐために使う）
+    item_id_col = config_excel["item_id"]["col_name"]
+    if item_id_col in df.columns:
+        id_col_idx = total_col_count + 1
+        worksheet.cell(
+            row=tb_start_row, column=id_col_idx, value=config_excel["item_id"]["header"]
         )
-        # 垂直位置インデックス
-        arr_vertical_index = create_combined_col_params(
-            config_excel["vertical"],
-            config_excel["vertical_res_area"],
-            test_env_frame_num,
+        for row_idx, item_id in enumerate(df[item_id_col]):
+            if item_id:
+                worksheet.cell(
+                    row=row_idx + 1 + tb_start_row, column=id_col_idx, value=item_id
+                )
+        worksheet.column_dimensions[
+            col_num_to_excel_col_name(id_col_idx)
+        ].hidden = True
+
+
+def build_sheet_payload(
+    df: pd.DataFrame,
+    sheet_name: str,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+    merge_cells: bool,
+) -> dict:
+    """
+    テスト項目シートを作業用のブック上で生成し、シートの XML（ワークシートのパート全体）に変換します
+    （ワーカープロセスで実行し、シートの生成から XML への変換までを章ごとに並列化するために使う）
+
+    Returns:
+        payload:    sheet_name, xml（シートの XML）, styles（作業用のブックでのスタイル番号 -> スタイル）,
+                    style_keys（作業用のブックでのスタイル番号 -> スタイルを XML で表した照合用のキー）
+    """
+    writer = pd.ExcelWriter(io.BytesIO(), engine="openpyxl")
+    write_test_specification(
+        df, sheet_name, summary, test_env_frame, writer, config_excel, merge_cells
+    )
+    wb = writer.book
+    ws = wb[sheet_name]
+    # 書き写した先のブックでは先頭のシートを選択するため、作業用のブックでの選択状態は外しておく
+    ws.sheet_view.tabSelected = False
+
+    # openpyxl の保存処理（ExcelWriter.write_worksheet()）と同じ形式で書き出す
+    # テスト項目シートは図形・コメント・ハイパーリンク（別のパートへの参照）を持たないため、XML だけで完結する
+    sheet_writer = WorksheetWriter(ws, out=io.BytesIO())
+    sheet_writer.write()
+    # 列は既定のスタイル（番号 0）の場合に番号が省略されるが、書き写した先のブックでは既定のスタイルの番号が
+    # 0 とは限らないため（テンプレートのスタイルが先に並ぶ）、明示して付け替えの対象にする
+    xml = _UNSTYLED_COL_PATTERN.sub(b'<col style="0" ', sheet_writer.read())
+
+    # スタイル番号は書き出しの際に確定するため、書き出した後に集める
+    # 番号 0 は既定のスタイル（スタイルなし）のため含めない
+    # 照合用のキーもここで求めておく（スタイルのオブジェクトどうしの比較は遅く、シートが多いと書き写す側の処理が支配的になるため）
+    styles = {}
+    style_keys = {}
+    cell = Cell(ws)  # スタイル取得用（シートには追加しない）
+    for style_id, style_array in enumerate(wb._cell_styles):
+        if style_id == 0:
+            continue
+        cell._style = copy(style_array)
+        style = (
+            copy(cell.font),
+            copy(cell.fill),
+            copy(cell.border),
+            copy(cell.alignment),
+            copy(cell.protection),
+            cell.number_format,
+        )
+        styles[style_id] = style
+        style_keys[style_id] = b"".join(
+            [tostring(obj.to_tree()) for obj in style[:5]] + [style[5].encode()]
         )
-        # 列ループ
-        for col_idx in range(total_col_count):
-            col_name = col_num_to_excel_col_name(col_idx + 1)
-            __col_address = col_name + f"{row_idx + 1 + tb_start_row}"
 
-            # 背景色の設定
-            if col_idx < len(lv_color_fill_flag) and lv_color_fill_flag[col_idx]:
-                fill_color = arr_color_index[col_idx]
-            elif is_lv_row:
-                if any(
-                    lv_color_fill_flag[col_idx + 1 :]
-                ):  # 通常はないがテスト観点レベルの追い越しがあった場合の対応  ex. lv1-lv2-lv4
-                    fill_color = ""
-                else:
-                    pass
-            else:
-                fill_color = ""
+    return {"sheet_name": sheet_name, "xml": xml, "styles": styles, "style_keys": style_keys}
 
-            if fill_color:
-                worksheet[__col_address].fill = PatternFill(
-                    patternType="solid", fgColor=fill_color
-                )
 
-            # 罫線の設定
-            border_style = {
-                "left": BORDER_NONE,
-                "right": BORDER_NONE,
-                "top": BORDER_NONE,
-                "bottom": BORDER_NONE,
-            }
+def register_styles(
+    ws, styles: dict, style_cache: dict = None, style_keys: dict = None
+) -> dict:
+    """
+    作業用のブックのスタイルを、ws のブックに登録します
 
-            # 先頭列
-            if col_idx == 0:
-                border_style["left"] = BORDER_THIN
-            # 末尾列
-            if col_idx == total_col_count - 1:
-                border_style["right"] = BORDER_THIN
-            # 末尾行
-            if row_idx == len(df_excel) - 1:
-                border_style["bottom"] = BORDER_THIN
+    Args:
+        ws:             登録先のブックのシート
+        styles:         作業用のブックでのスタイル番号 -> (font, fill, border, alignment, protection, number_format)
+        style_cache:    スタイルのキー -> 登録済みのスタイル番号（同じブックに複数のシートを書き写す場合に共有する）
+        style_keys:     作業用のブックでのスタイル番号 -> スタイルのキー（省略時はスタイルそのものをキーにする）
 
-            # テスト観点行
-            wrap_text = True
-            shrink_to_fit = False
-            if is_lv_row:
-                # テスト観点列の番号を必要に応じて縮小表示
-                if col_idx < len(config_excel["index"]):
-                    shrink_to_fit = True
+    Returns:
+        style_ids:      作業用のブックでのスタイル番号 -> ws のブックでのスタイル番号（XML に埋め込むため bytes）
+    """
+    if style_cache is None:
+        style_cache = {}
+    style_ids = {}
+    for style_id, style in styles.items():
+        key = style_keys[style_id] if style_keys else style
+        if key not in style_cache:
+            font, fill, border, alignment, protection, number_format = style
+            cell = Cell(ws)  # スタイル登録用（シートには追加しない）
+            cell.font = font
+            cell.fill = fill
+            cell.border = border
+            cell.alignment = alignment
+            cell.protection = protection
+            cell.number_format = number_format
+            style_cache[key] = cell.style_id
+        style_ids[str(style_id).encode()] = str(style_cache[key]).encode()
+    return style_ids
 
-                wrap_text = False
-                if col_idx < len(lv_color_fill_flag) and lv_color_fill_flag[col_idx]:
-                    border_style["left"] = BORDER_THIN
-                    if any(
-                        lv_color_fill_flag[col_idx + 1 :]
-                    ):  # 通常はないがテスト観点レベルの追い越しがあった場合の対応  ex. lv1-lv2-lv4
-                        border_style["right"] = BORDER_THIN
-                    if col_idx == lv.index(mark):
-                        border_style["top"] = BORDER_THIN
-                elif col_idx > lv.index(mark):
-                    border_style["top"] = BORDER_THIN
-                    border_style["bottom"] = BORDER_THIN
 
-            # 項目行
-            else:
-                if col_idx < len(lv_color_fill_flag):
-                    if lv_color_fill_flag[col_idx]:
-                        border_style["left"] = BORDER_THIN
-                        border_style["right"] = BORDER_THIN
-                else:
-                    border_style["left"] = BORDER_THIN
-                    border_style["bottom"] = BORDER_THIN
+def apply_sheet_payload(
+    wb, payload: dict, sheet_name: str = None, style_cache: dict = None
+) -> tuple:
+    """
+    build_sheet_payload() で生成したシートを、空のシートとしてブックに追加します
+    シートの内容は保存後のブックで replace_sheet_xmls() により差し替える
+    （セルごとにブックへ書き写さないため、シートの数や行数が多くてもここでの処理は増えない）
 
-            # テスト仕様列群と結果列群の境界は太線
-            if is_test_intention_col(col_idx):
-                border_style["left"] = "medium"
+    Args:
+        wb:             追加先のブック
+        payload:        build_sheet_payload() の戻り値
+        sheet_name:     シート名（省略時は payload のシート名）
+        style_cache:    register_styles() のスタイルのキャッシュ（ブック内のシートで共有する）
+
+    Returns:
+        ws:             追加したシート
+        xml:            スタイル番号をこのブックの番号に付け替えたシートの XML
+    """
+    ws = wb.create_sheet(sheet_name or payload["sheet_name"])
+    style_ids = register_styles(
+        ws, payload["styles"], style_cache, payload["style_keys"]
+    )
+    style_ids[b"0"] = str(wb._cell_styles.add(StyleArray())).encode()
+    xml = _STYLE_REF_PATTERN.sub(
+        lambda m: m.group(1) + style_ids[m.group(2)] + b'"', payload["xml"]
+    )
+    return ws, xml
 
-            worksheet[__col_address].border = Border(
-                left=Side(style=border_style["left"]),
-                right=Side(style=border_style["right"]),
-                top=Side(style=border_style["top"]),
-                bottom=Side(style=border_style["bottom"]),
-            )
 
-            worksheet[__col_address].alignment = Alignment(
-                horizontal=arr_horizontal_index[col_idx],
-                vertical=arr_vertical_index[col_idx],
-                wrap_text=wrap_text,
-                shrink_to_fit=shrink_to_fit,
+def build_row_range_fragment(
+    df: pd.DataFrame,
+    sheet_name: str,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+    row_range: tuple,
+) -> dict:
+    """
+    テスト項目シートの指定した行範囲を作業用のブック上で生成し、シートの XML の行（<row>）に変換します
+    （ワーカープロセスで実行し、1つのシートの生成処理を行範囲ごとに並列化するために使う）
+
+    Returns:
+        fragment:   xml（行範囲の <row> 要素を連結したもの）, styles（作業用のブックでのスタイル番号 -> スタイル）,
+                    max_row, max_column（使用している最大の行番号、列番号）
+    """
+    writer = pd.ExcelWriter(io.BytesIO(), engine="openpyxl")
+    write_test_specification(
+        df, sheet_name, summary, test_env_frame, writer, config_excel, False, row_range
+    )
+    ws = writer.book[sheet_name]
+
+    # 見出し行の直後から詰めて書き出した行を、シート上の本来の行番号に移す
+    # （作業用のブックは保存しないため、セルの行番号だけを付け替える）
+    tb_start_row = get_table_start_row(summary, config_excel)
+    first_row = tb_start_row + 1
+    last_row = tb_start_row + row_range[1] - row_range[0]
+    rows = {}
+    styles = {}
+    max_column = 0
+    for (row, col), cell in sorted(ws._cells.items()):
+        if row < first_row or row > last_row:
+            continue
+        if row not in rows:
+            rows[row] = []
+        rows[row].append(cell)
+        cell.row = row + row_range[0]
+        max_column = max(max_column, col)
+        if cell.has_style and cell.style_id not in styles:
+            styles[cell.style_id] = (
+                copy(cell.font),
+                copy(cell.fill),
+                copy(cell.border),
+                copy(cell.alignment),
+                copy(cell.protection),
+                cell.number_format,
             )
-            worksheet[__col_address].font = Font(
-                name=config_excel["font"], color="000000", size=9
+
+    # openpyxl の WorksheetWriter.write_row() と同じ形式で書き出す
+    buf = io.BytesIO()
+    with xmlfile(buf) as xf:
+        with xf.element("sheetData"):
+            for row, cells in rows.items():
+                attrs = {"r": str(row + row_range[0])}
+                attrs.update(ws.row_dimensions.get(row, {}))
+                with xf.element("row", attrs):
+                    for cell in cells:
+                        if cell._value is None and not cell.has_style:
+                            continue
+                        write_cell(xf, ws, cell, cell.has_style)
+    xml = buf.getvalue()
+    if xml.endswith(b"</sheetData>"):
+        xml = xml[xml.index(b">") + 1 : -len(b"</sheetData>")]
+    else:
+        xml = b""  # 行がない場合は <sheetData /> となる
+
+    return {
+        "sheet_name": sheet_name,
+        "row_range": row_range,
+        "xml": xml,
+        "styles": styles,
+        "max_row": max(rows, default=-row_range[0]) + row_range[0],
+        "max_column": max_column,
+    }
+
+
+def apply_row_range_fragments(wb, ws, fragments: list) -> tuple[bytes, str]:
+    """
+    build_row_range_fragment() で生成した行を、ブックのスタイル番号に付け替えて連結します
+    行は保存後のシートに insert_sheet_rows() で挿入する
+
+    Returns:
+        xml:        連結した <row> 要素
+        dimension:  行を挿入した後のシートの使用範囲（例: A1:AD120）
+    """
+    cell_pattern = re.compile(rb'(<c r="[A-Z]+[0-9]+" s=")([0-9]+)"')
+    xmls = []
+    max_row = ws.max_row
+    max_column = ws.max_column
+    style_cache = {}
+    for fragment in fragments:
+        # スタイルはブック単位で共有されるため、作業用のブックでの番号をこのブックの番号に付け替える
+        style_ids = register_styles(ws, fragment["styles"], style_cache)
+        xmls.append(
+            cell_pattern.sub(
+                lambda m: m.group(1) + style_ids[m.group(2)] + b'"', fragment["xml"]
             )
+        )
+        max_row = max(max_row, fragment["max_row"])
+        max_column = max(max_column, fragment["max_column"])
+
+    dimension = (
+        get_column_letter(ws.min_column)
+        + str(ws.min_row)
+        + ":"
+        + get_column_letter(max_column)
+        + str(max_row)
+    )
+    return b"".join(xmls), dimension
+
+
+def insert_sheet_rows(book: bytes, sheet_rows: dict) -> bytes:
+    """
+    保存したブックのシートの XML に、apply_row_range_fragments() で連結した行を挿入します
+
+    Args:
+        book:       保存したブックの内容
+        sheet_rows: シートの XML のパス -> (xml, dimension)
+
+    Returns:
+        book:       行を挿入したブックの内容
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(book)) as zin, zipfile.ZipFile(
+        buf, "w", zipfile.ZIP_DEFLATED
+    ) as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename in sheet_rows:
+                xml, dimension = sheet_rows[info.filename]
+                data = re.sub(
+                    rb'<dimension ref="[^"]*"',
+                    b'<dimension ref="' + dimension.encode() + b'"',
+                    data,
+                    count=1,
+                )
+                data = data.replace(b"</sheetData>", xml + b"</sheetData>", 1)
+            zout.writestr(info, data)
+    return buf.getvalue()
+
+
+def replace_sheet_xmls(book: bytes, sheet_xmls: dict) -> bytes:
+    """
+    保存したブックのシートの XML を、apply_sheet_payload() で付け替えた XML に差し替えます
+
+    Args:
+        book:       保存したブックの内容
+        sheet_xmls: シートの XML のパス -> 差し替える XML
+
+    Returns:
+        book:       シートを差し替えたブックの内容
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(book)) as zin, zipfile.ZipFile(
+        buf, "w", zipfile.ZIP_DEFLATED
+    ) as zout:
+        for info in zin.infolist():
+            if info.filename in sheet_xmls:
+                zout.writestr(info, sheet_xmls[info.filename])
+            else:
+                zout.writestr(info, zin.read(info))
+    return buf.getvalue()
+
+
+def get_reproducible_date_time() -> datetime.datetime:
+    """
+    再現可能な出力でブックに記録する日時を返します（SOURCE_DATE_EPOCH、または REPRODUCIBLE_DATE_TIME）
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH", "")
+    if not epoch.strip():
+        return REPRODUCIBLE_DATE_TIME
+    date_time = datetime.datetime.fromtimestamp(
+        int(epoch), tz=datetime.timezone.utc
+    ).replace(tzinfo=None)
+    return max(date_time, REPRODUCIBLE_DATE_TIME)
+
+
+def normalize_book(book: bytes, date_time: datetime.datetime = None) -> bytes:
+    """
+    同じ入力・設定・テンプレートから常に同じバイト列になるよう、保存したブックを正規化します
+    （成果物を内容のハッシュで比較・キャッシュするために使う）
+
+    - ZIP のエントリの日時を固定し、エントリを [Content_Types].xml、パス名の順に並べる
+    - [Content_Types].xml の拡張子ごとの既定の形式（Default）を並べ替える
+    - エントリの属性（作成したOS、ファイルの属性）を実行環境によらない値にする
+    - ブックのプロパティ（docProps/core.xml）の作成日時、更新日時を固定する
+
+    Args:
+        book:       保存したブックの内容
+        date_time:  記録する日時（UTC、省略時は get_reproducible_date_time()）
+
+    Returns:
+        book:       正規化したブックの内容
+    """
+    if date_time is None:
+        date_time = get_reproducible_date_time()
+    w3cdtf = date_time.strftime("%Y-%m-%dT%H:%M:%SZ").encode()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(book)) as zin, zipfile.ZipFile(
+        buf, "w", zipfile.ZIP_DEFLATED
+    ) as zout:
+        names = sorted(
+            zin.namelist(), key=lambda name: (name != "[Content_Types].xml", name)
+        )
+        for name in names:
+            data = zin.read(name)
+            if name == "docProps/core.xml":
+                data = _CORE_DATE_PATTERN.sub(rb"\g<1>" + w3cdtf + rb"\g<2>", data)
+            elif name == "[Content_Types].xml":
+                data = _CONTENT_TYPE_DEFAULTS_PATTERN.sub(
+                    lambda m: b"".join(sorted(_CONTENT_TYPE_DEFAULT_PATTERN.findall(m.group(0)))),
+                    data,
+                )
+            info = zipfile.ZipInfo(name, date_time=date_time.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 0
+            info.external_attr = 0
+            zout.writestr(info, data)
+    return buf.getvalue()
+
+
+def is_overwritable(output_fn: str, overwrite) -> bool:
+    """
+    保存先に書き込んでよいかを判定します（スキップする場合はその旨を表示する）
+
+    Args:
+        output_fn:  保存先のファイル
+        overwrite:  保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+    """
+    if not os.path.exists(output_fn) or overwrite is True:
+        return True
+    if callable(overwrite) and overwrite(output_fn):
+        return True
+    print(output_fn + " の書き込みをスキップしました\n")
+    return False
 
 
 def convert_df_to_excel(
@@ -319,13 +909,53 @@ def convert_df_to_excel(
     summaries: list[list],
     test_env_frames: list[list],
     config_excel: dict,
-    input_path: str,
-    output_fn: str = "TestSpec.xlsm",
+    input_path,
+    output_fn="TestSpec.xlsm",
     merge_cells: bool = True,
+    overwrite=False,
+    payloads: list = None,
+    row_fragments: list = None,
 ) -> None:
     """
     convert_md_to_df()により生成されたデータフレームをエクセルシートに変換します
     生成したシートを指定のエクセルファイルに追加します
+    （引数は build_excel_book() と同じ、シートの生成と保存を続けて行う）
+    """
+    pending = build_excel_book(
+        dfs,
+        sheet_names,
+        product_categories,
+        summaries,
+        test_env_frames,
+        config_excel,
+        input_path,
+        output_fn=output_fn,
+        merge_cells=merge_cells,
+        overwrite=overwrite,
+        payloads=payloads,
+        row_fragments=row_fragments,
+    )
+    if pending is not None:
+        save_excel_book(pending)
+
+
+def build_excel_book(
+    dfs: list[pd.DataFrame],
+    sheet_names: list[str],
+    product_categories: list[str],
+    summaries: list[list],
+    test_env_frames: list[list],
+    config_excel: dict,
+    input_path,
+    output_fn="TestSpec.xlsm",
+    merge_cells: bool = True,
+    overwrite=False,
+    payloads: list = None,
+    row_fragments: list = None,
+) -> PendingBook:
+    """
+    テンプレートを開き、convert_md_to_df()により生成されたデータフレームのシートを追加します
+    保存（XML の生成と圧縮、書き込み）は save_excel_book() で行う
 
     Args:
         dfs:                convert_md_to_df()により生成されたデータフレーム
@@ -334,43 +964,51 @@ def convert_df_to_excel(
         summares:           タイトル名、および概要欄の入力文章
         test_env_frames:    テスト環境枠
         config_excel:       設定
-        input_path:         エクセルのテンプレファイル
-        output_fn:          出力先のファイル
+        input_path:         エクセルのテンプレファイル（パス、または内容の bytes）
+                            製品カテゴリの表紙シートだけを残したテンプレート（template_cache）に変換して使う
+        output_fn:          出力先のファイル、またはバイナリのファイルオブジェクト（ディスクに書き込まずに出力する）
         merge_cells:        テスト観点のセルを結合するかどうか（非サポート）
+        overwrite:          保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+        payloads:           build_sheet_payload()で生成済みのシート（dfs と同じ順序）
+                            指定した場合はテスト項目シートを生成せず、保存後に生成済みの XML に差し替える
+        row_fragments:      build_row_range_fragment()で行範囲ごとに生成済みの行（dfs と同じ順序のシートごとのリスト）
+                            指定した場合はテスト項目の行を除いたシートを生成し、保存後に行を挿入する
+
+    設定の reproducible が true の場合は、保存時に normalize_book() で正規化する
+    （同じ入力・設定・テンプレートから常に同じバイト列のブックを出力する）
 
     Returns:
-        None
+        pending:            保存前のブック（保存先に書き込まない場合は None）
     """
 
-    # テンプレートからエクセルファイルを複製
-    try:
-        warning_msg_provider.setTargetFP(output_fn)
-
-        if os.path.exists(output_fn):
-            print("\n保存先のファイルが既に存在します " + "(" + output_fn + ")")
-            while True:
-                user_input = input("→ 上書きしますか? (y/n): ").lower()
-                if user_input == 'y':
-                    print("")
-                    break
-                elif user_input == 'n':
-                    print(output_fn + " の書き込みをスキップしました\n")
-                    return 
-                else:
-                    print("→ 'y' または 'n' いずれかのキーを押してください")
+    # 製品カテゴリの表紙シートを選定済みのテンプレートを取得
+    compiled_template = get_compiled_template(
+        input_path, product_categories[0], config_excel.get("template_cache_dir")
+    )
 
-        shutil.copy2(input_path, output_fn)
-    except PermissionError:
-        msg = warning_msg_provider.buildMsg(ExOpStatus.ERROR_CODE_1.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+    # テンプレートからエクセルファイルを複製
+    #   保存先には save_excel_book() で書き込む（保存前に中止した場合に、テンプレートのままのファイルを残さない）
+    is_stream = hasattr(output_fn, "write")
+    if is_stream:
+        output_name = getattr(output_fn, "name", "")
+        diagnostics = Diagnostics(output_name if isinstance(output_name, str) else "")
+    else:
+        diagnostics = Diagnostics(output_fn)
+        if not is_overwritable(output_fn, overwrite):
+            return None
+    book = io.BytesIO(compiled_template)
 
     writer = pd.ExcelWriter(
-        output_fn, mode="a", engine="openpyxl", engine_kwargs={"keep_vba": True}
+        book, mode="a", engine="openpyxl", engine_kwargs={"keep_vba": True}
     )
 
-    # テスト項目シート追加
+    # テスト項目シート追加（テンプレートの末尾のシートより前に並べる）
+    wb = writer.book
+    template_sheets = list(wb._sheets)
+    insert_idx = len(template_sheets) - TRAILING_SHEET_NUM
+    sheet_rows = []
+    sheet_xmls = []
+    style_cache = {}
     try:
         for idx, df in enumerate(dfs):
             sheet_name = (
@@ -378,48 +1016,87 @@ def convert_df_to_excel(
             )
             summary = summaries[idx]
             test_env_frame = test_env_frames[idx]
-            write_test_specification(
-                df,
-                sheet_name,
-                summary,
-                test_env_frame,
-                writer,
-                config_excel,
-                merge_cells,
-            )
+            if row_fragments:
+                write_test_specification(
+                    df,
+                    sheet_name,
+                    summary,
+                    test_env_frame,
+                    writer,
+                    config_excel,
+                    merge_cells,
+                    row_range=(0, 0),
+                )
+                ws = wb[sheet_name]
+                sheet_rows.append(
+                    (ws, apply_row_range_fragments(wb, ws, row_fragments[idx]))
+                )
+            elif payloads:
+                sheet_xmls.append(
+                    apply_sheet_payload(wb, payloads[idx], sheet_name, style_cache)
+                )
+            else:
+                write_test_specification(
+                    df,
+                    sheet_name,
+                    summary,
+                    test_env_frame,
+                    writer,
+                    config_excel,
+                    merge_cells,
+                )
 
-            # シート移動
-            wb = writer.book
-            ws = wb[sheet_name]
-            wb.move_sheet(ws, offset=-3)
-
-        # 製品カテゴリの表紙シート選定
-        product_categorie = product_categories[0]
-        summary_sheet_title = "表紙_共通"
-        specified_summary_sheet_title = "表紙_" + product_categorie
-        if specified_summary_sheet_title in [ws.title for ws in wb.worksheets]:
-            summary_sheet_title = specified_summary_sheet_title
-        for ws in wb.worksheets:
-            if ws.title.startswith("表紙"):
-                if ws.title != summary_sheet_title:
-                    wb.remove(ws)
-                else:
-                    if summary_sheet_title == "表紙_共通":
-                        ws.cell(row=1, column=1, value=product_categorie)
-                    ws.title = '表紙'
+        # シート移動（追加したシートをまとめて挿入位置へ移す）
+        added_sheets = wb._sheets[len(template_sheets) :]
+        wb._sheets = (
+            template_sheets[:insert_idx] + added_sheets + template_sheets[insert_idx:]
+        )
 
         # シートのタブ選択状態を解除して先頭シートを選択
-        for ws in wb.worksheets:
+        for ws in added_sheets:
             ws.sheet_view.tabSelected = False
         wb.active = wb.worksheets[0]
+    except ValueError as e:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_2.value) from e
+
+    return PendingBook(
+        writer,
+        output_fn,
+        book,
+        sheet_rows,
+        sheet_xmls,
+        diagnostics,
+        bool(config_excel.get("reproducible")),
+    )
+
 
-        # 保存
+def save_excel_book(pending: PendingBook) -> None:
+    """
+    build_excel_book() で生成したブックを保存します
+    """
+    writer, output_fn, book, sheet_rows, sheet_xmls, diagnostics, reproducible = pending
+    try:
         writer.close()
+        data = book.getvalue()
+        # シートの XML のパスは保存時に決まる
+        if sheet_rows:
+            rows = {ws.path[1:]: xml_dimension for ws, xml_dimension in sheet_rows}
+            data = insert_sheet_rows(data, rows)
+        if sheet_xmls:
+            data = replace_sheet_xmls(data, {ws.path[1:]: xml for ws, xml in sheet_xmls})
+        if reproducible:
+            data = normalize_book(data)
     except ValueError as e:
-        msg = warning_msg_provider.buildMsg(ExOpStatus.ERROR_CODE_2.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_2.value) from e
+
+    if hasattr(output_fn, "write"):
+        output_fn.write(data)
+        return
+    try:
+        with open(output_fn, "wb") as f:
+            f.write(data)
+    except PermissionError:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_1.value)
 
     # MEMO
     # Excelのアドインを Python から実行することも可能ではあるが、以下の理由から見送る
@@ -428,10 +1105,10 @@ def convert_df_to_excel(
     # - 読み込みに多少時間がかかる
 
 
-def convert_excel_to_df(input_path: str) -> tuple[dict, str]:
+def convert_excel_to_df(input_path) -> tuple[dict, str]:
     """
     Args:
-        input_path:        入力ファイルパス
+        input_path:        入力ファイルパス、バイナリのファイルオブジェクト、または bytes
 
     Returns:
         df:                データフレーム型テスト項目書
@@ -441,11 +1118,14 @@ def convert_excel_to_df(input_path: str) -> tuple[dict, str]:
 
     dfs = {}
     product_category = "共通"
+    if isinstance(input_path, (bytes, bytearray)):
+        input_path = io.BytesIO(input_path)
+    # ブックは1度だけ読み込み、シートごとに取り出す
     wb = pd.ExcelFile(input_path)
     for sheet_name in wb.sheet_names:
         if sheet_name in IGNORED_SHEET_NAME:
             continue
-        df = pd.read_excel(input_path, sheet_name=sheet_name, header=None, dtype=str)
+        df = wb.parse(sheet_name, header=None, dtype=str)
         if sheet_name == "表紙":
             product_category = df[0][0] # セルA1
             continue
@@ -0,0 +1,286 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import re
+import json
+import hashlib
+import tempfile
+from warningMsgProvider import MdOpStatus, Diagnostics
+
+# 部品の行のキャッシュ（同じプロセス内でのみ有効、キー: (内容の sha256, 取り込みの記述の正規表現)）
+#   値: (行のリスト, 取り込みの記述の行の添字 -> 取り込むファイルのパス)
+#   部品は章の中に展開してから章と一緒に解析するため（番号やテスト観点は前後の行によって決まる）、
+#   保持するのはファイルを読み込んで行に分けた結果のみで、解析した結果ではない
+_fragment_lines = {}
+
+# 部品のファイルの状態 (絶対パス, 更新日時, サイズ) -> 内容の sha256
+#   同じプロセスの中で変更されていない部品は読み直さない
+_fragment_hashes = {}
+
+# ファイルごとの取り込み先のキャッシュ（--changed-since で部品を取り込む章を求めるために使う）の形式のバージョン
+INCLUDE_CACHE_VERSION = "1"
+INCLUDE_CACHE_FILE_NAME = "include_cache.json"
+
+
+def get_default_cache_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), "MdToExcel", "include_cache")
+
+
+def find_directives(lines: list, pattern: str) -> dict:
+    """
+    取り込みの記述を探します
+
+    Returns:
+        directives:     行の添字 -> 取り込むファイルのパス（記述されたまま）
+    """
+    regex = re.compile(pattern)
+    directives = {}
+    for idx, line in enumerate(lines):
+        m = regex.match(line)
+        if m:
+            directives[idx] = m.group(1)
+    return directives
+
+
+def load_fragment(path: str, pattern: str) -> tuple[list, dict]:
+    """
+    部品（取り込まれる Markdown）を読み込みます
+    内容のハッシュをキーとして部品の行をプロセス内に保持し、同じプロセスでは同じ内容の部品を1回だけ読み込む
+    （複数の章が取り込む部品、変換サーバーや一括変換で繰り返し変換する部品を読み直さない）
+    プロセスをまたいだ再利用（ワーカープロセス、別の実行）はしない
+
+    Args:
+        path:           部品のファイルの絶対パス
+        pattern:        取り込みの記述の正規表現
+
+    Returns:
+        lines:          部品の行のリスト（すべての行が改行で終わる）
+        directives:     部品に含まれる取り込みの記述（find_directives() の戻り値）
+    """
+    return _fragment_lines[_read_fragment(path, pattern)]
+
+
+def _read_fragment(path: str, pattern: str) -> tuple[str, str]:
+    """
+    部品を読み込み、_fragment_lines のキー (内容の sha256, 正規表現) を返します
+    """
+    st = os.stat(path)
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    key = (_fragment_hashes.get(stamp), pattern)
+    if key not in _fragment_lines:
+        with open(path, "rb") as f:
+            data = f.read()
+        key = (hashlib.sha256(data).hexdigest(), pattern)
+        _fragment_hashes[stamp] = key[0]
+        if key not in _fragment_lines:
+            lines = io.StringIO(data.decode("utf-8"), newline=None).readlines()
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += "\n"
+            _fragment_lines[key] = (lines, find_directives(lines, pattern))
+    return key
+
+
+def expand_includes(
+    lines: list,
+    source_name: str,
+    include_dir: str,
+    pattern: str,
+    diagnostics: Diagnostics,
+) -> tuple[list, list]:
+    """
+    取り込みの記述を、取り込むファイル（部品）の内容に置き換えます
+    部品の中の取り込みの記述も展開し、取り込みが循環している場合はエラーとする
+
+    Args:
+        lines:          章の行のリスト
+        source_name:    章のファイル名（警告の表示に使う）
+        include_dir:    章の取り込みの相対パスの基準フォルダ（None の場合は取り込みできない）
+        pattern:        取り込みの記述の正規表現（1つ目のグループが取り込むファイルのパス、空の場合は展開しない）
+        diagnostics:    エラーの生成に使う Diagnostics
+
+    Returns:
+        lines:          展開した行のリスト
+        origins:        展開した行ごとの (ファイル名, ファイルの行番号, 章の行番号)
+                        部品の行の「章の行番号」は、章に記述した取り込みの記述の行番号
+                        取り込みの記述がない場合は None（行番号は章の行番号のまま）
+    """
+    if not pattern:
+        return lines, None
+    directives = find_directives(lines, pattern)
+    if not directives:
+        return lines, None
+
+    expanded = []
+    origins = []
+
+    def expand(lines, directives, file, base_dir, chapter_line, stack):
+        for idx, line in enumerate(lines):
+            line_chapter = chapter_line or idx + 1
+            if idx not in directives:
+                expanded.append(line)
+                origins.append((file, idx + 1, line_chapter))
+                continue
+
+            target = directives[idx]
+            if base_dir is None:
+                raise diagnostics.error(
+                    MdOpStatus.ERROR_CODE_10.value, idx + 1, target, file=file
+                )
+            path = os.path.normpath(os.path.join(base_dir, target))
+            abs_path = os.path.abspath(path)
+            chain = [p for _, p in stack] + [path]
+            if abs_path in [a for a, _ in stack]:
+                raise diagnostics.error(
+                    MdOpStatus.ERROR_CODE_11.value, idx + 1, " -> ".join(chain), file=file
+                )
+            try:
+                fragment_lines, fragment_directives = load_fragment(abs_path, pattern)
+            except (OSError, UnicodeDecodeError):
+                raise diagnostics.error(
+                    MdOpStatus.ERROR_CODE_10.value, idx + 1, path, file=file
+                )
+            expand(
+                fragment_lines,
+                fragment_directives,
+                path,
+                os.path.dirname(path),
+                line_chapter,
+                stack + [(abs_path, path)],
+            )
+
+    stack = []
+    if include_dir is not None:
+        chapter_path = os.path.join(include_dir, os.path.basename(source_name))
+        stack.append((os.path.abspath(chapter_path), source_name))
+    expand(lines, directives, source_name, include_dir, 0, stack)
+    return expanded, origins
+
+
+def find_included_files(file: str, pattern: str, data: bytes = None) -> dict:
+    """
+    章が（部品を経由するものを含めて）取り込むファイルを返します
+    見つからない部品、循環する取り込みは無視する（変換時にエラーとなる）
+
+    Args:
+        file:           章のファイルのパス
+        pattern:        取り込みの記述の正規表現
+        data:           章の内容（省略時は file から読み込む）
+
+    Returns:
+        included:       取り込むファイルの絶対パス -> 内容の sha256（読み込めない場合は ""）
+    """
+    included = {}
+
+    def walk(path, directives, stack):
+        base_dir = os.path.dirname(path)
+        for target in directives.values():
+            abs_path = os.path.abspath(os.path.join(base_dir, target))
+            if abs_path in stack or abs_path in included:
+                continue
+            try:
+                key = _read_fragment(abs_path, pattern)
+            except (OSError, UnicodeDecodeError):
+                included[abs_path] = ""
+                continue
+            included[abs_path] = key[0]
+            walk(abs_path, _fragment_lines[key][1], stack | {abs_path})
+
+    if pattern:
+        file = os.path.abspath(file)
+        if data is None:
+            with open(file, "rb") as f:
+                data = f.read()
+        lines = io.StringIO(data.decode("utf-8"), newline=None).readlines()
+        walk(file, find_directives(lines, pattern), {file})
+    return included
+
+
+def load_include_map(files: list, pattern: str, cache_dir: str = None) -> dict:
+    """
+    章ごとに、（部品を経由するものを含めて）取り込むファイルを返します
+    ファイルごとの取り込み先は更新日時とサイズをキーにディスクにキャッシュし、変更のないファイルは読み込まない
+    見つからない部品、循環する取り込みは無視する（変換時にエラーとなる）
+
+    Args:
+        files:          章のファイルのパス
+        pattern:        取り込みの記述の正規表現
+        cache_dir:      キャッシュフォルダ（省略時は get_default_cache_dir()）
+
+    Returns:
+        include_map:    章の絶対パス -> 取り込むファイルの絶対パスの集合
+    """
+    cache_fn = os.path.join(cache_dir or get_default_cache_dir(), INCLUDE_CACHE_FILE_NAME)
+    try:
+        with open(cache_fn, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get("version") != INCLUDE_CACHE_VERSION or cache.get("pattern") != pattern:
+        cache = {"version": INCLUDE_CACHE_VERSION, "pattern": pattern, "files": {}}
+    entries = cache["files"]
+    targets_of = {}
+    updated = False
+
+    def get_targets(abs_path):
+        nonlocal updated
+        if abs_path in targets_of:
+            return targets_of[abs_path]
+        targets = []
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            targets_of[abs_path] = targets
+            return targets
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = entries.get(abs_path)
+        if entry is not None and entry["stamp"] == stamp:
+            targets = entry["targets"]
+        else:
+            try:
+                with open(abs_path, "rb") as f:
+                    lines = io.StringIO(f.read().decode("utf-8"), newline=None).readlines()
+            except (OSError, UnicodeDecodeError):
+                # 読み込めなかったファイルは、次回も読み込み直す
+                targets_of[abs_path] = targets
+                return targets
+            base_dir = os.path.dirname(abs_path)
+            targets = sorted(
+                {
+                    os.path.abspath(os.path.join(base_dir, target))
+                    for target in find_directives(lines, pattern).values()
+                }
+            )
+            entries[abs_path] = {"stamp": stamp, "targets": targets}
+            updated = True
+        targets_of[abs_path] = targets
+        return targets
+
+    include_map = {}
+    for file in files:
+        chapter = os.path.abspath(file)
+        included = set()
+        pending = list(get_targets(chapter))
+        while pending:
+            path = pending.pop()
+            if path == chapter or path in included:
+                continue
+            included.add(path)
+            pending += get_targets(path)
+        include_map[chapter] = included
+
+    if updated:
+        try:
+            os.makedirs(os.path.dirname(cache_fn), exist_ok=True)
+            # 他のプロセスが読み込み中のファイルを壊さないよう、一時ファイルに書き込んでから置き換える
+            fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(cache_fn), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp_fn, cache_fn)
+        except OSError:
+            pass
+    return include_map
@@ -0,0 +1,239 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import glob
+import subprocess
+from batch_runner import (
+    DIRECTION_MD_TO_EXCEL,
+    GROUPING_BOOK,
+    GROUPING_SEPARATE,
+    build_job,
+)
+from fragment_cache import load_include_map
+
+# git diff --name-status の状態
+CHANGE_ADDED = "A"
+CHANGE_MODIFIED = "M"
+CHANGE_DELETED = "D"
+CHANGE_RENAMED = "R"
+
+
+class GitError(Exception):
+    pass
+
+
+def run_git(args: list, cwd: str) -> str:
+    try:
+        res = subprocess.run(
+            ["git"] + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except FileNotFoundError:
+        raise GitError("git コマンドが見つかりません")
+    except subprocess.CalledProcessError as e:
+        raise GitError(e.stderr.decode("utf-8", errors="replace").strip())
+    return res.stdout.decode("utf-8")
+
+
+def get_changed_markdown(rev: str, md_dir: str) -> list[tuple[str, str, str]]:
+    """
+    指定したリビジョンから変更された Markdown ファイルを git に問い合わせます
+    作業ツリーの変更（未コミット、未追跡のファイルを含む）も対象とします
+
+    Args:
+        rev:        比較元のリビジョン
+        md_dir:     Markdown ファイルを格納したフォルダ
+
+    Returns:
+        changes:    (状態, 変更後のパス, 変更前のパス) のリスト  ※ パスは絶対パス
+                    状態は A（追加）/ M（変更）/ D（削除）/ R（名前の変更）のいずれか
+    """
+    md_dir = os.path.abspath(md_dir)
+    top = run_git(["rev-parse", "--show-toplevel"], md_dir).strip()
+
+    def to_abs(path):
+        return os.path.abspath(os.path.join(top, path))
+
+    changes = []
+    out = run_git(
+        ["diff", "--name-status", "-z", "-M", "--no-color", rev, "--", md_dir], md_dir
+    )
+    fields = out.split("\0")
+    idx = 0
+    while idx < len(fields) and fields[idx]:
+        status = fields[idx][0]
+        if status in ("R", "C"):
+            old_path, new_path = fields[idx + 1], fields[idx + 2]
+            idx += 3
+            if status == "C":
+                changes.append((CHANGE_ADDED, to_abs(new_path), ""))
+            else:
+                changes.append((CHANGE_RENAMED, to_abs(new_path), to_abs(old_path)))
+        else:
+            path = fields[idx + 1]
+            idx += 2
+            if status == CHANGE_DELETED:
+                changes.append((CHANGE_DELETED, "", to_abs(path)))
+            elif status == CHANGE_ADDED:
+                changes.append((CHANGE_ADDED, to_abs(path), ""))
+            else:
+                changes.append((CHANGE_MODIFIED, to_abs(path), ""))
+
+    # 未追跡のファイルは git diff に現れないため別途取得する
+    out = run_git(
+        ["ls-files", "-z", "--others", "--exclude-standard", "--full-name", "--", md_dir],
+        md_dir,
+    )
+    for path in out.split("\0"):
+        if path:
+            changes.append((CHANGE_ADDED, to_abs(path), ""))
+
+    return [
+        change
+        for change in changes
+        if (change[1] or change[2]).endswith(".md")
+    ]
+
+
+def apply_fragment_changes(
+    changes: list[tuple[str, str, str]],
+    md_dir: str,
+    pattern: str,
+    cache_dir: str = None,
+) -> list[tuple[str, str, str]]:
+    """
+    取り込まれるファイル（部品）の変更を、その部品を取り込む章の変更に置き換えます
+    部品は章（md_dir 直下の *.md）以外のファイルのため、章以外の変更がない場合は章を読み込まない
+    章ごとの取り込み先は fragment_cache.load_include_map() でファイルの更新日時とサイズをキーにキャッシュし、
+    変更のない章は読み込まない
+
+    Args:
+        changes:    get_changed_markdown() の戻り値
+        md_dir:     Markdown ファイルを格納したフォルダ（直下の *.md を章とする）
+        pattern:    取り込みの記述の正規表現（config.yaml の md.mark_for_include）
+        cache_dir:  取り込み先のキャッシュフォルダ（省略時は fragment_cache.get_default_cache_dir()）
+
+    Returns:
+        changes:    部品の変更を除き、部品を取り込む章を変更（M）として加えたもの
+    """
+    if not pattern:
+        return changes
+    md_dir = os.path.abspath(md_dir)
+    candidates = {
+        path
+        for change in changes
+        for path in change[1:]
+        if path and os.path.dirname(path) != md_dir
+    }
+    if not candidates:
+        return changes
+
+    include_map = load_include_map(
+        sorted(glob.glob(os.path.join(md_dir, "*.md"))), pattern, cache_dir
+    )
+    changed_fragments = candidates & set().union(*include_map.values())
+    if not changed_fragments:
+        return changes
+
+    new_changes = [
+        change
+        for change in changes
+        if change[1] not in changed_fragments and change[2] not in changed_fragments
+    ]
+    changed_chapters = {change[1] for change in new_changes}
+    for file, included in include_map.items():
+        if file not in changed_chapters and changed_fragments & included:
+            new_changes.append((CHANGE_MODIFIED, file, ""))
+    return new_changes
+
+
+def plan_changed_jobs(
+    changes: list[tuple[str, str, str]], jobs: list[dict], output_dir: str
+) -> tuple[list[dict], list[str]]:
+    """
+    変更されたファイルに関係するジョブのみを組み立てます
+
+    - 複数シートのブック（grouping: book）は、いずれかの章が変更された場合のみ再生成する
+      （削除された章は除き、名前が変更された章は新しいパスに置き換える）
+    - ジョブ定義に含まれないファイルは1ファイル1ブックで変換する
+    - 削除、または名前が変更されたファイルの変換結果は不要な出力として返す
+
+    Args:
+        changes:        get_changed_markdown() の戻り値
+        jobs:           ジョブ定義（batch_runner.parse_manifest() の戻り値）
+        output_dir:     ジョブ定義で保存先を指定しない場合の保存先フォルダ
+
+    Returns:
+        planned_jobs:   実行するジョブ
+        stale_outputs:  削除する変換結果のパス
+    """
+    changed = {}  # 変更前のパス -> 変更後のパス（削除された場合は ""）
+    for status, new_path, old_path in changes:
+        if status == CHANGE_RENAMED or status == CHANGE_DELETED:
+            changed[old_path] = new_path
+        if new_path:
+            changed[new_path] = new_path
+
+    def stem(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    planned_jobs = []
+    stale_outputs = []
+    covered = set()
+    for job in jobs:
+        if job["direction"] != DIRECTION_MD_TO_EXCEL or job["error"]:
+            continue
+        inputs = {os.path.abspath(file): file for file in job["inputs"]}
+        hits = [path for path in inputs if path in changed]
+        if not hits:
+            continue
+        covered.update(hits)
+        covered.update(changed[path] for path in hits if changed[path])
+        job_output_dir = job["output"] or output_dir
+
+        if job["grouping"] == GROUPING_BOOK:
+            new_inputs = []
+            for path, file in inputs.items():
+                if path not in changed:
+                    new_inputs.append(file)
+                elif changed[path]:
+                    new_inputs.append(changed[path] if changed[path] != path else file)
+            if new_inputs:
+                planned_jobs.append(dict(job, inputs=new_inputs))
+            else:
+                book = job["output"] or job["name"]
+                if not os.path.dirname(book):
+                    book = os.path.join(output_dir, book)
+                stale_outputs.append(os.path.splitext(book)[0] + ".xlsm")
+        else:
+            new_inputs = [changed[path] for path in hits if changed[path]]
+            for path in hits:
+                if changed[path] != path:
+                    stale_outputs.append(
+                        os.path.join(job_output_dir, stem(path) + ".xlsm")
+                    )
+            if new_inputs:
+                planned_jobs.append(dict(job, inputs=new_inputs))
+
+    # ジョブ定義に含まれない変更
+    rest = []
+    for status, new_path, old_path in changes:
+        if old_path and old_path not in covered:
+            stale_outputs.append(os.path.join(output_dir, stem(old_path) + ".xlsm"))
+        if new_path and new_path not in covered and new_path not in rest:
+            rest.append(new_path)
+    for path in rest:
+        job = build_job(
+            {"name": stem(path), "inputs": [path], "grouping": GROUPING_SEPARATE},
+            len(planned_jobs),
+        )
+        planned_jobs.append(job)
+
+    return planned_jobs, stale_outputs
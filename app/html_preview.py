@@ -0,0 +1,315 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import html
+from excel_operator import get_table_start_row, get_sheet_layout, iter_row_style_keys
+from markdown_operator import convert_md_to_df
+from sheet_builder import expand_sheets
+from warningMsgProvider import Diagnostics
+
+# 概要を書き出す列（Excel の E 列）
+SUMMARY_COL_IDX = 4
+
+# 罫線の種類 -> CSS
+BORDER_CSS = {
+    "thin": "1px solid #000",
+    "medium": "2px solid #000",
+    "thick": "3px solid #000",
+}
+# 罫線なしは Excel の枠線に似せて薄い灰色の点線にする（隣のセルの罫線と重なる場合は、実線の罫線が優先される）
+GRIDLINE_CSS = "1px dotted #d0d0d0"
+
+# 一覧のファイル名
+INDEX_FILE_NAME = "index.html"
+
+_PAGE_HEADER = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: "{font}", monospace; font-size: 9pt; margin: 8px; }}
+nav a {{ margin-right: 1em; }}
+h2 {{ font-size: 11pt; margin: 16px 0 4px; }}
+table {{ border-collapse: collapse; table-layout: fixed; }}
+td, th {{ padding: 1px 2px; overflow: hidden; white-space: pre-wrap; word-break: break-all; }}
+td.summary {{ white-space: pre; overflow: visible; }}
+thead th {{ position: sticky; top: 0; }}
+th.header {{ writing-mode: vertical-rl; text-orientation: upright; font-weight: bold; }}
+th.env {{ white-space: nowrap; overflow: visible; text-align: left; font-weight: normal; }}
+{styles}
+</style>
+</head>
+<body>
+"""
+
+_PAGE_FOOTER = """</body>
+</html>
+"""
+
+
+def to_css_color(color: str) -> str:
+    """
+    Excel の色（RRGGBB、または AARRGGBB）を CSS の色に変換します
+    """
+    return "#" + str(color)[-6:]
+
+
+def to_css_width(width: float) -> int:
+    """
+    Excel の列幅（既定のフォントの文字数）をピクセルに変換します
+    """
+    return int(round(float(width) * 7 + 5))
+
+
+class StyleSheet:
+    """
+    セルのスタイル（塗りつぶし、罫線、配置）ごとに CSS のクラスを割り当てる
+    同じスタイルのセルは同じクラスを使うため、行数が多くても HTML が大きくならない
+    """
+
+    def __init__(self):
+        self.classes = {}
+
+    def get_class(self, style_key: tuple) -> str:
+        if style_key not in self.classes:
+            self.classes[style_key] = "s" + str(len(self.classes))
+        return self.classes[style_key]
+
+    def render(self) -> str:
+        rules = []
+        for (fill_color, border, alignment), name in self.classes.items():
+            horizontal, vertical, wrap_text, _ = alignment
+            props = [
+                f"border-{side}: {BORDER_CSS.get(style, GRIDLINE_CSS)}"
+                for side, style in zip(["left", "right", "top", "bottom"], border)
+            ]
+            if fill_color:
+                props.append("background: " + to_css_color(fill_color))
+            props.append("text-align: " + (horizontal or "left"))
+            props.append(
+                "vertical-align: " + {"center": "middle"}.get(vertical, vertical or "bottom")
+            )
+            if not wrap_text:
+                props.append("white-space: pre")
+            rules.append(f"td.{name} {{ {'; '.join(props)}; }}")
+        return "\n".join(rules)
+
+
+def get_output_cols(config_excel: dict, test_env_frame_num: int) -> list:
+    """
+    テスト項目シートに書き出す列（データフレームの列名）を、シートの列の順に返します
+    write_test_specification() と同じく、テスト観点列（index）、出力する列（output）、テスト環境枠ごとの結果列群の順
+    """
+    cols = [
+        k
+        for k in config_excel["col_name"]
+        if k in config_excel["index"] and config_excel["index"][k]
+    ]
+    cols += [
+        k
+        for k in config_excel["col_name"]
+        if k in config_excel["output"] and config_excel["output"][k]
+    ]
+    for idx in range(test_env_frame_num):
+        cols += [k + "_" + str(idx + 1) for k in config_excel["col_name_res_area"]]
+    return cols
+
+
+def render_sheet(
+    df,
+    sheet_name: str,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+    styles: StyleSheet,
+) -> str:
+    """
+    テスト項目シートと同じ配置（概要、テスト環境枠名、見出し、テスト項目）の表を HTML で返します
+    列幅、見出しの色、テスト観点の着色と罫線は、Excel のシートと同じ設定（get_sheet_layout(),
+    iter_row_style_keys()）から求める
+
+    Args:
+        df:                 convert_md_to_df()により生成されたデータフレーム
+        sheet_name:         シート名
+        summary:            概要欄の入力文章
+        test_env_frame:     テスト環境枠
+        config_excel:       設定
+        styles:             セルのスタイルのクラスを割り当てる StyleSheet（ページ内のシートで共有する）
+    """
+    test_env_frame_num = len(test_env_frame)
+    layout = get_sheet_layout(config_excel, test_env_frame_num)
+    total_col_count = layout["total_col_count"]
+    cols = get_output_cols(config_excel, test_env_frame_num)[:total_col_count]
+    headers = [str(config_excel["col_name"][k]) for k in cols if k in config_excel["col_name"]]
+    headers += list(config_excel["col_name_res_area"].values()) * test_env_frame_num
+
+    out = [f'<table id="{html.escape(sheet_name)}">', "<colgroup>"]
+    out += [
+        f'<col style="width: {to_css_width(width)}px">'
+        for width in layout["width"][:total_col_count]
+    ]
+    out.append("</colgroup>")
+
+    # 概要（E 列）とテスト環境枠名（見出し行の1行上）
+    tb_start_row = get_table_start_row(summary, config_excel)
+    empty_cells = "<td></td>" * SUMMARY_COL_IDX
+    for row_idx in range(tb_start_row - 2):
+        line = summary[row_idx].rstrip("\n") if row_idx < len(summary) else ""
+        out.append(
+            f"<tr>{empty_cells}"
+            f'<td class="summary" colspan="{total_col_count - SUMMARY_COL_IDX}">'
+            f"{html.escape(line)}</td></tr>"
+        )
+
+    out.append("<thead><tr>")
+    env_names = iter(test_env_frame)
+    for col_idx in range(total_col_count):
+        if layout["test_intention_cols"][col_idx]:
+            out.append(f'<th class="env">{html.escape(str(next(env_names, "")))}</th>')
+        else:
+            out.append("<th></th>")
+    out.append(
+        f'</tr><tr style="height: {round(config_excel["height"]["header"] * 4 / 3)}px">'
+    )
+    for col_idx, header in enumerate(headers):
+        # テスト仕様列群と結果列群の境界は太線
+        left = BORDER_CSS["medium" if layout["test_intention_cols"][col_idx] else "thin"]
+        out.append(
+            f'<th class="header" style="background: {to_css_color(layout["color"][col_idx])};'
+            f' border: {BORDER_CSS["thin"]}; border-left: {left}">'
+            f"{html.escape(header.rstrip())}</th>"
+        )
+    out.append("</tr></thead>")
+
+    # テスト項目（値は列ごとにまとめて HTML に変換する）
+    out.append("<tbody>")
+    values = [
+        [html.escape(str(v)) if v != "" else "" for v in df[col].tolist()]
+        if col in df.columns
+        else [""] * len(df)
+        for col in cols
+    ]
+    item_id_col = config_excel["item_id"]["col_name"]
+    item_ids = df[item_id_col].tolist() if item_id_col in df.columns else [""] * len(df)
+    row_cells = {}
+    marks = df["mark"].tolist()
+    for row_idx, (row_key, style_keys) in enumerate(
+        iter_row_style_keys(marks, config_excel, layout)
+    ):
+        if row_key not in row_cells:
+            row_cells[row_key] = [
+                f'<td class="{styles.get_class(style_key)}">' for style_key in style_keys
+            ]
+        cells = row_cells[row_key]
+        out.append(
+            f'<tr data-id="{item_ids[row_idx]}">'
+            + "".join(
+                [
+                    cells[col_idx] + values[col_idx][row_idx] + "</td>"
+                    for col_idx in range(total_col_count)
+                ]
+            )
+            + "</tr>"
+        )
+    out.append("</tbody></table>")
+    return "\n".join(out)
+
+
+def render_html(chapters: list, config_excel: dict, title: str) -> str:
+    """
+    章（convert_md_to_df() の戻り値）を、シートごとの表を並べた1つの HTML ページにします
+
+    Args:
+        chapters:       (df, sheet_name, product_categorie, summary, test_env_frame) のリスト（シートの並び順）
+        config_excel:   設定
+        title:          ページのタイトル
+    """
+    styles = StyleSheet()
+    sheets = []
+    for df, sheet_name, product_categorie, summary, test_env_frame in chapters:
+        sheets.append(
+            (
+                sheet_name,
+                product_categorie,
+                render_sheet(df, sheet_name, summary, test_env_frame, config_excel, styles),
+            )
+        )
+
+    out = [
+        _PAGE_HEADER.format(
+            title=html.escape(title),
+            font=html.escape(config_excel["font"]),
+            styles=styles.render(),
+        )
+    ]
+    if len(sheets) > 1:
+        out.append(
+            "<nav>"
+            + "".join(
+                f'<a href="#{html.escape(name)}">{html.escape(name)}</a>'
+                for name, _, _ in sheets
+            )
+            + "</nav>"
+        )
+    for sheet_name, product_categorie, table in sheets:
+        out.append(f"<h2>{html.escape(sheet_name)}（{html.escape(product_categorie)}）</h2>")
+        out.append(table)
+    out.append(_PAGE_FOOTER)
+    return "\n".join(out)
+
+
+def write_previews(
+    files: list, output_dir: str, config: dict, split_rows: int = 0
+) -> tuple[list, Diagnostics]:
+    """
+    Markdown ファイルを、Excel のテスト項目シートと同じ配置の HTML（1ファイル1ページ）に変換し、
+    ページの一覧（index.html）とともに保存します
+
+    Args:
+        files:          Markdown ファイルのパス
+        output_dir:     保存先フォルダ
+        config:         設定
+        split_rows:     1シートの最大行数の目安（0 は分割しない、Excel に変換する場合と同じく分割したシートを並べる）
+
+    Returns:
+        output_fns:     保存した HTML ファイルのパス（一覧を除く）
+        warnings:       Markdownの記述に関する警告（Diagnostics）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    warnings = Diagnostics()
+    output_fns = []
+    for file in files:
+        df, sheet_name, product_categorie, summary, test_env_frame, warning = convert_md_to_df(
+            file, config["md"]
+        )
+        warnings.extend(warning)
+        chapters = expand_sheets(
+            [(df, sheet_name, product_categorie, summary, test_env_frame)],
+            split_rows,
+            config["md"],
+        )
+        output_fn = os.path.join(output_dir, sheet_name + ".html")
+        with open(output_fn, "w", encoding="utf-8") as f:
+            f.write(render_html(chapters, config["excel"], sheet_name))
+        output_fns.append(output_fn)
+
+    index = [
+        _PAGE_HEADER.format(
+            title="プレビュー", font=html.escape(config["excel"]["font"]), styles=""
+        ),
+        "<ul>",
+    ]
+    for output_fn in output_fns:
+        name = os.path.basename(output_fn)
+        index.append(
+            f'<li><a href="{html.escape(name)}">{html.escape(os.path.splitext(name)[0])}</a></li>'
+        )
+    index += ["</ul>", _PAGE_FOOTER]
+    with open(os.path.join(output_dir, INDEX_FILE_NAME), "w", encoding="utf-8") as f:
+        f.write("\n".join(index))
+    return output_fns, warnings
@@ -4,17 +4,18 @@ __author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.
 __version__ = "2.1.0"
 __date__ = "5 June 2024"
 
+import io
 import re
-import sys
 import os
+import hashlib
 import pandas as pd
 import warnings
 from enum import Enum
 from typing import Union
-from excel_operator import col_num_to_excel_col_name
-from warningMsgProvider import MdOpStatus, WarningMsgProvider
+from excel_operator import col_num_to_excel_col_name, is_overwritable
+from fragment_cache import expand_includes
+from warningMsgProvider import MdOpStatus, Diagnostics
 
-warning_msg_provider = WarningMsgProvider()
 warnings.simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
 
 
@@ -79,21 +80,42 @@ class ListNumConverter:
             if current_nest_lv < i and i <= previous_nest_lv:
                 self.list_num_counter[i] = 1
 
-def load_md(input_path: str):
+def get_source_name(source, name: str = None) -> str:
+    """
+    入力・出力先の名前を返します（ファイルパスの場合はパス、ファイルオブジェクトの場合は name 属性）
+    """
+    if name:
+        return name
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    source_name = getattr(source, "name", "")
+    return source_name if isinstance(source_name, str) else ""
+
+
+def load_md(source, diagnostics: Diagnostics):
+    """
+    Markdown を読み込みます
+
+    Args:
+        source:     ファイルパス、ファイルオブジェクト（テキスト / バイナリ）、または bytes
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.StringIO(bytes(source).decode("utf-8"), newline=None)
+    if hasattr(source, "read"):
+        data = source.read()
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return io.StringIO(data, newline=None)
     try:
-        warning_msg_provider.setTargetFP(input_path)
-        input_file = open(input_path, "r", encoding="utf-8")
+        input_file = open(source, "r", encoding="utf-8")
         return input_file
     except FileNotFoundError:
-        msg = warning_msg_provider.buildMsg(MdOpStatus.ERROR_CODE_1.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise diagnostics.error(MdOpStatus.ERROR_CODE_1.value)
 
 
 def append_df(
-    df: pd.DataFrame, current_item_dict: dict, item_counter: dict, config_md: dict
-) -> pd.DataFrame:
+    rows: list, current_item_dict: dict, item_counter: dict, config_md: dict
+) -> None:
     # 項目のナンバリングとカウンター更新
     k = current_item_dict["mark"]
     if k in item_counter:
@@ -114,15 +136,66 @@ def append_df(
                     isIncremented = True
 
     # 行追加
-    list = [[v for _, v in current_item_dict.items()]]
-    df_append = pd.DataFrame(data=list, columns=df.columns.to_list())
-    _df = pd.concat([df, df_append], ignore_index=True)
+    #   行ごとに pd.concat すると行数の2乗に比例して遅くなるため、
+    #   行はリストに貯めておき最後に一括でデータフレーム化する
+    rows.append(dict(current_item_dict))
 
     # 初期化
     for k in current_item_dict:
         current_item_dict[k] = ""
 
-    return _df
+
+def _content_digest(values, length: int) -> str:
+    # テスト項目の ID に使う、内容（行末の空白を除く）のハッシュ
+    text = "\x1f".join(v.rstrip() for v in values)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:length]
+
+
+def generate_similarity_keys(steps: str, expected: str) -> tuple[str, str]:
+    """
+    ID の一致しないテスト項目を対応付けるための、手順と確認それぞれのハッシュを返します
+    （ID の後半は手順と確認をまとめたハッシュのため、片方のみ変更した項目は ID では対応付けられない）
+    """
+    return _content_digest([steps], 8), _content_digest([expected], 8)
+
+
+def generate_item_ids(rows, config_md: dict) -> list:
+    """
+    テスト項目ごとに内容から決まる ID を生成します
+    同じ内容からは常に同じ ID が生成されるため、Markdown を編集しても変更のない項目の ID は変わりません
+
+    ID は「テスト観点のパスのハッシュ - 手順と確認のハッシュ」の形式とし、
+    同じテスト観点内に同じ内容の項目がある場合は出現順に `-2`, `-3` .. を付与します
+    テスト観点行の ID は空文字とします
+
+    Args:
+        rows:       (mark, environment, steps, expected) のイテラブル
+                    mark は lv1 - lv6（テスト観点行）または number（テスト項目行）
+        config_md:  マークダウン部分に関する設定
+
+    Returns:
+        item_ids:   行ごとの ID
+    """
+
+    lv = [k for k in config_md["col_name"] if re.match("lv[1-6]$", k)]
+    path = [""] * len(lv)
+    path_hash = _content_digest(path, 6)
+    seen = {}
+    item_ids = []
+    for mark, environment, steps, expected in rows:
+        if mark in lv:
+            lv_idx = lv.index(mark)
+            path[lv_idx] = environment
+            path[lv_idx + 1 :] = [""] * (len(lv) - lv_idx - 1)
+            path_hash = _content_digest(path, 6)
+            item_ids.append("")
+        else:
+            item_id = path_hash + "-" + _content_digest([steps, expected], 8)
+            seen[item_id] = seen.get(item_id, 0) + 1
+            if seen[item_id] > 1:
+                item_id += "-" + str(seen[item_id])
+            item_ids.append(item_id)
+    return item_ids
 
 
 def check_if_append_df(current_item_dict: dict) -> Union[bool, str]:
@@ -143,12 +216,22 @@ def check_if_append_df(current_item_dict: dict) -> Union[bool, str]:
 
 
 def convert_md_to_df(
-    input_path: str, config_md: dict
+    input_path,
+    config_md: dict,
+    name: str = None,
+    line_numbers: list = None,
+    include_dir: str = None,
 ) -> tuple[pd.DataFrame, str, str, list, list, list]:
     """
     Args:
-        input_path:        入力ファイルパス
+        input_path:        入力ファイルパス、ファイルオブジェクト、または bytes
         config_md:         マークダウン部分に関する設定
+        name:              ファイル名（シート名と警告の表示に使う、省略時は input_path から決める）
+        line_numbers:      リストを渡すと、テスト項目表の行ごとの Markdown の行番号を格納する
+                           （テスト観点行は見出しの行、テスト項目行は見出しの次の最初の記述の行）
+                           取り込んだファイルの行は、章に記述した取り込みの記述の行番号とする
+        include_dir:       取り込みの記述（mark_for_include）の相対パスの基準フォルダ
+                           （省略時は入力ファイルのフォルダ、ファイルパス以外の入力では取り込みできない）
 
     Returns:
         df:                データフレーム型テスト項目書
@@ -156,7 +239,7 @@ def convert_md_to_df(
         product_categorie:      製品カテゴリの略称
         summary:           概要欄の入力文章
         test_env_frame     テスト環境枠
-        warning:           Markdownの記述、その他に関する警告
+        warning:           Markdownの記述、その他に関する警告（Diagnostics）
     """
 
     cur_mark = ""
@@ -180,9 +263,15 @@ def convert_md_to_df(
     }
     lstNumConverter = ListNumConverter(config_md)
 
-    # テスト項目表用の空データフレーム
-    df = pd.DataFrame(columns=[k for k, _ in config_md["col_name"].items()])
+    # テスト項目表の行（最後にデータフレーム化する）
+    rows = []
+    # 行ごとの Markdown の行番号（line_numbers を渡した場合のみ使う）
+    row_lines = []
+    item_line = 0
     current_item_dict = {k: "" for k, _ in config_md["col_name"].items()}
+    # テスト項目の列（環境〜備考）ごとの行の断片（テスト項目を追加する前に flush_cell_parts() で連結する）
+    #   長い行が続く列に1行ずつ文字列を連結すると、行数の2乗に比例して遅くなるため
+    cell_parts = {}
     # シート名
     sheet_name = ""
     # 製品カテゴリの略称
@@ -191,20 +280,53 @@ def convert_md_to_df(
     summary = []
     # テスト環境枠用の空リスト
     test_env_frame = []
+    # 実施判定の列名（テスト環境枠ごと）
+    test_intention_cols = []
+    # 特定のテスト環境の省略を表す備考の書き出し -> テスト環境枠の番号（同じ書き出しの場合は最後尾）
+    omission_prefixes = {}
+    # 上記の書き出しの文字数（長い順）
+    omission_prefix_lens = []
+    omission_str_all_test_env = "- [x] "
     # 警告メッセージ格納用（Excel に変換されないデータなどの警告）
-    warning = []
-
-    input_file = load_md(input_path)
+    source_name = get_source_name(input_path, name)
+    warning = Diagnostics(source_name)
+
+    input_file = load_md(input_path, warning)
+    with input_file:
+        lines = input_file.readlines()
+
+    # 取り込みの記述を展開する（取り込んだファイルの行の警告は、そのファイルの行番号で表示する）
+    if include_dir is None and isinstance(input_path, (str, os.PathLike)):
+        include_dir = os.path.dirname(os.fspath(input_path))
+    lines, origins = expand_includes(
+        lines,
+        source_name,
+        include_dir,
+        config_md.get("mark_for_include", ""),
+        warning,
+    )
+
+    def locate(idx: int) -> tuple[str, int, int]:
+        """
+        展開した行の (ファイル名, ファイルの行番号, 章の行番号) を返します
+        """
+        if origins is None:
+            return source_name, idx + 1, idx + 1
+        return origins[idx]
 
     def resetLstNum():
         lstNumConverter.reset()
 
+    def flush_cell_parts():
+        for k, parts in cell_parts.items():
+            current_item_dict[k] += "".join(parts)
+        cell_parts.clear()
+
     def reset_line_feed_flags():
         line_feed["flag"] = False
         line_feed["indent"] = 0
 
     def get_sheet_name(md_file_path):
-        warning_msg_provider.setTargetFP(md_file_path)
         s_name = os.path.splitext(os.path.basename(md_file_path))[0]
 
         sheet_name_err = False
@@ -232,16 +354,13 @@ def convert_md_to_df(
             sheet_name_err = True
 
         if sheet_name_err:
-            msg = warning_msg_provider.buildMsg(MdOpStatus.ERROR_CODE_2.value)
-            print(msg)
-            input("何かキーを押してください...")
-            sys.exit(1)
+            raise warning.error(MdOpStatus.ERROR_CODE_2.value)
         else:
             return s_name
 
-    sheet_name = get_sheet_name(input_path)
+    sheet_name = get_sheet_name(source_name)
 
-    for i, line in enumerate(input_file):
+    for i, line in enumerate(lines):
 
         # タイトル行
         if re.match(config_md["mark_for_read"]["title"], line):
@@ -268,22 +387,30 @@ def convert_md_to_df(
             if md_line_section == MarkdownLine.TEST_ENV_FRAME_AREA or len(
                 test_env_frame
             ) != len(set(test_env_frame)):
-                msg = warning_msg_provider.buildMsg(MdOpStatus.ERROR_CODE_3.value)
-                print(msg)
-                input("何かキーを押してください...")
-                sys.exit(1)
+                raise warning.error(MdOpStatus.ERROR_CODE_3.value)
 
             # テスト項目エリア開始時
             elif md_line_section == MarkdownLine.SUMMARY_AREA:
                 if len(test_env_frame) == 0:
                     test_env_frame.append("")
                 # データフレームにテスト環境枠の列追加
-                for i in range(len(test_env_frame)):
+                for env_idx in range(len(test_env_frame)):
                     for name in [k for k, _ in config_md["col_name_res_area"].items()]:
-                        tmp_name = name + "_" + str(i + 1)
-                        df[tmp_name] = ""
+                        tmp_name = name + "_" + str(env_idx + 1)
                         current_item_dict[tmp_name] = ""
 
+                # テスト環境枠ごとの判定に使う値は、テスト環境枠が決まった時点で1回だけ求める
+                test_intention_cols = [
+                    "test_intention_" + str(i + 1) for i in range(len(test_env_frame))
+                ]
+                omission_prefixes = {
+                    omission_str_all_test_env + env_name: idx + 1
+                    for idx, env_name in enumerate(test_env_frame)
+                }
+                omission_prefix_lens = sorted(
+                    {len(prefix) for prefix in omission_prefixes}, reverse=True
+                )
+
             reset_line_feed_flags()
 
             cur_mark = prev_mark = ""
@@ -295,17 +422,17 @@ def convert_md_to_df(
             for k, v in config_md["mark_for_read"].items():
                 if re.match(v, line):
                     # このテスト観点の直前で生成したテスト項目行があれば追加
+                    flush_cell_parts()
                     res = check_if_append_df(current_item_dict)
                     if res == "Error":
-                        line_num = i + 1
-                        msg = warning_msg_provider.buildMsg(
-                            MdOpStatus.ERROR_CODE_9.value, str(line_num)
+                        file, line_num, _ = locate(i)
+                        raise warning.error(
+                            MdOpStatus.ERROR_CODE_9.value, str(line_num), file=file
                         )
-                        print(msg)
-                        input("何かキーを押してください...")
-                        sys.exit(1)
                     elif res:
-                        df = append_df(df, current_item_dict, item_counter, config_md)
+                        append_df(rows, current_item_dict, item_counter, config_md)
+                        row_lines.append(item_line)
+                    item_line = 0
 
                     # テスト観点行追加（lv6 の空白見出しの場合は、テスト観点行を追加しない）
                     is_lv6_with_empty_content = re.match(
@@ -316,16 +443,15 @@ def convert_md_to_df(
                         current_item_dict["environment"] = (
                             re.sub(v, "", line).replace("\n", "").lstrip()
                         )
-                        df = append_df(df, current_item_dict, item_counter, config_md)
+                        append_df(rows, current_item_dict, item_counter, config_md)
+                        row_lines.append(locate(i)[2])
 
                         # テスト観点のレベルが1つ飛ばして上がったとき警告する
                         cur_test_viewpoint_lv = v.count("#")
                         if cur_test_viewpoint_lv - prev_test_viewpoint_lv >= 2:
-                            line_num = i + 1
-                            warning.append(
-                                warning_msg_provider.buildMsg(
-                                    MdOpStatus.WARNING_CODE_5.value, str(line_num)
-                                )
+                            file, line_num, _ = locate(i)
+                            warning.add(
+                                MdOpStatus.WARNING_CODE_5.value, str(line_num), file=file
                             )
                         prev_test_viewpoint_lv = cur_test_viewpoint_lv
 
@@ -345,6 +471,10 @@ def convert_md_to_df(
         else:
             cell_data = ""
             current_item_dict["mark"] = "number"
+            if not item_line and line.strip() and not re.match(
+                config_md["mark_for_read"]["separator"], line
+            ):
+                item_line = locate(i)[2]
 
             # 前提・手順・確認・備考
             if re.match(config_md["mark_for_read"]["environment"], line):
@@ -373,8 +503,7 @@ def convert_md_to_df(
                 config_md["mark_for_read"]["expected"], line
             ) and not re.match(config_md["mark_for_read"]["notes"], line):
                 # 実施判定 の初期値設定
-                for i in range(len(test_env_frame)):
-                    tmp_name = "test_intention_" + str(i + 1)
+                for tmp_name in test_intention_cols:
                     if current_item_dict[tmp_name] == "":
                         current_item_dict[tmp_name] = config_md["test_intention"][
                             "inclusion_word"
@@ -391,29 +520,27 @@ def convert_md_to_df(
                 resetLstNum()
 
                 # 実施 or 省略の判定
-                omission_str_all_test_env = "- [x] "
                 omission_word = config_md["test_intention"]["omission_word"]
-                specified_test_env_omission_idx = []
 
                 if line.startswith(omission_str_all_test_env):
-                    for idx, env_name in enumerate(test_env_frame):
-                        omission_str_specified_test_env = (
-                            omission_str_all_test_env + env_name
-                        )
-                        # テスト環境の指定がある場合は、その環境のみ省略
-                        if line.startswith(omission_str_specified_test_env):
-                            specified_test_env_omission_idx.append(idx + 1)
+                    # テスト環境の指定がある場合は、その環境のみ省略
+                    # （行の先頭と一致する書き出しを文字数ごとに引き当てる、テスト環境枠ごとの startswith は行わない）
+                    # 以下のようなケースで省略を指定したテスト環境に、意図しないものまで含まれるケースがあるので、最後尾のみ取得する
+                    # `- [x] 環境10` としたが、 環境1まで省略の対象になってしまった..
+                    specified_test_env_omission_idx = max(
+                        (
+                            omission_prefixes.get(line[:prefix_len], 0)
+                            for prefix_len in omission_prefix_lens
+                        ),
+                        default=0,
+                    )
                     # テスト環境の指定がない場合はすべて省略
                     if not specified_test_env_omission_idx:
-                        for idx, env_name in enumerate(test_env_frame):
-                            current_item_dict["test_intention_" + str(idx + 1)] = (
-                                omission_word
-                            )
+                        for tmp_name in test_intention_cols:
+                            current_item_dict[tmp_name] = omission_word
                     else:
-                        # 以下のようなケースで省略を指定したテスト環境に、意図しないものまで含まれるケースがあるので、最後尾のみ取得する
-                        # `- [x] 環境10` としたが、 環境1まで省略の対象になってしまった..
                         current_item_dict[
-                            "test_intention_" + str(specified_test_env_omission_idx[-1])
+                            "test_intention_" + str(specified_test_env_omission_idx)
                         ] = omission_word
 
                 cell_data = (
@@ -458,13 +585,12 @@ def convert_md_to_df(
                 cell_data = cell_data.rjust(total_len)
             # 上記以外の無効データ（Excelに変換されないもの）について警告
             else:
-                line_num = i + 1
-                warning.append(
-                    warning_msg_provider.buildMsg(
-                        MdOpStatus.WARNING_CODE_2.value,
-                        str(line_num),
-                        line.replace("\n", ""),
-                    )
+                file, line_num, _ = locate(i)
+                warning.add(
+                    MdOpStatus.WARNING_CODE_2.value,
+                    str(line_num),
+                    line.replace("\n", ""),
+                    file=file,
                 )
 
             if cur_mark:
@@ -485,36 +611,47 @@ def convert_md_to_df(
 
                 # 1行分の情報を追加
                 if cell_data != "":
-                    current_item_dict[cur_mark] += cell_data
+                    cell_parts.setdefault(cur_mark, []).append(cell_data)
 
         prev_line = line
 
     # タイトル行がない場合はエラーとする
     if not title_detected:
-        msg = warning_msg_provider.buildMsg(MdOpStatus.ERROR_CODE_8.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise warning.error(MdOpStatus.ERROR_CODE_8.value)
 
     # ファイル終了時点の最後の項目を追加
+    flush_cell_parts()
     res = check_if_append_df(current_item_dict)
     if res == "Error":
-        msg = warning_msg_provider.buildMsg(
-            MdOpStatus.ERROR_CODE_9.value, str("最終")
-        )
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise warning.error(MdOpStatus.ERROR_CODE_9.value, str("最終"))
     elif res:
-        df = append_df(df, current_item_dict, item_counter, config_md)
+        append_df(rows, current_item_dict, item_counter, config_md)
+        row_lines.append(item_line)
 
     if check_if_append_df(current_item_dict):
-        df = append_df(df, current_item_dict, item_counter, config_md)
+        append_df(rows, current_item_dict, item_counter, config_md)
+        row_lines.append(item_line)
+
+    # テスト項目表（テスト環境枠の列は項目エリア開始時に追加されるため、最終的な列で揃える）
+    df = pd.DataFrame(rows, columns=list(current_item_dict)).fillna("")
+
+    # テスト項目ごとの ID（Excel に埋め込み、仕様更新時に実施結果を引き継ぐために使う）
+    df[config_md["item_id"]["col_name"]] = generate_item_ids(
+        zip(df["mark"], df["environment"], df["steps"], df["expected"]), config_md
+    )
+    if line_numbers is not None:
+        line_numbers[:] = row_lines
     return df, sheet_name, product_categorie, summary, test_env_frame, warning
 
 
 def convert_df_to_md(
-    df: pd.DataFrame, config_md: dict, output_fn: str, sheet_pos_order: int, product_categorie: str
+    df: pd.DataFrame,
+    config_md: dict,
+    output_fn: str,
+    sheet_pos_order: int,
+    product_categorie: str,
+    overwrite=False,
+    name: str = None,
 ) -> list:
     """
     convert_df_to_md()により生成されたデータフレームを Markdown に変換します
@@ -522,9 +659,11 @@ def convert_df_to_md(
     Args:
         df:                convert_excel_to_df()により生成されたデータフレーム
         config_md:         yamlで定義している設定
-        output_fn:         出力先のファイル
+        output_fn:         出力先のファイル、またはファイルオブジェクト（テキスト / バイナリ）
         sheet_pos_order    シートの並び順
         product_categorie  製品カテゴリー
+        overwrite          保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+        name               出力先の名前（警告の表示に使う、省略時は output_fn から決める）
 
 
     Returns:
@@ -532,9 +671,8 @@ def convert_df_to_md(
     """
 
     # 警告メッセージ格納用（Markdown に変換されないデータなどの警告）
-    warning = []
-    warning_target_fp = os.path.splitext(output_fn)[0] + " シート"
-    warning_msg_provider.setTargetFP(warning_target_fp)
+    warning_target_fp = os.path.splitext(get_source_name(output_fn, name))[0] + " シート"
+    warning = Diagnostics(warning_target_fp)
 
     # DataFrame を List に変換
     sheet_list = []
@@ -584,10 +722,7 @@ def convert_df_to_md(
             break
 
     if any(r == -1 for r in row_idx) or any(c == -1 for c in col_idx):
-        msg = warning_msg_provider.buildMsg(MdOpStatus.ERROR_CODE_4.value)
-        print(msg)
-        input("何かキーを押してください...")
-        sys.exit(1)
+        raise warning.error(MdOpStatus.ERROR_CODE_4.value)
 
     # Markdown ファイルに書き込んでいく
     arr_md_str = []
@@ -615,6 +750,7 @@ def convert_df_to_md(
             col_idx,
             col_idx_test_env_frame,
             config_md,
+            warning,
         )
         prev_is_test_row = is_test_row
 
@@ -624,18 +760,16 @@ def convert_df_to_md(
             for w in warning_at_row:
                 warning.extend(w)
 
-    if os.path.exists(output_fn):
-        print("\n保存先のファイルが既に存在します " + "(" + output_fn + ")")
-        while True:
-            user_input = input("→ 上書きしますか? (y/n): ").lower()
-            if user_input == 'y':
-                print("")
-                break
-            elif user_input == 'n':
-                print(output_fn + " の書き込みをスキップしました\n")
-                return []
-            else:
-                print("→ 'y' または 'n' いずれかのキーを押してください")
+    if hasattr(output_fn, "write"):
+        text = "".join(line + "\n" for line in arr_md_str)
+        if isinstance(output_fn, io.TextIOBase):
+            output_fn.write(text)
+        else:
+            output_fn.write(text.encode("utf-8"))
+        return warning
+
+    if not is_overwritable(output_fn, overwrite):
+        return []
 
     with open(output_fn, mode="w", encoding="utf-8") as f:
         for line in arr_md_str:
@@ -652,6 +786,7 @@ def getRowDataConvertedToMarkdown(
     col_idx: list,
     col_idx_test_env_frame: list,
     config_md: dict,
+    diagnostics: Diagnostics,
 ) -> tuple[list, list, bool]:
 
     def get_omission_test_env_words(row_data, col_idx_test_env_frame) -> list:
@@ -667,7 +802,7 @@ def getRowDataConvertedToMarkdown(
 
     md_str_at_row = []
     warning_at_row = []
-    tmp_warning_msg = []
+    tmp_warning_msg = Diagnostics(diagnostics.file)
     is_test_row = False
 
     col_lv1_idx = col_idx[ExcelCol.LV1.value]
@@ -686,20 +821,19 @@ def getRowDataConvertedToMarkdown(
                 else:
                     cell_num = col_num_to_excel_col_name(c_idx + 1) + str(row_index + 1)
                     if len(tmp_warning_msg) == 0:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_3.value,
                             str(row_index + 1),
                             str(cell_num),
                             str(cell_data),
                         )
                     else:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_4.value,
                             "",
                             str(cell_num),
                             str(cell_data),
                         )
-                    tmp_warning_msg.append(m)
 
         if summary != "":
             md_str_at_row.append(summary)
@@ -716,20 +850,19 @@ def getRowDataConvertedToMarkdown(
                 if cell_data:
                     cell_num = col_num_to_excel_col_name(c_idx + 1) + str(row_index + 1)
                     if len(tmp_warning_msg) == 0:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_3.value,
                             str(row_index + 1),
                             str(cell_num),
                             str(cell_data),
                         )
                     else:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_4.value,
                             "",
                             str(cell_num),
                             str(cell_data),
                         )
-                    tmp_warning_msg.append(m)
 
         if len(test_env_frame):
             md_str_at_row.append("")
@@ -767,12 +900,9 @@ def getRowDataConvertedToMarkdown(
                     test_viewpoint_lv_idx = idx - col_lv1_idx
                     break
             if not mandatory_columns:
-                msg = warning_msg_provider.buildMsg(
+                raise diagnostics.error(
                     MdOpStatus.ERROR_CODE_5.value, str(row_index + 1)
                 )
-                print(msg)
-                input("何かキーを押してください...")
-                sys.exit(1)
 
             optional_columns.append(col_idx[ExcelCol.ENVIRONMENT.value])
 
@@ -811,19 +941,17 @@ def getRowDataConvertedToMarkdown(
                             col_idx,
                             config_md,
                             test_viewpoint_lv_idx,
+                            diagnostics=diagnostics,
                         )
                     )
                 else:
                     cell_num = col_num_to_excel_col_name(c_idx + 1) + str(row_index + 1)
-                    msg = warning_msg_provider.buildMsg(
+                    raise diagnostics.error(
                         MdOpStatus.ERROR_CODE_6.value,
                         str(row_index + 1),
                         str(cell_num),
                         str(cell_data),
                     )
-                    print(msg)
-                    input("何かキーを押してください...")
-                    sys.exit(1)
 
             elif c_idx in optional_columns:
                 if c_idx == col_idx[ExcelCol.NOTES.value]:
@@ -840,6 +968,7 @@ def getRowDataConvertedToMarkdown(
                             config_md,
                             test_viewpoint_lv_idx,
                             omission_test_env_words,
+                            diagnostics,
                         )
                     )
                 else:
@@ -851,6 +980,7 @@ def getRowDataConvertedToMarkdown(
                             col_idx,
                             config_md,
                             test_viewpoint_lv_idx,
+                            diagnostics=diagnostics,
                         )
                     )
 
@@ -858,20 +988,19 @@ def getRowDataConvertedToMarkdown(
                 if cell_data != "":
                     cell_num = col_num_to_excel_col_name(c_idx + 1) + str(row_index + 1)
                     if len(tmp_warning_msg) == 0:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_3.value,
                             str(row_index + 1),
                             str(cell_num),
                             str(cell_data),
                         )
                     else:
-                        m = warning_msg_provider.buildMsg(
+                        tmp_warning_msg.add(
                             MdOpStatus.WARNING_CODE_4.value,
                             "",
                             str(cell_num),
                             str(cell_data),
                         )
-                    tmp_warning_msg.append(m)
 
     warning_at_row.append(tmp_warning_msg)
 
@@ -886,6 +1015,7 @@ def convCellToMDStrLst(
     config_md: dict,
     test_viewpoint_lv_idx=-1,
     omission_test_env_words=None,
+    diagnostics: Diagnostics = None,
 ) -> list:
 
     def markReplacer(cell_data, mark, nested_lst_mark, nested_num_mark) -> list:
@@ -939,15 +1069,12 @@ def convCellToMDStrLst(
                         cell_num = col_num_to_excel_col_name(c_idx + 1) + str(
                             row_index + 1
                         )
-                        msg = warning_msg_provider.buildMsg(
+                        raise (diagnostics or Diagnostics()).error(
                             MdOpStatus.ERROR_CODE_7.value,
                             str(row_index + 1),
                             str(cell_num),
                             str(cell_data),
                         )
-                        print(msg)
-                        input("何かキーを押してください...")
-                        sys.exit(1)
 
                     result.append(line)
 
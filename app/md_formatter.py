@@ -0,0 +1,306 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from fragment_cache import expand_includes
+from markdown_operator import MarkdownLine, ListNumConverter, convert_md_to_df
+from spec_index import find_markdown_files
+from warningMsgProvider import ConversionError, Diagnostics
+
+# 整形の結果
+FORMAT_UNCHANGED = "unchanged"
+FORMAT_CHANGED = "changed"
+FORMAT_ERROR = "error"
+
+# convert_md_to_df() が入れ子のリストとして読む行
+_NESTED_PATTERN = re.compile(r"^(    ){1,}([0-9]+. |- |\+ |\* )")
+# 改行の記号（行末の2文字以上の空白、タブを含む）
+_LINE_BREAK_PATTERN = re.compile(r"[ \t]*  \n$")
+# 手順・番号リストの行頭（インデントを除く）の番号
+_LIST_NUM_PATTERN = re.compile(r"^( *)[0-9]+")
+
+
+def _strip_end(line: str) -> str:
+    # 行末の空白を削除する（改行の有無はそのまま）
+    text = line.rstrip("\n")
+    return text.rstrip() + line[len(text) :]
+
+
+def format_lines(lines: list, name: str, config_md: dict, include_dir: str = None) -> list:
+    """
+    章の行を正規の書き方に整形します
+    convert_md_to_df() と同じ順で行を判定し、Excel に変換する内容（テスト項目の ID を含む）が
+    変わらない範囲で次のように書き換える
+
+    - 手順・番号リストの番号を `1.` にそろえる（変換時に連番を割り当てるため）
+      ListNumConverter.conv() は行の最初の "1" を連番に置き換えるので、そろえると変換結果が変わる行はそのまま
+    - 改行の記号（行末の2文字以上の空白、タブを含む）を2文字の空白にそろえる
+    - Excel に変換しない行（メモ欄、タイトル行、テスト環境枠、キャプション、区切り）の行末の空白を削除する
+    - ファイル末尾の空行を削除する（概要欄、テスト項目のセルに含まれる場合はそのまま）
+
+    見出し、概要欄、テスト項目の改行の記号ではない行末の空白は、そのままセルの内容になるため変更しない
+    取り込みの記述は展開して判定し（番号は部品の行からの続きになる）、章の行のみ書き換える
+
+    Args:
+        lines:          章の行のリスト（改行は "\\n"）
+        name:           章のファイル名
+        config_md:      マークダウン部分に関する設定
+        include_dir:    取り込みの記述の相対パスの基準フォルダ
+
+    Returns:
+        lines:          整形した行のリスト
+    """
+    mark_for_read = config_md["mark_for_read"]
+    patterns = {k: re.compile(v) for k, v in mark_for_read.items()}
+    nested = [
+        (key, idx, re.compile(val))
+        for key, vals in config_md["aux_mark"]["nested"].items()
+        for idx, val in enumerate(vals)
+    ]
+
+    expanded, origins = expand_includes(
+        lines,
+        name,
+        include_dir,
+        config_md.get("mark_for_include", ""),
+        Diagnostics(name),
+    )
+    out = list(lines)
+
+    section = MarkdownLine.FREE_AREA
+    cur_mark = prev_mark = ""
+    prev_nest_lv = 0
+    line_feed = False
+    converter = ListNumConverter(config_md)
+
+    def renumber(line: str, nest_lv: int) -> str:
+        # 変換と同じく連番を進め、番号を "1" にそろえても変換結果が変わらない場合のみそろえる
+        number = str(converter.list_num_counter[nest_lv])
+        converted = converter.conv(line, nest_lv)
+        new = _LIST_NUM_PATTERN.sub(r"\g<1>1", line, count=1)
+        return new if new.replace("1", number, 1) == converted else line
+
+    for i, line in enumerate(expanded):
+        own = origins is None or origins[i][0] == name
+        new = line
+
+        if patterns["title"].match(line):
+            section = MarkdownLine.SUMMARY_AREA
+            new = _strip_end(line)
+        elif patterns["test_env_frame"].match(line):
+            if section == MarkdownLine.SUMMARY_AREA:
+                section = MarkdownLine.TEST_ENV_FRAME_AREA
+            elif section == MarkdownLine.TEST_ENV_FRAME_AREA:
+                section = MarkdownLine.SUMMARY_AREA
+            new = _strip_end(line)
+        elif section == MarkdownLine.FREE_AREA:
+            new = _strip_end(line)
+
+        # テスト観点行（行末の空白もセルの内容になる）
+        elif line.startswith("#"):
+            section = MarkdownLine.TEST_ITEMS_AREA
+            cur_mark = prev_mark = ""
+            prev_nest_lv = 0
+            line_feed = False
+            converter.reset()
+
+        elif section == MarkdownLine.SUMMARY_AREA:
+            pass
+        elif section == MarkdownLine.TEST_ENV_FRAME_AREA:
+            new = _strip_end(line)
+
+        # テスト項目行
+        else:
+            # 改行の記号はセルに含めず、次の行を改行して続けるかどうかのみに使われる
+            has_break = line.endswith("  \n")
+            if has_break:
+                new = _LINE_BREAK_PATTERN.sub("  \n", line)
+            cell = None  # "break": 改行の記号で終わる / "blank": 空行 / None: その他
+            marker = None
+            for key in ["environment", "precondition", "steps", "expected", "notes"]:
+                if patterns[key].match(line) and not (
+                    key == "expected" and patterns["notes"].match(line)
+                ):
+                    marker = key
+                    break
+
+            if marker is not None:
+                cur_mark = marker
+                if marker == "steps":
+                    if cur_mark != prev_mark:
+                        converter.reset()
+                    converter.renumbering(0, prev_nest_lv)
+                    prev_nest_lv = 0
+                    new = renumber(new, 0)
+                    cell = "break" if has_break else None
+                else:
+                    converter.reset()
+                    has_content = line[patterns[marker].match(line).end() :].strip() != ""
+                    cell = "break" if has_break and has_content else None
+            elif patterns["caption"].match(line) or patterns["separator"].match(line):
+                new = _strip_end(line)
+            elif line == "\n":
+                cell = "blank"
+            elif _NESTED_PATTERN.match(line):
+                for key, idx, pattern in nested:
+                    if pattern.match(line):
+                        converter.renumbering(idx + 1, prev_nest_lv)
+                        prev_nest_lv = idx + 1
+                        cell = "break" if has_break else None
+                        if key == "number_list_lv":
+                            new = renumber(new, idx + 1)
+            # 改行して続ける行
+            elif line_feed:
+                cell = "break" if has_break else None
+
+            if cur_mark:
+                prev_mark = cur_mark
+                if cell == "break":
+                    line_feed = True
+                elif cell != "blank":
+                    line_feed = False
+
+        # 章の行のみ書き換える（部品の行は部品のファイルのまま）
+        if own:
+            out[origins[i][1] - 1 if origins else i] = new
+
+    # ファイル末尾の空行は、概要欄、テスト項目のセルに含まれない場合のみ削除する
+    if section != MarkdownLine.SUMMARY_AREA and not (
+        section == MarkdownLine.TEST_ITEMS_AREA and cur_mark
+    ):
+        while out and out[-1] == "\n":
+            out.pop()
+    return out
+
+
+def _converted_content(text: str, name: str, config_md: dict, include_dir: str) -> tuple:
+    """
+    章を Excel に変換する内容（シート名、製品カテゴリ、概要、テスト環境枠、テスト項目表）を返します
+    整形の前後の比較に使うため、セルの行末の空白や改行も含めてそのまま返す
+    """
+    df, sheet_name, product_categorie, summary, test_env_frame, _ = convert_md_to_df(
+        io.StringIO(text), config_md, name=name, include_dir=include_dir
+    )
+    return (
+        sheet_name,
+        product_categorie,
+        summary,
+        test_env_frame,
+        list(df.columns),
+        df.values.tolist(),
+    )
+
+
+def format_chapter(
+    text: str, name: str, config_md: dict, include_dir: str = None
+) -> str:
+    """
+    章（Markdown のテキスト）を整形します（format_lines() を参照）
+    整形の前後で Excel に変換する内容が変わる場合、または整形した結果を整形し直すと変わる場合は、
+    整形せずにエラーとする
+
+    Raises:
+        ConversionError:    変換できない章、または安全に整形できない章
+    """
+    lines = io.StringIO(text, newline=None).readlines()
+    formatted = "".join(format_lines(lines, name, config_md, include_dir))
+    if formatted == text:
+        return text
+    if _converted_content(text, name, config_md, include_dir) != _converted_content(
+        formatted, name, config_md, include_dir
+    ):
+        raise ConversionError("整形すると Excel に変換する内容が変わるため、整形できません")
+    if "".join(format_lines(formatted.splitlines(True), name, config_md, include_dir)) != formatted:
+        raise ConversionError("整形した結果が一定にならないため、整形できません")
+    return formatted
+
+
+def format_file(file: str, config: dict, check: bool = False) -> dict:
+    """
+    Markdown ファイルを整形して上書きします（改行コードはファイルの1行目に合わせる）
+
+    Args:
+        file:       Markdown ファイルのパス
+        config:     設定
+        check:      True の場合は上書きせず、整形が必要かどうかのみ返す
+
+    Returns:
+        result:     {"name", "status"(unchanged / changed / error), "lines"(整形する行数), "error"}
+    """
+    result = {"name": file, "status": FORMAT_UNCHANGED, "lines": 0, "error": ""}
+    try:
+        with open(file, "rb") as f:
+            data = f.read()
+        newline = "\r\n" if data[: data.find(b"\n") + 1].endswith(b"\r\n") else "\n"
+        text = io.StringIO(data.decode("utf-8"), newline=None).read()
+        formatted = format_chapter(
+            text, os.path.basename(file), config["md"], include_dir=os.path.dirname(file)
+        )
+        output = formatted.replace("\n", newline).encode("utf-8")
+        if output != data:
+            result["status"] = FORMAT_CHANGED
+            before = text.splitlines()
+            after = formatted.splitlines()
+            result["lines"] = sum(1 for a, b in zip(before, after) if a != b) + abs(
+                len(before) - len(after)
+            )
+            if not check:
+                with open(file, "wb") as f:
+                    f.write(output)
+    except ConversionError as e:
+        result["status"] = FORMAT_ERROR
+        result["error"] = str(e)
+    except (OSError, UnicodeDecodeError) as e:
+        result["status"] = FORMAT_ERROR
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _format_file(args):
+    return format_file(*args)
+
+
+def format_files(paths: list, config: dict, workers: int = 1, check: bool = False) -> list:
+    """
+    Markdown ファイル（フォルダを指定した場合はフォルダ内の Markdown すべて）を整形します
+
+    Args:
+        paths:      Markdown ファイル、またはフォルダのパス
+        config:     設定
+        workers:    ファイルを並列に整形するワーカープロセス数（1 は並列化しない）
+        check:      True の場合は上書きせず、整形が必要かどうかのみ確認する
+
+    Returns:
+        results:    format_file() の戻り値のリスト（ファイルの順）
+    """
+    tasks = [(file, config, check) for file in find_markdown_files(paths)]
+    if workers <= 1 or len(tasks) <= 1:
+        return [_format_file(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        return list(executor.map(_format_file, tasks, chunksize=8))
+
+
+def print_format_results(results: list, check: bool = False) -> None:
+    for result in results:
+        if result["status"] == FORMAT_UNCHANGED:
+            continue
+        line = "  {:<9} {}".format(result["status"], result["name"])
+        if result["error"]:
+            line += "  " + result["error"].replace("\n", " ")
+        else:
+            line += f"  （{result['lines']} 行）"
+        print(line)
+
+    changed_cnt = sum(1 for result in results if result["status"] == FORMAT_CHANGED)
+    error_cnt = sum(1 for result in results if result["status"] == FORMAT_ERROR)
+    print("")
+    print(
+        f"  {'整形が必要' if check else '整形'} {changed_cnt} / {len(results)} 章"
+        + (f"、エラー {error_cnt} 章" if error_cnt else "")
+    )
@@ -0,0 +1,177 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import time
+import queue
+import threading
+
+# ステージ間のキューの既定の長さ
+#   前のステージが先行して処理できる件数（キューが埋まると前のステージは待つため、メモリ使用量の上限になる）
+DEFAULT_QUEUE_SIZE = 2
+
+# キューの待ち合わせ中に、他のステージのエラーによる中止を確認する間隔（秒）
+_POLL_INTERVAL = 0.1
+
+# 入力の終わりを後段に伝える印
+_END = object()
+
+
+class Stage:
+    """
+    パイプラインの1段分の処理（1つのスレッドで実行する）
+
+    Args:
+        name:       ステージの名前（集計の表示に使う）
+        func:       入力1件を処理し、後段に渡す出力のリストを返す関数
+        finish:     入力がすべて終わった後に呼び出し、残りの出力のリストを返す関数（省略可）
+    """
+
+    def __init__(self, name: str, func, finish=None):
+        self.name = name
+        self.func = func
+        self.finish = finish
+        self.items = 0
+        self.busy = 0.0  # 処理にかかった時間
+        self.wait_input = 0.0  # 前段の出力を待った時間
+        self.wait_output = 0.0  # 後段のキューが空くのを待った時間
+
+    def to_dict(self, elapsed: float) -> dict:
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy": round(self.busy, 4),
+            "wait_input": round(self.wait_input, 4),
+            "wait_output": round(self.wait_output, 4),
+            "utilization": round(self.busy / elapsed, 4) if elapsed > 0 else 0.0,
+        }
+
+
+def run_pipeline(
+    inputs, stages: list, queue_size: int = DEFAULT_QUEUE_SIZE
+) -> tuple[list, dict]:
+    """
+    入力を、ステージごとのスレッドで順に処理します
+    ステージ間は長さ queue_size のキューでつなぎ、各ステージは前段と並行して次の入力を処理する
+    いずれかのステージでエラーが発生した場合は、すべてのステージを止めてそのエラーを送出する
+
+    ※ スレッドで並行させるため、効果があるのはファイルの読み書きや圧縮（GIL を解放する処理）と
+      Python の処理が重なる部分のみ（Python の処理どうしは同時に実行されない）
+
+    Args:
+        inputs:         先頭のステージに渡す入力
+        stages:         Stage のリスト（処理の順）
+        queue_size:     ステージ間のキューの長さ
+
+    Returns:
+        outputs:        最後のステージの出力（入力の順）
+        stats:          {"elapsed": 全体の時間, "stages": ステージごとの集計のリスト, "bottleneck": 処理時間の最も長いステージ}
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages[1:]]
+    outputs = []
+    errors = []
+    stop = threading.Event()
+
+    def put(stage, q, item):
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        stage.wait_output += time.perf_counter() - start
+
+    def get(stage, q):
+        start = time.perf_counter()
+        item = _END
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        stage.wait_input += time.perf_counter() - start
+        return item
+
+    def work(idx):
+        stage = stages[idx]
+        source = iter(inputs) if idx == 0 else None
+        is_last = idx == len(stages) - 1
+
+        def emit(results):
+            for result in results:
+                if is_last:
+                    outputs.append(result)
+                else:
+                    put(stage, queues[idx], result)
+
+        try:
+            while not stop.is_set():
+                item = next(source, _END) if idx == 0 else get(stage, queues[idx - 1])
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                results = stage.func(item)
+                stage.busy += time.perf_counter() - start
+                stage.items += 1
+                emit(results)
+            if stage.finish is not None and not stop.is_set():
+                start = time.perf_counter()
+                results = stage.finish()
+                stage.busy += time.perf_counter() - start
+                emit(results)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if not is_last:
+                put(stage, queues[idx], _END)
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=work, args=(idx,), name="pipeline-" + stage.name, daemon=True)
+        for idx, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    stats = {
+        "elapsed": round(elapsed, 4),
+        "stages": [stage.to_dict(elapsed) for stage in stages],
+        "bottleneck": max(stages, key=lambda stage: stage.busy).name if stages else "",
+    }
+    return outputs, stats
+
+
+def print_stats(stats: dict) -> None:
+    """
+    ステージごとの稼働率を表示します（稼働率の最も高いステージがボトルネック）
+    """
+    print("")
+    print("【 パイプライン 】")
+    for stage in stats["stages"]:
+        print(
+            "  {:<6} {:>4} 件  処理 {:>8.3f} 秒（稼働率 {:>4.0%}）  入力待ち {:>8.3f} 秒  出力待ち {:>8.3f} 秒".format(
+                stage["stage"],
+                stage["items"],
+                stage["busy"],
+                stage["utilization"],
+                stage["wait_input"],
+                stage["wait_output"],
+            )
+        )
+    print("")
+    print(f"  全体 {stats['elapsed']:.3f} 秒（ボトルネック: {stats['bottleneck']}）")
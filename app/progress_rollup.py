@@ -0,0 +1,368 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from spec_updater import HEADER_SEARCH_ROWS
+
+# 集計結果のキャッシュの形式のバージョン（集計処理を変更した場合は更新し、古いキャッシュを使わないようにする）
+ROLLUP_CACHE_VERSION = "1"
+ROLLUP_CACHE_FILE_NAME = "rollup_cache.json"
+
+# 集計する値（テスト項目数）
+COUNT_KEYS = ["total", "omitted", "executed", "ok", "ng"]
+
+
+def get_default_cache_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), "MdToExcel", "rollup_cache")
+
+
+def find_workbooks(paths: list) -> list:
+    """
+    集計対象の Excel ブックのパスを返します（フォルダを指定した場合はサブフォルダも含めて探す）
+    Excel が作る一時ファイル（`~$` で始まるファイル）は除く
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ["xlsm", "xlsx"]:
+                files += sorted(
+                    glob.glob(os.path.join(path, "**", "*." + ext), recursive=True)
+                )
+        else:
+            files.append(path)
+    return [f for f in files if not os.path.basename(f).startswith("~$")]
+
+
+def get_config_key(config: dict) -> str:
+    """
+    集計結果に影響する設定から、キャッシュの照合に使うキーを返します
+    """
+    digest = hashlib.sha256()
+    digest.update(ROLLUP_CACHE_VERSION.encode("utf-8") + b"\0")
+    digest.update(
+        json.dumps(
+            [
+                config["excel"]["col_name"],
+                config["excel"]["col_name_res_area"],
+                config["md"]["test_intention"],
+                config["rollup"],
+            ],
+            ensure_ascii=False,
+            sort_keys=True,
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()[:16]
+
+
+def format_date(value) -> str:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    return "" if value is None else str(value).strip()
+
+
+def scan_sheet(rows, config: dict) -> list:
+    """
+    テスト項目シートの行から、テスト環境枠・テスト観点（レベル 1）ごとの実施状況を集計します
+    行は1度だけ先頭から読み、見出し行より後ろは実施判定・実施結果・実施日の列とテスト観点・番号の列のみ参照する
+
+    Args:
+        rows:       シートの行の値のイテラブル（iter_rows(values_only=True)）
+        config:     設定
+
+    Returns:
+        records:    {"env_name", "viewpoint", "total", "omitted", "executed", "ok", "ng", "last_date"} のリスト
+                    テスト項目表の見出し行が見つからない場合は空のリスト
+    """
+    col_name = config["excel"]["col_name"]
+    res_area = config["excel"]["col_name_res_area"]
+    omission_word = config["md"]["test_intention"]["omission_word"]
+    ok_words = set(config["rollup"]["ok_words"])
+    ng_words = set(config["rollup"]["ng_words"])
+    spec_headers = [v for k, v in col_name.items() if k != "mark"]
+    res_keys = list(res_area)
+
+    rows = iter(rows)
+    prev_values = []
+    header = []
+    for r_idx, row in enumerate(rows):
+        values = ["" if v is None else str(v) for v in row]
+        if values[: len(spec_headers)] == spec_headers:
+            header = values
+            break
+        if r_idx + 1 >= HEADER_SEARCH_ROWS:
+            return []
+        prev_values = values
+    if not header:
+        return []
+
+    c_lv1 = header.index(col_name["lv1"])
+    c_number = header.index(col_name["number"])
+    c_environment = header.index(col_name["environment"])
+    # テスト環境枠（実施判定の列ごとに、1つ上の行に名称がある）
+    envs = []
+    for c_idx, v in enumerate(header):
+        if v == res_area["test_intention"]:
+            envs.append(
+                (
+                    prev_values[c_idx] if c_idx < len(prev_values) else "",
+                    c_idx,
+                    c_idx + res_keys.index("test_result"),
+                    c_idx + res_keys.index("test_date"),
+                )
+            )
+
+    def value(row, c_idx):
+        v = row[c_idx] if c_idx < len(row) else None
+        return "" if v is None else str(v).strip()
+
+    counts = {}
+    viewpoint = ""
+    for row in rows:
+        if value(row, c_lv1):
+            viewpoint = value(row, c_environment)
+            continue
+        if not value(row, c_number):
+            continue
+        for env_name, c_intention, c_result, c_date in envs:
+            key = (env_name, viewpoint)
+            if key not in counts:
+                counts[key] = dict.fromkeys(COUNT_KEYS, 0)
+                counts[key]["last_date"] = ""
+            count = counts[key]
+            if value(row, c_intention) == omission_word:
+                count["omitted"] += 1
+                continue
+            count["total"] += 1
+            result = value(row, c_result)
+            if result:
+                count["executed"] += 1
+                count["ok"] += result in ok_words
+                count["ng"] += result in ng_words
+            date = format_date(row[c_date] if c_date < len(row) else None)
+            count["last_date"] = max(count["last_date"], date)
+
+    return [
+        {"env_name": env_name, "viewpoint": viewpoint, **count}
+        for (env_name, viewpoint), count in counts.items()
+    ]
+
+
+def scan_workbook(path: str, config: dict) -> dict:
+    """
+    Excel ブックの全テスト項目シートを読み取り専用モードで読み込み、実施状況を集計します（ワーカープロセスで実行する）
+    読み込めないブックはエラーとして返す
+
+    Returns:
+        result:     {"sheets": {シート名: scan_sheet() の戻り値}, "error": エラーメッセージ}
+    """
+    sheets = {}
+    try:
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                records = scan_sheet(ws.iter_rows(values_only=True), config)
+                if records:
+                    sheets[ws.title] = records
+        finally:
+            wb.close()
+    except Exception as e:
+        return {"sheets": {}, "error": f"{type(e).__name__}: {e}"}
+    return {"sheets": sheets, "error": ""}
+
+
+def _scan_workbook(args):
+    return scan_workbook(*args)
+
+
+def load_cache(cache_fn: str) -> dict:
+    try:
+        with open(cache_fn, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache: dict, cache_fn: str) -> None:
+    """
+    キャッシュを保存します（書き込めない場合は保存しない）
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_fn), exist_ok=True)
+        # 他のプロセスが読み込み中のファイルを壊さないよう、一時ファイルに書き込んでから置き換える
+        fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(cache_fn), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_fn, cache_fn)
+    except OSError:
+        pass
+
+
+def rollup_workbooks(
+    paths: list, config: dict, workers: int = 1, cache_dir: str = None
+) -> tuple[list, dict]:
+    """
+    複数の実施済み Excel ブックの実施状況を集計します
+    ブックごとの集計結果は更新日時とサイズをキーにキャッシュし、変更のないブックは読み込まない
+
+    Args:
+        paths:      Excel ブック、またはフォルダのパス
+        config:     設定
+        workers:    ブックを並列に読み込むワーカープロセス数（1 は並列化しない）
+        cache_dir:  キャッシュフォルダ（省略時は get_default_cache_dir()）
+
+    Returns:
+        records:    {"book", "sheet", "env_name", "viewpoint", "total", "omitted", "executed", "ok", "ng", "last_date"} のリスト
+        stats:      {"books", "scanned", "cached", "errors": {パス: エラーメッセージ}}
+    """
+    files = find_workbooks(paths)
+    cache_fn = os.path.join(cache_dir or get_default_cache_dir(), ROLLUP_CACHE_FILE_NAME)
+    cache = load_cache(cache_fn)
+    config_key = get_config_key(config)
+
+    results = {}
+    stamps = {}
+    pending = []
+    for file in files:
+        abs_path = os.path.abspath(file)
+        try:
+            st = os.stat(abs_path)
+        except OSError as e:
+            results[file] = {"sheets": {}, "error": f"{type(e).__name__}: {e}"}
+            continue
+        stamps[file] = [st.st_mtime_ns, st.st_size, config_key]
+        entry = cache.get(abs_path)
+        if entry is not None and entry["stamp"] == stamps[file]:
+            results[file] = entry["result"]
+        else:
+            pending.append(file)
+
+    tasks = [(file, config) for file in pending]
+    if workers <= 1 or len(tasks) <= 1:
+        scanned = [scan_workbook(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            scanned = list(executor.map(_scan_workbook, tasks))
+
+    for file, result in zip(pending, scanned):
+        results[file] = result
+        # 読み込めなかったブックは、次回も読み込み直す
+        if not result["error"]:
+            cache[os.path.abspath(file)] = {"stamp": stamps[file], "result": result}
+    if pending:
+        save_cache(cache, cache_fn)
+
+    records = []
+    errors = {}
+    for file in files:
+        result = results[file]
+        if result["error"]:
+            errors[file] = result["error"]
+        for sheet, sheet_records in result["sheets"].items():
+            for record in sheet_records:
+                records.append({"book": file, "sheet": sheet, **record})
+
+    stats = {
+        "books": len(files),
+        "scanned": len(pending),
+        "cached": len(files) - len(pending),
+        "errors": errors,
+    }
+    return records, stats
+
+
+def aggregate(records: list, keys: list) -> list:
+    """
+    集計結果を指定したキーごとにまとめます（消化率 = 実施数 / 総項目数 を付与する）
+
+    Returns:
+        rows:   キーの値、COUNT_KEYS、"last_date"、"progress" の辞書のリスト（records の出現順）
+    """
+    groups = {}
+    for record in records:
+        key = tuple(record[k] for k in keys)
+        if key not in groups:
+            groups[key] = dict(zip(keys, key))
+            groups[key].update(dict.fromkeys(COUNT_KEYS, 0))
+            groups[key]["last_date"] = ""
+        group = groups[key]
+        for k in COUNT_KEYS:
+            group[k] += record[k]
+        group["last_date"] = max(group["last_date"], record["last_date"])
+    rows = list(groups.values())
+    for row in rows:
+        row["progress"] = row["executed"] / row["total"] if row["total"] else 0.0
+    return rows
+
+
+def build_report(records: list) -> dict:
+    """
+    章（ブックとシート）ごと、テスト環境枠ごと、テスト観点ごとの実施状況を返します
+    """
+    return {
+        "total": aggregate(records, []),
+        "chapters": aggregate(records, ["book", "sheet"]),
+        "env_frames": aggregate(records, ["env_name"]),
+        "viewpoints": aggregate(records, ["book", "sheet", "viewpoint"]),
+    }
+
+
+def print_report(report: dict, stats: dict) -> None:
+    def print_rows(title, rows, label):
+        print("")
+        print(f"【 {title} 】")
+        print(
+            "  {:>6} {:>6} {:>8} {:>8} {:>6} {:>7} {:<10} {}".format(
+                "総項目", "実施", "OK", "NG", "省略", "消化率", "最終実施日", ""
+            )
+        )
+        for row in rows:
+            print(
+                "  {:>9} {:>8} {:>8} {:>8} {:>8} {:>10.1%} {:<15} {}".format(
+                    row["total"],
+                    row["executed"],
+                    row["ok"],
+                    row["ng"],
+                    row["omitted"],
+                    row["progress"],
+                    row["last_date"] or "-",
+                    label(row),
+                )
+            )
+
+    print_rows(
+        "章ごと",
+        report["chapters"],
+        lambda row: os.path.basename(row["book"]) + " / " + row["sheet"],
+    )
+    print_rows("テスト環境枠ごと", report["env_frames"], lambda row: row["env_name"] or "-")
+    print_rows(
+        "テスト観点ごと",
+        report["viewpoints"],
+        lambda row: row["sheet"] + " / " + (row["viewpoint"] or "-"),
+    )
+    print_rows("合計", report["total"], lambda row: "")
+
+    print("")
+    print(
+        f"  ブック {stats['books']} 件（読み込み {stats['scanned']} 件 / キャッシュ {stats['cached']} 件）"
+    )
+    if stats["errors"]:
+        print("")
+        print("【 エラー 】")
+        for path, error in stats["errors"].items():
+            print(f"  {path}: {error}")
+
+
+def write_report(report: dict, stats: dict, json_path: str) -> None:
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({**report, "stats": stats}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,337 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import json
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from openpyxl.utils import get_column_letter
+from progress_rollup import find_workbooks
+from spec_updater import HEADER_SEARCH_ROWS
+from warningMsgProvider import ExOpStatus, Diagnostics
+
+
+def normalize_value(value):
+    """
+    比較・書き込み用に実施結果の値を正規化します（空の場合は None）
+    文字列は前後の空白を除き、時刻のない日時は日付にする
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+        return value.date()
+    return value
+
+
+def scan_sheet(rows, config: dict) -> dict:
+    """
+    テスト項目シートの行から、テスト項目ごとに入力済みの実施結果エリアのセルを読み込みます
+    行は1度だけ先頭から読み、見出し行より後ろは実施結果エリアと番号・ID の列のみ参照する
+    実施判定の列は Markdown の記述から決まるため対象外
+
+    Args:
+        rows:       シートの行の値のイテラブル（iter_rows(values_only=True)）
+        config:     設定
+
+    Returns:
+        result:     {
+                        "envs":  テスト環境枠の名称のリスト
+                        "cols":  (テスト環境枠の添字, 実施結果エリアの列のキー) -> 列番号
+                        "rows":  テスト項目のキー（ID、ID 列がない場合は行番号） -> 行番号
+                        "cells": テスト項目のキー -> {(テスト環境枠の添字, 列のキー): 値}（入力済みのセルのみ）
+                    }
+                    テスト項目表の見出し行が見つからない場合は None
+    """
+    col_name = config["excel"]["col_name"]
+    res_area = config["excel"]["col_name_res_area"]
+    item_id_header = config["excel"]["item_id"]["header"]
+    spec_headers = [v for k, v in col_name.items() if k != "mark"]
+    res_keys = list(res_area)
+
+    rows = iter(rows)
+    prev_values = []
+    header = []
+    header_row = 0
+    for r_idx, row in enumerate(rows):
+        values = ["" if v is None else str(v) for v in row]
+        if values[: len(spec_headers)] == spec_headers:
+            header = values
+            header_row = r_idx + 1
+            break
+        if r_idx + 1 >= HEADER_SEARCH_ROWS:
+            return None
+        prev_values = values
+    if not header:
+        return None
+
+    c_number = header.index(col_name["number"])
+    c_item_id = header.index(item_id_header) if item_id_header in header else -1
+    # テスト環境枠（実施判定の列ごとに、1つ上の行に名称がある）
+    envs = []
+    cols = {}
+    for c_idx, v in enumerate(header):
+        if v == res_area["test_intention"]:
+            env_idx = len(envs)
+            envs.append(prev_values[c_idx] if c_idx < len(prev_values) else "")
+            for offset, key in enumerate(res_keys[1:], start=1):
+                cols[(env_idx, key)] = c_idx + offset
+    col_items = list(cols.items())
+
+    item_rows = {}
+    cells = {}
+    for row_no, row in enumerate(rows, start=header_row + 1):
+        if c_number >= len(row) or row[c_number] in (None, ""):
+            continue
+        key = row[c_item_id] if 0 <= c_item_id < len(row) and row[c_item_id] else row_no
+        item_rows[key] = row_no
+        filled = {}
+        for col_key, c_idx in col_items:
+            value = normalize_value(row[c_idx]) if c_idx < len(row) else None
+            if value is not None:
+                filled[col_key] = value
+        if filled:
+            cells[key] = filled
+
+    return {
+        "envs": envs,
+        "cols": {col_key: c_idx + 1 for col_key, c_idx in col_items},
+        "rows": item_rows,
+        "cells": cells,
+    }
+
+
+def scan_workbook(path: str, config: dict) -> dict:
+    """
+    Excel ブックの全テスト項目シートを読み取り専用モードで読み込みます（ワーカープロセスで実行する）
+    読み込めないブックはエラーとして返す
+
+    Returns:
+        result:     {"sheets": {シート名: scan_sheet() の戻り値}, "error": エラーメッセージ}
+    """
+    sheets = {}
+    try:
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                result = scan_sheet(ws.iter_rows(values_only=True), config)
+                if result is not None:
+                    sheets[ws.title] = result
+        finally:
+            wb.close()
+    except Exception as e:
+        return {"sheets": {}, "error": f"{type(e).__name__}: {e}"}
+    return {"sheets": sheets, "error": ""}
+
+
+def _scan_workbook(args):
+    return scan_workbook(*args)
+
+
+def merge_results(files: list, scans: list, config: dict) -> tuple[dict, list, list]:
+    """
+    ブックごとの実施結果をまとめます
+    同じセルに異なる値が入力されている場合は、先に指定したブックの値を採用し、競合として報告する
+
+    Args:
+        files:      ブックのパス（先頭のブックを統合先の基準とする）
+        scans:      ブックごとの scan_workbook() の戻り値の "sheets"
+        config:     設定
+
+    Returns:
+        merged:     シート名 -> {(行番号, 列番号): (値, ブックの添字)}
+        conflicts:  {"sheet", "cell", "item", "env_name", "column", "values": [{"book", "value"}], "adopted"} のリスト
+        unmatched:  {"book", "sheet", "item", "reason"} のリスト（基準のブックに対応する項目のない入力）
+    """
+    res_area = config["excel"]["col_name_res_area"]
+    base = scans[0]
+    merged = {sheet: {} for sheet in base}
+    conflict_values = {}
+    unmatched = []
+    for book_idx, sheets in enumerate(scans):
+        for sheet, result in sheets.items():
+            if sheet not in base:
+                if result["cells"]:
+                    unmatched.append(
+                        {
+                            "book": files[book_idx],
+                            "sheet": sheet,
+                            "item": "",
+                            "reason": "基準のブックにないシート",
+                        }
+                    )
+                continue
+            base_sheet = base[sheet]
+            if result["envs"] != base_sheet["envs"]:
+                unmatched.append(
+                    {
+                        "book": files[book_idx],
+                        "sheet": sheet,
+                        "item": "",
+                        "reason": "テスト環境枠が基準のブックと異なる",
+                    }
+                )
+                continue
+            sheet_merged = merged[sheet]
+            for key, filled in result["cells"].items():
+                row_no = base_sheet["rows"].get(key)
+                if row_no is None:
+                    unmatched.append(
+                        {
+                            "book": files[book_idx],
+                            "sheet": sheet,
+                            "item": str(key),
+                            "reason": "基準のブックにないテスト項目",
+                        }
+                    )
+                    continue
+                for col_key, value in filled.items():
+                    cell = (row_no, base_sheet["cols"][col_key])
+                    current = sheet_merged.get(cell)
+                    if current is None:
+                        sheet_merged[cell] = (value, book_idx)
+                    elif current[0] != value:
+                        conflict_values.setdefault(
+                            (sheet, cell, key, col_key), [current]
+                        ).append((value, book_idx))
+
+    conflicts = []
+    for (sheet, (row_no, col_no), key, (env_idx, res_key)), values in sorted(
+        conflict_values.items(), key=lambda entry: (entry[0][0], entry[0][1])
+    ):
+        conflicts.append(
+            {
+                "sheet": sheet,
+                "cell": get_column_letter(col_no) + str(row_no),
+                "item": str(key),
+                "env_name": base[sheet]["envs"][env_idx],
+                "column": res_area[res_key],
+                "values": [
+                    {"book": files[book_idx], "value": str(value)}
+                    for value, book_idx in values
+                ],
+                "adopted": files[values[0][1]],
+            }
+        )
+    return merged, conflicts, unmatched
+
+
+def merge_workbooks(
+    paths: list, output_fn: str, config: dict, workers: int = 1
+) -> tuple[list, dict]:
+    """
+    同じ Excel テスト項目書をコピーして実施した複数のブックの実施結果を、1つのブックにまとめて保存します
+    先頭のブックを基準とし、他のブックで入力された実施結果エリアのセルを書き込む
+    （テスト項目は ID、ID 列のないシートは行番号で対応づける）
+
+    ブックは読み取り専用モードで --workers のワーカープロセスで並列に読み込み、
+    その間に基準のブックを書き込み用に読み込む
+    読み込めないブックがある場合は、入力の欠けたブックを作らないよう保存しない
+
+    Args:
+        paths:      Excel ブック、またはフォルダのパス（先頭のブックが基準）
+        output_fn:  保存先のファイル
+        config:     設定
+        workers:    ブックを並列に読み込むワーカープロセス数（1 は並列化しない）
+
+    Returns:
+        conflicts:  merge_results() の競合のリスト
+        stats:      {"books", "sheets", "written", "unmatched", "errors": {パス: エラーメッセージ}}
+
+    Raises:
+        OutputFileError:    保存先に書き込めない
+    """
+    files = find_workbooks(paths)
+    stats = {"books": len(files), "sheets": 0, "written": 0, "unmatched": [], "errors": {}}
+    if not files:
+        return [], stats
+
+    tasks = [(file, config) for file in files]
+    keep_vba = os.path.splitext(files[0])[1].lower() == ".xlsm"
+    wb = None
+    if workers <= 1 or len(tasks) <= 1:
+        results = [scan_workbook(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = executor.map(_scan_workbook, tasks)
+            # ワーカープロセスの読み込みと並行して、基準のブックを書き込み用に読み込む
+            # （読み込めない場合は、ワーカープロセスの読み込みのエラーとして報告する）
+            try:
+                wb = openpyxl.load_workbook(files[0], keep_vba=keep_vba)
+            except Exception:
+                wb = None
+            results = list(futures)
+
+    for file, result in zip(files, results):
+        if result["error"]:
+            stats["errors"][file] = result["error"]
+    if stats["errors"]:
+        return [], stats
+
+    merged, conflicts, unmatched = merge_results(
+        files, [result["sheets"] for result in results], config
+    )
+    stats["sheets"] = len(merged)
+    stats["unmatched"] = unmatched
+
+    if wb is None:
+        wb = openpyxl.load_workbook(files[0], keep_vba=keep_vba)
+    for sheet, cells in merged.items():
+        ws = wb[sheet]
+        for (row_no, col_no), (value, book_idx) in cells.items():
+            # 基準のブックに入力済みのセルはそのまま
+            if book_idx:
+                ws.cell(row=row_no, column=col_no).value = value
+                stats["written"] += 1
+
+    try:
+        wb.save(output_fn)
+    except PermissionError:
+        raise Diagnostics(output_fn).error(ExOpStatus.ERROR_CODE_1.value)
+    return conflicts, stats
+
+
+def print_conflicts(conflicts: list, stats: dict, limit: int = 0) -> None:
+    if conflicts:
+        print("")
+        print("【 競合 】（先に指定したブックの値を採用しました）")
+        for conflict_idx, conflict in enumerate(conflicts):
+            if limit > 0 and conflict_idx >= limit:
+                print(f"  ... ほか {len(conflicts) - limit} 件")
+                break
+            print(
+                f"  {conflict['sheet']}!{conflict['cell']}  項目: {conflict['item']}"
+                f"  {conflict['env_name']} / {conflict['column']}"
+            )
+            for value in conflict["values"]:
+                print(f"    {os.path.basename(value['book'])}: {value['value']}")
+
+    if stats["unmatched"]:
+        print("")
+        print("【 統合できなかった入力 】")
+        for entry in stats["unmatched"]:
+            item = f" / {entry['item']}" if entry["item"] else ""
+            print(f"  {entry['book']}: {entry['sheet']}{item}（{entry['reason']}）")
+
+    print("")
+    print(
+        f"  ブック {stats['books']} 件、シート {stats['sheets']} 件、"
+        f"書き込み {stats['written']} セル、競合 {len(conflicts)} セル"
+    )
+    if stats["errors"]:
+        print("")
+        print("【 エラー 】")
+        print("以下のブックを読み込めなかったため、保存していません")
+        for path, error in stats["errors"].items():
+            print(f"  {path}: {error}")
+
+
+def write_conflicts(conflicts: list, stats: dict, json_path: str) -> None:
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"conflicts": conflicts, "stats": stats}, f, ensure_ascii=False, indent=2)
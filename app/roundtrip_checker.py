@@ -0,0 +1,210 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import re
+import json
+import time
+import difflib
+from concurrent.futures import ProcessPoolExecutor
+from fragment_cache import expand_includes
+from converter import (
+    convert_markdown_in_memory,
+    convert_workbook_in_memory,
+    ENGINE_OPENPYXL,
+)
+from markdown_operator import convert_md_to_df
+from spec_index import find_markdown_files
+from warningMsgProvider import ConversionError, Diagnostics
+
+# 比較するテスト項目の列（テスト観点行は見出しのみ比較する）
+ITEM_FIELDS = ["environment", "precondition", "steps", "expected", "notes"]
+
+# 比較するテスト環境枠の数（逆変換は最初のテスト環境枠のみ変換する仕様のため、2つ目以降は比較しない）
+COMPARED_ENV_FRAME_NUM = 1
+
+# 差分の前後に表示する行数
+DIFF_CONTEXT = 1
+
+# チェックの結果
+CHECK_OK = "ok"
+CHECK_DIFF = "diff"
+CHECK_ERROR = "error"
+
+
+def render_chapter(text: str, name: str, config_md: dict) -> tuple[list, int]:
+    """
+    Markdown を変換と同じ文法で読み込み、比較用の正規化したテキスト（行のリスト）を返します
+    書き方の違い（空白行、空のリスト、行末の空白、区切り線など）は Excel に変換した結果に影響しないため無視する
+
+    Returns:
+        lines:          正規化したテキストの行のリスト
+        env_frame_num:  テスト環境枠の数
+    """
+    df, sheet_name, product_categorie, summary, test_env_frame, _ = convert_md_to_df(
+        io.StringIO(text), config_md, name=name
+    )
+    lv = [k for k in config_md["col_name"] if re.match("lv[1-6]$", k)]
+    env_num = min(len(test_env_frame), COMPARED_ENV_FRAME_NUM)
+    intention_cols = ["test_intention_" + str(idx + 1) for idx in range(env_num)]
+
+    def field(value) -> list:
+        return [line.rstrip() for line in str(value).rstrip().split("\n")]
+
+    lines = [
+        "sheet: " + sheet_name,
+        "product_category: " + product_categorie,
+        "summary: " + " / ".join(line.strip() for line in summary if line.strip()),
+        "test_env_frame: " + " | ".join(test_env_frame[:env_num]),
+    ]
+    for row in df.to_dict("records"):
+        mark = row["mark"]
+        if mark in lv:
+            lines.append(f"{mark} [{row[mark]}] {row['environment']}")
+            continue
+        lines.append(f"item [{row['number']}]")
+        for key in ITEM_FIELDS:
+            for idx, line in enumerate(field(row[key])):
+                lines.append(f"    {key if idx == 0 else '':<14}| {line}")
+        lines.append(
+            "    {:<14}| {}".format(
+                "test_intention", " | ".join(row[col] for col in intention_cols)
+            )
+        )
+    return lines, len(test_env_frame)
+
+
+def check_chapter(
+    name: str,
+    text: str,
+    config: dict,
+    engine: str = ENGINE_OPENPYXL,
+    include_dir: str = None,
+) -> dict:
+    """
+    1つの章を Markdown -> Excel -> Markdown の順にメモリ上で変換し、変換前と変換後を比較します
+    取り込みの記述は include_dir を基準に展開してから変換する（逆変換した Markdown は展開した内容になるため）
+
+    Returns:
+        result:     {"name", "status"(ok / diff / error), "diff"(差分の行のリスト), "error", "note", "elapsed"}
+    """
+    start = time.perf_counter()
+    result = {"name": name, "status": CHECK_OK, "diff": [], "error": "", "note": ""}
+    try:
+        if include_dir is not None:
+            lines, _ = expand_includes(
+                io.StringIO(text, newline=None).readlines(),
+                name,
+                include_dir,
+                config["md"].get("mark_for_include", ""),
+                Diagnostics(name),
+            )
+            text = "".join(lines)
+        book = convert_markdown_in_memory(
+            [(name, text)], config=config, engine=engine
+        ).outputs[0][1]
+        sheets = convert_workbook_in_memory(book, config=config).outputs
+        # 逆変換したシートが1つの章に戻ることを確認する
+        if len(sheets) != 1:
+            raise ConversionError(
+                f"逆変換したシートが {len(sheets)} 個あります（{', '.join(n for n, _ in sheets)}）"
+            )
+        expected, env_frame_num = render_chapter(text, name, config["md"])
+        actual, _ = render_chapter(sheets[0][1], name, config["md"])
+        if env_frame_num > COMPARED_ENV_FRAME_NUM:
+            result["note"] = (
+                f"テスト環境枠 {env_frame_num} 個のうち、逆変換の対象の"
+                f" {COMPARED_ENV_FRAME_NUM} 個のみ比較しました"
+            )
+    except ConversionError as e:
+        result["status"] = CHECK_ERROR
+        result["error"] = str(e)
+    except Exception as e:
+        # 変換処理の不具合も、他の章の確認を止めずに結果として返す
+        result["status"] = CHECK_ERROR
+        result["error"] = f"{type(e).__name__}: {e}"
+    else:
+        if expected != actual:
+            result["status"] = CHECK_DIFF
+            result["diff"] = list(
+                difflib.unified_diff(
+                    expected,
+                    actual,
+                    fromfile=name,
+                    tofile=name + " (roundtrip)",
+                    n=DIFF_CONTEXT,
+                    lineterm="",
+                )
+            )
+    result["elapsed"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _check_file(args):
+    file, config, engine = args
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError as e:
+        return {
+            "name": file,
+            "status": CHECK_ERROR,
+            "diff": [],
+            "error": f"{type(e).__name__}: {e}",
+            "note": "",
+            "elapsed": 0.0,
+        }
+    result = check_chapter(
+        os.path.basename(file), text, config, engine, include_dir=os.path.dirname(file)
+    )
+    result["name"] = file
+    return result
+
+
+def check_files(
+    paths: list, config: dict, workers: int = 1, engine: str = ENGINE_OPENPYXL
+) -> list:
+    """
+    Markdown ファイル（フォルダを指定した場合はフォルダ内の Markdown すべて）の往復変換を確認します
+
+    Args:
+        paths:      Markdown ファイル、またはフォルダのパス
+        config:     設定
+        workers:    章を並列に確認するワーカープロセス数（1 は並列化しない）
+        engine:     Excel ブックの出力エンジン（openpyxl / xlsxwriter）
+
+    Returns:
+        results:    check_chapter() の戻り値のリスト（name はファイルのパス、ファイルの順）
+    """
+    tasks = [(file, config, engine) for file in find_markdown_files(paths)]
+    if workers <= 1 or len(tasks) <= 1:
+        return [_check_file(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        return list(executor.map(_check_file, tasks))
+
+
+def print_results(results: list) -> None:
+    for result in results:
+        line = "  {:<6} {:<40} {:>8.3f}s".format(
+            result["status"], result["name"], result["elapsed"]
+        )
+        if result["error"]:
+            line += "  " + result["error"].replace("\n", " ")
+        elif result["note"]:
+            line += "  ※ " + result["note"]
+        print(line)
+        for diff_line in result["diff"]:
+            print("      " + diff_line)
+
+    ok_cnt = sum(1 for result in results if result["status"] == CHECK_OK)
+    print("")
+    print(f"  一致 {ok_cnt} / {len(results)} 章")
+
+
+def write_results(results: list, json_path: str) -> None:
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
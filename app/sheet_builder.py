@@ -0,0 +1,184 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from excel_operator import build_sheet_payload, build_row_range_fragment
+
+# シート名の最大文字数（Excel の制限）
+MAX_SHEET_NAME_LEN = 31
+
+
+def get_part_sheet_name(sheet_name: str, part_no: int, used_names: set = None) -> str:
+    """
+    分割したシートの名前を返します（先頭のシートは元の名前のまま、2つ目以降は `_2`, `_3` .. を付与する）
+    31 文字を超える場合は、元の名前の末尾を切り詰める
+
+    used_names を渡した場合は、使用済みの名前と重ならないよう `_2_2`, `_2_3` .. のように番号を加え、
+    決めた名前を used_names に加える
+    （重なる名前のシートを追加すると openpyxl が末尾に数字を付けて名前を変えるため、
+      分割したシートの番号が崩れ、--update / --merge でシート名から対応付けられなくなる）
+
+    Args:
+        sheet_name:     章のシート名
+        part_no:        分割したシートの番号（1 から）
+        used_names:     ブックで使用済みのシート名（Excel と同じく大文字・小文字を区別しないため、小文字にしたもの）
+    """
+    if part_no == 1:
+        name = sheet_name
+    else:
+        suffix = "_" + str(part_no)
+        name = sheet_name[: MAX_SHEET_NAME_LEN - len(suffix)] + suffix
+        retry = 1
+        while used_names is not None and name.lower() in used_names:
+            retry += 1
+            suffix = "_" + str(part_no) + "_" + str(retry)
+            name = sheet_name[: MAX_SHEET_NAME_LEN - len(suffix)] + suffix
+    if used_names is not None:
+        used_names.add(name.lower())
+    return name
+
+
+def split_test_items(df: pd.DataFrame, max_rows: int, config_md: dict) -> list:
+    """
+    テスト項目表を、指定した行数を超えたところでテスト観点（lv1 / lv2）の区切りで分割します
+    番号（通し番号、テスト観点の番号）は分割前のものを引き継ぐため、分割後のシート間でも連続する
+
+    1つのテスト観点が指定した行数を超える場合は、そのテスト観点を1つのシートに収める
+
+    Args:
+        df:         convert_md_to_df()により生成されたデータフレーム
+        max_rows:   1シートの最大行数の目安（0 以下の場合は分割しない）
+        config_md:  マークダウン部分に関する設定
+
+    Returns:
+        dfs:        分割したデータフレームのリスト
+    """
+    if max_rows <= 0 or len(df) <= max_rows:
+        return [df]
+
+    lv1_mark, lv2_mark = [k for k in config_md["col_name"] if re.match("lv[12]$", k)]
+    # `#` の直後の `##` では分割しない（`#` の見出しだけが前のシートの最終行に残るため）
+    marks = list(df["mark"])
+    boundaries = [
+        row_idx
+        for row_idx, mark in enumerate(marks)
+        if row_idx > 0
+        and (mark == lv1_mark or (mark == lv2_mark and marks[row_idx - 1] != lv1_mark))
+    ]
+
+    dfs = []
+    part_start = 0
+    prev_boundary = 0
+    for boundary in boundaries + [len(df)]:
+        # 次の区切りまで含めると最大行数を超える場合は、直前の区切りで分割する
+        if boundary - part_start > max_rows and prev_boundary > part_start:
+            dfs.append(df.iloc[part_start:prev_boundary].reset_index(drop=True))
+            part_start = prev_boundary
+        prev_boundary = boundary
+    dfs.append(df.iloc[part_start:].reset_index(drop=True))
+
+    return dfs
+
+
+def expand_sheets(
+    chapters: list, max_rows: int, config_md: dict, used_names: set = None
+) -> list:
+    """
+    章を、ブックに並べるシートの単位に展開します（行数の多い章は split_test_items() で複数のシートに分割する）
+    分割したシートの名前は、ブックの他のシート（章）の名前と重ならないように決める
+
+    Args:
+        chapters:   (df, sheet_name, product_categorie, summary, test_env_frame) のリスト（シートの並び順）
+        max_rows:   1シートの最大行数の目安（0 以下の場合は分割しない）
+        config_md:  マークダウン部分に関する設定
+        used_names: 章の他にブックで使用済みのシート名（小文字にしたもの）
+
+    Returns:
+        sheets:     (df, sheet_name, product_categorie, summary, test_env_frame) のリスト（シートの並び順）
+    """
+    # 章の名前は分割したシートより優先する（後の章が `_2` などで終わる名前でも、その章の名前を変えない）
+    used_names = set(used_names or ()) | {chapter[1].lower() for chapter in chapters}
+    sheets = []
+    for df, sheet_name, product_categorie, summary, test_env_frame in chapters:
+        for part_no, part_df in enumerate(split_test_items(df, max_rows, config_md)):
+            sheets.append(
+                (
+                    part_df,
+                    get_part_sheet_name(sheet_name, part_no + 1, used_names),
+                    product_categorie,
+                    summary,
+                    test_env_frame,
+                )
+            )
+    return sheets
+
+
+def _build_sheet_payload(args):
+    return build_sheet_payload(*args)
+
+
+def build_sheet_payloads(tasks: list, workers: int) -> list:
+    """
+    複数のテスト項目シートを並列に生成します
+
+    Args:
+        tasks:      build_sheet_payload() の引数のタプルのリスト
+        workers:    ワーカープロセス数
+
+    Returns:
+        payloads:   tasks と同じ順序の build_sheet_payload() の戻り値
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [build_sheet_payload(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        return list(executor.map(_build_sheet_payload, tasks))
+
+
+def split_row_ranges(row_num: int, range_num: int) -> list:
+    """
+    テスト項目表の行を、行数がほぼ等しい連続した行範囲 (開始, 終了) に分割します（空の範囲は作らない）
+    """
+    range_num = max(1, min(range_num, row_num))
+    bounds = [row_num * idx // range_num for idx in range(range_num + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _build_row_range_fragment(args):
+    return build_row_range_fragment(*args)
+
+
+def build_row_range_fragments(tasks: list, workers: int, range_num: int) -> list:
+    """
+    テスト項目シートの行を行範囲に分割し、行範囲ごとに並列に生成します
+    行範囲の境界をまたぐテスト観点の着色状態は、各行範囲で開始行までの行から求めて引き継ぐ
+
+    Args:
+        tasks:      (df, sheet_name, summary, test_env_frame, config_excel) のタプルのリスト
+        workers:    ワーカープロセス数
+        range_num:  1シートあたりの行範囲の数
+
+    Returns:
+        fragments:  tasks と同じ順序の、シートごとの build_row_range_fragment() の戻り値のリスト（行範囲の順）
+    """
+    range_tasks = []
+    sheet_idxs = []
+    for sheet_idx, task in enumerate(tasks):
+        for row_range in split_row_ranges(len(task[0]), range_num):
+            range_tasks.append(task + (row_range,))
+            sheet_idxs.append(sheet_idx)
+
+    if workers <= 1 or len(range_tasks) <= 1:
+        results = [build_row_range_fragment(*task) for task in range_tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(range_tasks))) as executor:
+            results = list(executor.map(_build_row_range_fragment, range_tasks))
+
+    fragments = [[] for _ in tasks]
+    for sheet_idx, result in zip(sheet_idxs, results):
+        fragments[sheet_idx].append(result)
+    return fragments
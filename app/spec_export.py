@@ -0,0 +1,286 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import re
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from markdown_operator import convert_md_to_df, get_source_name
+from warningMsgProvider import Diagnostics, ConversionError, ERROR_TYPES
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# 出力形式
+EXPORT_PARQUET = "parquet"  # pyarrow が必要
+EXPORT_CSV = "csv"
+EXPORT_JSONL = "jsonl"  # JSON Lines（1行に1レコード）
+EXPORT_FORMATS = [EXPORT_PARQUET, EXPORT_CSV, EXPORT_JSONL]
+
+# 出力するファイル名（拡張子を除く）
+ITEMS_TABLE_NAME = "items"  # テスト観点行とテスト項目行（1行に1レコード）
+INTENTIONS_TABLE_NAME = "test_intentions"  # テスト項目とテスト環境枠の組ごとの実施判定
+
+# 行の種類
+KIND_VIEWPOINT = "viewpoint"
+KIND_ITEM = "item"
+
+# 列（並び順）と型
+ITEM_COLUMNS = [
+    ("source", "string"),  # Markdown ファイル名
+    ("sheet_name", "string"),
+    ("product_category", "string"),
+    ("row", "int64"),  # テスト項目表の行番号（1 から）
+    ("kind", "string"),  # viewpoint / item
+    ("level", "int64"),  # テスト観点のレベル（1 - 6、テスト項目行は 0）
+    ("item_id", "string"),  # テスト項目の ID（テスト観点行は空）
+    ("number", "int64"),  # テスト観点の番号、またはテスト項目の通し番号
+    ("lv1", "string"),  # 行が属するテスト観点（レベルごとの見出し）
+    ("lv2", "string"),
+    ("lv3", "string"),
+    ("lv4", "string"),
+    ("lv5", "string"),
+    ("lv6", "string"),
+    ("environment", "string"),
+    ("precondition", "string"),
+    ("steps", "string"),
+    ("expected", "string"),
+    ("notes", "string"),
+    ("env_frame_num", "int64"),  # テスト環境枠の数
+    ("omitted_env_num", "int64"),  # 省略するテスト環境枠の数
+]
+INTENTION_COLUMNS = [
+    ("source", "string"),
+    ("sheet_name", "string"),
+    ("row", "int64"),
+    ("item_id", "string"),
+    ("env_frame", "int64"),  # テスト環境枠の番号（1 から）
+    ("env_name", "string"),
+    ("test_intention", "string"),  # 実施 / 省略
+    ("omitted", "bool"),
+]
+
+
+class ExportError(Exception):
+    """エクスポートの出力形式を使用できない"""
+
+
+def get_default_format() -> str:
+    return EXPORT_PARQUET if pyarrow is not None else EXPORT_CSV
+
+
+def flatten_spec(
+    df,
+    source_name: str,
+    sheet_name: str,
+    product_categorie: str,
+    test_env_frame: list,
+    config_md: dict,
+) -> tuple[list, list]:
+    """
+    convert_md_to_df() のテスト項目表を、分析用の平坦な表に変換します
+    テスト観点行の見出しは、後続の行の lv1 - lv6 列に引き継ぐ
+
+    Args:
+        df:                 convert_md_to_df()により生成されたデータフレーム
+        source_name:        Markdown ファイル名
+        sheet_name:         Excelのシート名
+        product_categorie:  製品カテゴリの略称
+        test_env_frame:     テスト環境枠
+        config_md:          マークダウン部分に関する設定
+
+    Returns:
+        items:              ITEM_COLUMNS の辞書のリスト
+        intentions:         INTENTION_COLUMNS の辞書のリスト
+    """
+    lv = [k for k in config_md["col_name"] if re.match("lv[1-6]$", k)]
+    item_id_col = config_md["item_id"]["col_name"]
+    omission_word = config_md["test_intention"]["omission_word"]
+    env_names = list(test_env_frame) or [""]
+    intention_cols = ["test_intention_" + str(idx + 1) for idx in range(len(env_names))]
+
+    # 列ごとのリストから行を組み立てる（DataFrame.to_dict() より速い）
+    columns = {col: df[col].tolist() for col in df.columns}
+    rows = (dict(zip(columns, values)) for values in zip(*columns.values()))
+
+    items = []
+    intentions = []
+    path = [""] * len(lv)
+    for row_idx, row in enumerate(rows):
+        mark = row["mark"]
+        if mark in lv:
+            level = lv.index(mark) + 1
+            # テスト観点行の見出しは環境列に格納されている
+            path[level - 1] = row["environment"]
+            path[level:] = [""] * (len(lv) - level)
+            number = row[mark]
+            kind = KIND_VIEWPOINT
+        else:
+            level = 0
+            number = row["number"]
+            kind = KIND_ITEM
+
+        record = {
+            "source": source_name,
+            "sheet_name": sheet_name,
+            "product_category": product_categorie,
+            "row": row_idx + 1,
+            "kind": kind,
+            "level": level,
+            "item_id": row.get(item_id_col, ""),
+            "number": int(number) if str(number).isdigit() else 0,
+        }
+        record.update(zip(lv, path))
+        for key in ["environment", "precondition", "steps", "expected", "notes"]:
+            record[key] = "" if kind == KIND_VIEWPOINT else row[key]
+        record["env_frame_num"] = len(env_names)
+        record["omitted_env_num"] = 0
+
+        if kind == KIND_ITEM:
+            for env_idx, (env_name, col) in enumerate(zip(env_names, intention_cols)):
+                test_intention = row.get(col, "")
+                omitted = test_intention == omission_word
+                record["omitted_env_num"] += omitted
+                intentions.append(
+                    {
+                        "source": source_name,
+                        "sheet_name": sheet_name,
+                        "row": row_idx + 1,
+                        "item_id": record["item_id"],
+                        "env_frame": env_idx + 1,
+                        "env_name": env_name,
+                        "test_intention": test_intention,
+                        "omitted": omitted,
+                    }
+                )
+        items.append(record)
+
+    return items, intentions
+
+
+def parse_chapter(file: str, config_md: dict) -> tuple:
+    """
+    Markdown ファイルを読み込み、分析用の平坦な表に変換します（ワーカープロセスで実行する）
+    エラーの診断情報はプロセス間で受け渡せるよう、例外ではなく戻り値で返す
+
+    Returns:
+        items:          ITEM_COLUMNS の辞書のリスト
+        intentions:     INTENTION_COLUMNS の辞書のリスト
+        warnings:       警告の診断情報のリスト
+        error:          エラーの診断情報（エラーがない場合は None）
+    """
+    try:
+        df, sheet_name, product_categorie, _, test_env_frame, warning = convert_md_to_df(
+            file, config_md
+        )
+    except ConversionError as e:
+        if e.diagnostic is None:
+            raise
+        return [], [], [], e.diagnostic
+    items, intentions = flatten_spec(
+        df,
+        get_source_name(file),
+        sheet_name,
+        product_categorie,
+        test_env_frame,
+        config_md,
+    )
+    return items, intentions, list(warning), None
+
+
+def _parse_chapter(args):
+    return parse_chapter(*args)
+
+
+def write_table(records: list, columns: list, output_fn: str, fmt: str) -> None:
+    """
+    レコードを指定した形式で保存します（レコードがない場合も列だけのファイルを作る）
+    """
+    names = [name for name, _ in columns]
+    if fmt == EXPORT_PARQUET:
+        schema = pyarrow.schema(
+            [(name, getattr(pyarrow, dtype)()) for name, dtype in columns]
+        )
+        table = pyarrow.Table.from_pydict(
+            {name: [record[name] for record in records] for name in names},
+            schema=schema,
+        )
+        pyarrow.parquet.write_table(table, output_fn)
+    elif fmt == EXPORT_CSV:
+        with open(output_fn, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=names)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(output_fn, "w", encoding="utf-8", newline="\n") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def export_specs(
+    files: list, output_dir: str, config: dict, fmt: str = None, workers: int = 1
+) -> tuple[list, Diagnostics]:
+    """
+    Markdown ファイルのテスト項目表を、分析用の平坦なファイル（items, test_intentions）に書き出します
+    全ファイルを1つの表にまとめ、source 列で章を区別する
+
+    Args:
+        files:          Markdown ファイルのパス
+        output_dir:     保存先フォルダ
+        config:         設定
+        fmt:            出力形式（parquet / csv / jsonl、省略時は pyarrow があれば parquet、なければ csv）
+        workers:        Markdown を並列に読み込むワーカープロセス数（1 は並列化しない）
+
+    Returns:
+        output_fns:     保存したファイルのパス（items, test_intentions の順）
+        warnings:       Markdownの記述に関する警告（Diagnostics）
+    """
+    fmt = fmt or get_default_format()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(
+            f"出力形式 {fmt} は使用できません（{' / '.join(EXPORT_FORMATS)} のいずれかを指定してください）"
+        )
+    if fmt == EXPORT_PARQUET and pyarrow is None:
+        raise ExportError(
+            "parquet 形式で出力するには pyarrow をインストールしてください（csv / jsonl は不要）"
+        )
+
+    tasks = [(file, config["md"]) for file in files]
+    if workers <= 1 or len(tasks) <= 1:
+        results = [parse_chapter(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(
+                executor.map(
+                    _parse_chapter, tasks, chunksize=max(1, len(tasks) // (workers * 4))
+                )
+            )
+
+    items = []
+    intentions = []
+    warnings = Diagnostics()
+    for file_items, file_intentions, file_warnings, error in results:
+        if error is not None:
+            raise ERROR_TYPES.get(error.code, ConversionError)(diagnostic=error)
+        items += file_items
+        intentions += file_intentions
+        warnings.extend(file_warnings)
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_fns = []
+    for name, records, columns in [
+        (ITEMS_TABLE_NAME, items, ITEM_COLUMNS),
+        (INTENTIONS_TABLE_NAME, intentions, INTENTION_COLUMNS),
+    ]:
+        output_fn = os.path.join(output_dir, name + "." + fmt)
+        write_table(records, columns, output_fn, fmt)
+        output_fns.append(output_fn)
+
+    return output_fns, warnings
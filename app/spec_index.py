@@ -0,0 +1,273 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import os
+import glob
+import hashlib
+import sqlite3
+from fragment_cache import find_included_files
+from markdown_operator import convert_md_to_df
+from spec_export import flatten_spec, KIND_ITEM
+from warningMsgProvider import ConversionError
+
+# 索引の形式のバージョン（テーブルの構成を変更した場合は更新し、索引を作り直す）
+INDEX_VERSION = "1"
+
+# 全文検索の対象の列（この順で索引に格納する）
+SEARCH_FIELDS = ["path", "environment", "precondition", "steps", "expected", "notes"]
+
+# テスト項目の列（検索結果として返す）
+ITEM_FIELDS = ["file", "line", "sheet_name", "item_id", "number"] + SEARCH_FIELDS
+
+# trigram トークナイザーで検索できる最短の語の文字数（これより短い語は LIKE で探す）
+TRIGRAM_MIN_LEN = 3
+
+# テスト観点のパスの区切り
+PATH_SEPARATOR = " / "
+
+
+class SpecIndexError(Exception):
+    """索引を作成・検索できない（SQLite が FTS5 / trigram に対応していない、索引が壊れている）"""
+
+
+def find_markdown_files(paths: list) -> list:
+    """
+    索引の対象の Markdown ファイルのパスを返します（フォルダを指定した場合はフォルダ内の *.md）
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.md")))
+        else:
+            files.append(path)
+    return [os.path.normpath(f).replace("\\", "/") for f in files]
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    索引のデータベースを開きます（ない場合は作成し、形式のバージョンが異なる場合は作り直す）
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != INDEX_VERSION:
+            conn.execute("DROP TABLE IF EXISTS files")
+            conn.execute("DROP TABLE IF EXISTS items")
+            conn.execute(
+                "CREATE TABLE files (file TEXT PRIMARY KEY, sha256 TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE items USING fts5("
+                + ", ".join(
+                    [f"{name} UNINDEXED" for name in ITEM_FIELDS if name not in SEARCH_FIELDS]
+                    + SEARCH_FIELDS
+                )
+                + ", tokenize = 'trigram')"
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                (INDEX_VERSION,),
+            )
+            conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.close()
+        raise SpecIndexError(
+            f"索引を作成できません（SQLite {sqlite3.sqlite_version} が FTS5 の trigram トークナイザーに対応していない可能性があります）: {e}"
+        )
+    except sqlite3.DatabaseError as e:
+        conn.close()
+        raise SpecIndexError(f"索引を開けません: {e}")
+    return conn
+
+
+def get_file_hash(data: bytes, included: dict = None) -> str:
+    """
+    章の内容のハッシュを返します（取り込むファイルがある場合は、その内容のハッシュも含める）
+    """
+    digest = hashlib.sha256(data)
+    for path, sha256 in sorted((included or {}).items()):
+        digest.update(("\0" + path + "\0" + sha256).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def parse_items(file: str, data: bytes, config_md: dict) -> list:
+    """
+    Markdown を既存の文法で読み込み、テスト項目ごとの索引のレコード（ITEM_FIELDS の順のタプル）を返します
+    """
+    line_numbers = []
+    df, sheet_name, product_categorie, _, test_env_frame, _ = convert_md_to_df(
+        data,
+        config_md,
+        name=file,
+        line_numbers=line_numbers,
+        include_dir=os.path.dirname(file),
+    )
+    items, _ = flatten_spec(
+        df, file, sheet_name, product_categorie, test_env_frame, config_md
+    )
+    lv = ["lv1", "lv2", "lv3", "lv4", "lv5", "lv6"]
+    records = []
+    for item in items:
+        if item["kind"] != KIND_ITEM:
+            continue
+        item = dict(item)
+        item["file"] = file
+        item["line"] = line_numbers[item["row"] - 1]
+        item["path"] = PATH_SEPARATOR.join(item[k] for k in lv if item[k])
+        records.append(tuple(item[name] for name in ITEM_FIELDS))
+    return records
+
+
+def update_index(db_path: str, paths: list, config: dict) -> dict:
+    """
+    Markdown ファイルの索引を更新します
+    内容のハッシュが前回と同じファイルは読み込まず、変更・追加されたファイルのみ索引を作り直す
+    （取り込むファイルの内容が変更された章も作り直す）
+    指定したファイルに含まれないファイル（削除・名前の変更）の索引は削除する
+
+    Args:
+        db_path:    索引のデータベースのパス
+        paths:      Markdown ファイル、またはフォルダのパス
+        config:     設定
+
+    Returns:
+        stats:      {"files", "updated", "unchanged", "removed", "items", "errors": {パス: エラーメッセージ}}
+    """
+    files = find_markdown_files(paths)
+    stats = {
+        "files": len(files),
+        "updated": 0,
+        "unchanged": 0,
+        "removed": 0,
+        "items": 0,
+        "errors": {},
+    }
+    conn = connect(db_path)
+    try:
+        indexed = dict(conn.execute("SELECT file, sha256 FROM files"))
+        for file in files:
+            try:
+                with open(file, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                stats["errors"][file] = f"{type(e).__name__}: {e}"
+                continue
+            included = find_included_files(
+                file, config["md"].get("mark_for_include", ""), data
+            )
+            sha256 = get_file_hash(data, included)
+            if indexed.get(file) == sha256:
+                stats["unchanged"] += 1
+                continue
+
+            try:
+                records = parse_items(file, data, config["md"])
+            except ConversionError as e:
+                # 読み込めないファイルは索引から除き、次回も読み込み直す
+                stats["errors"][file] = str(e)
+                records = None
+            with conn:
+                conn.execute("DELETE FROM items WHERE file = ?", (file,))
+                conn.execute("DELETE FROM files WHERE file = ?", (file,))
+                if records is not None:
+                    conn.executemany(
+                        f"INSERT INTO items ({', '.join(ITEM_FIELDS)}) VALUES ({', '.join('?' * len(ITEM_FIELDS))})",
+                        records,
+                    )
+                    conn.execute(
+                        "INSERT INTO files (file, sha256) VALUES (?, ?)", (file, sha256)
+                    )
+                    stats["updated"] += 1
+
+        removed = set(indexed) - set(files)
+        with conn:
+            for file in removed:
+                conn.execute("DELETE FROM items WHERE file = ?", (file,))
+                conn.execute("DELETE FROM files WHERE file = ?", (file,))
+        stats["removed"] = len(removed)
+        stats["items"] = conn.execute("SELECT count(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
+    return stats
+
+
+def build_query(terms: list, field: str = None) -> tuple[str, list]:
+    """
+    検索語（すべてを含む項目を探す）から、SQL の条件式とパラメーターを返します
+    3 文字以上の語は全文検索の索引（MATCH）、それより短い語は LIKE で探す
+
+    Args:
+        terms:  検索語のリスト
+        field:  検索する列（SEARCH_FIELDS のいずれか、省略時はすべての列）
+    """
+    fields = [field] if field else SEARCH_FIELDS
+    match_terms = []
+    conditions = []
+    params = []
+    for term in terms:
+        if len(term) >= TRIGRAM_MIN_LEN:
+            match_terms.append('"' + term.replace('"', '""') + '"')
+        else:
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(
+                "(" + " OR ".join(f"{name} LIKE ? ESCAPE '\\'" for name in fields) + ")"
+            )
+            params += ["%" + escaped + "%"] * len(fields)
+    if match_terms:
+        match = " AND ".join(match_terms)
+        if field:
+            match = f"{{{field}}} : ({match})"
+        conditions.insert(0, "items MATCH ?")
+        params.insert(0, match)
+    return " AND ".join(conditions) or "1", params
+
+
+def search(db_path: str, query: str, field: str = None, limit: int = 20) -> list:
+    """
+    索引からテスト項目を検索します（ファイル、行番号の順）
+
+    Args:
+        db_path:    索引のデータベースのパス
+        query:      検索語（空白区切りで複数指定した場合はすべてを含む項目）
+        field:      検索する列（SEARCH_FIELDS のいずれか、省略時はすべての列）
+        limit:      返す項目数の上限（0 以下は無制限）
+
+    Returns:
+        hits:       ITEM_FIELDS をキーとする辞書のリスト（"matched": 検索語を含む列のリスト を付与する）
+    """
+    if field and field not in SEARCH_FIELDS:
+        raise SpecIndexError(
+            f"検索する列 {field} は指定できません（{' / '.join(SEARCH_FIELDS)} のいずれかを指定してください）"
+        )
+    if not os.path.isfile(db_path):
+        raise SpecIndexError(f"索引 {db_path} がありません（--index で作成してください）")
+
+    terms = query.split()
+    where, params = build_query(terms, field)
+    sql = f"SELECT {', '.join(ITEM_FIELDS)} FROM items WHERE {where} ORDER BY file, line"
+    if limit > 0:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        raise SpecIndexError(f"検索できません: {e}")
+    finally:
+        conn.close()
+
+    hits = []
+    lowered = [term.lower() for term in terms]
+    for row in rows:
+        hit = dict(zip(ITEM_FIELDS, row))
+        hit["matched"] = [
+            name
+            for name in ([field] if field else SEARCH_FIELDS)
+            if any(term in hit[name].lower() for term in lowered)
+        ]
+        hits.append(hit)
+    return hits
@@ -0,0 +1,668 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import shutil
+from collections import deque
+import pandas as pd
+from openpyxl.styles import PatternFill
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from markdown_operator import convert_md_to_df, generate_item_ids, generate_similarity_keys
+from excel_operator import (
+    write_test_specification,
+    get_table_start_row,
+    get_sheet_layout,
+    iter_row_style_keys,
+    create_row_styler,
+    col_num_to_excel_col_name,
+)
+from template_cache import TRAILING_SHEET_NUM
+from warningMsgProvider import ExOpStatus, ConversionError, Diagnostics
+
+# 項目ごとの更新結果
+UPDATE_INSERTED = "inserted"
+UPDATE_DELETED = "deleted"
+UPDATE_MODIFIED = "modified"
+UPDATE_UNCHANGED = "unchanged"
+
+# ヘッダー行を探索する範囲（概要欄の行数の上限）
+HEADER_SEARCH_ROWS = 500
+
+# Excel の最終行
+MAX_ROW = 1048576
+
+
+class SheetLayoutError(ConversionError):
+    """実施済みのシートからテスト項目表を読み取れない"""
+
+
+def read_executed_sheet(ws, config: dict) -> dict:
+    """
+    実施済みのテスト項目シートから、テスト項目表の行の並びと、テスト項目ごとの仕様と実施結果を読み込みます
+
+    Returns:
+        sheet:  {
+                    "header_row":   テスト項目表の見出し行の行番号
+                    "env_names":    テスト環境枠の名称のリスト
+                    "rows":         テスト項目表の行ごとの (行番号, 種類（mark）, 内容)
+                                    内容はテスト観点行は観点の名称（環境列）、テスト項目行は ID
+                    "items":        ID -> {
+                                        "row":      行番号
+                                        "path":     テスト観点のパスのハッシュ（ID の前半）
+                                        "spec":     (環境, 準備, 備考)
+                                        "keys":     (手順のハッシュ, 確認のハッシュ)（generate_similarity_keys()）
+                                        "results":  テスト環境枠の名称 -> [(値, 表示形式), ..]（実施判定を除く実施結果エリア）
+                                        "has_result": 実施結果が1つでも入力されているかどうか
+                                    }
+                                    ※ 辞書の順序はシート上の並び順
+                }
+    """
+    col_name = config["excel"]["col_name"]
+    res_area = config["excel"]["col_name_res_area"]
+    lv_headers = [col_name[k] for k in col_name if k.startswith("lv")]
+    spec_headers = [v for k, v in col_name.items() if k != "mark"]
+
+    # ヘッダー行の探索
+    header_row = -1
+    header = []
+    for r_idx, row in enumerate(
+        ws.iter_rows(min_row=1, max_row=HEADER_SEARCH_ROWS, values_only=True)
+    ):
+        values = ["" if v is None else str(v) for v in row]
+        if values[: len(spec_headers)] == spec_headers:
+            header_row = r_idx + 1
+            header = values
+            break
+    if header_row < 0:
+        raise SheetLayoutError(ws.title + " シートにテスト項目表の見出し行がありません")
+
+    def col_of(name):
+        return header.index(name)
+
+    lv_cols = [col_of(v) for v in lv_headers]
+    c_number = col_of(col_name["number"])
+    c_environment = col_of(col_name["environment"])
+    c_precondition = col_of(col_name["precondition"])
+    c_steps = col_of(col_name["steps"])
+    c_expected = col_of(col_name["expected"])
+    c_notes = col_of(col_name["notes"])
+    item_id_header = config["excel"]["item_id"]["header"]
+    c_item_id = col_of(item_id_header) if item_id_header in header else -1
+
+    # テスト環境枠（実施判定の列ごとに、1つ上の行に名称がある）
+    env_row = next(
+        ws.iter_rows(min_row=header_row - 1, max_row=header_row - 1, values_only=True)
+    )
+    intention_header = res_area["test_intention"]
+    env_blocks = []
+    for c_idx, v in enumerate(header):
+        if v == intention_header:
+            name = env_row[c_idx] if c_idx < len(env_row) else None
+            env_blocks.append(("" if name is None else str(name), c_idx))
+
+    def text(row, c_idx):
+        v = row[c_idx].value if c_idx < len(row) else None
+        return "" if v is None else str(v)
+
+    rows = []
+    for r_idx, row in enumerate(ws.iter_rows(min_row=header_row + 1)):
+        if text(row, c_number):
+            mark = "number"
+        else:
+            mark = ""
+            for lv_idx, c_idx in enumerate(lv_cols):
+                if text(row, c_idx):
+                    mark = "lv" + str(lv_idx + 1)
+                    break
+            if not mark:
+                continue
+
+        results = {}
+        has_result = False
+        for name, start in env_blocks:
+            values = []
+            # 実施判定（先頭列）は Markdown の記述から決まるため引き継がない
+            for offset in range(1, len(res_area)):
+                cell = row[start + offset] if start + offset < len(row) else None
+                value = None if cell is None else cell.value
+                number_format = "General" if cell is None else cell.number_format
+                values.append((value, number_format))
+                has_result = has_result or value not in (None, "")
+            results[name] = values
+
+        rows.append(
+            {
+                "row": header_row + 1 + r_idx,
+                "mark": mark,
+                "environment": text(row, c_environment),
+                "steps": text(row, c_steps),
+                "expected": text(row, c_expected),
+                "spec": (
+                    text(row, c_environment),
+                    text(row, c_precondition),
+                    text(row, c_notes),
+                ),
+                "results": results,
+                "has_result": has_result,
+                "item_id": text(row, c_item_id) if c_item_id >= 0 else "",
+            }
+        )
+
+    # ID 列がない（ID の導入前に生成した）シートは、内容から ID を再計算する
+    if c_item_id < 0:
+        item_ids = generate_item_ids(
+            [(r["mark"], r["environment"], r["steps"], r["expected"]) for r in rows],
+            config["md"],
+        )
+        for r, item_id in zip(rows, item_ids):
+            r["item_id"] = item_id
+
+    items = {}
+    for r in rows:
+        if r["mark"] == "number" and r["item_id"]:
+            items[r["item_id"]] = {
+                "row": r["row"],
+                "path": r["item_id"].split("-")[0],
+                "spec": r["spec"],
+                "keys": generate_similarity_keys(r["steps"], r["expected"]),
+                "results": r["results"],
+                "has_result": r["has_result"],
+            }
+    return {
+        "header_row": header_row,
+        "env_names": [name for name, _ in env_blocks],
+        "rows": [
+            (r["row"], r["mark"], r["item_id"] if r["mark"] == "number" else r["environment"])
+            for r in rows
+        ],
+        "items": items,
+    }
+
+
+def match_items(df: pd.DataFrame, old_items: dict, config: dict) -> tuple[list, dict]:
+    """
+    新しい仕様の項目と、実施済みシートの項目を対応付けます
+
+    1. ID が一致する項目は同じ項目とする（環境・準備・備考が異なる場合は変更とする）
+    2. ID が一致しない項目は、同じテスト観点内で対応の取れていない項目のうち、手順または確認が一致する
+       項目（手順の一致を優先し、同じ場合はシート上の並び順）と対応付け、変更とする
+    3. 上記で対応の取れない新しい項目は追加、実施済みシートの項目は削除とする
+       （手順と確認の両方を変更した項目は、削除と追加として扱う）
+
+    Returns:
+        matches:    行ごとの (更新結果, 対応する実施済みシートの項目の ID)  ※ テスト観点行は (None, None)
+        report:     更新結果ごとの項目の ID のリスト
+    """
+    item_id_col = config["md"]["item_id"]["col_name"]
+    report = {
+        UPDATE_INSERTED: [],
+        UPDATE_DELETED: [],
+        UPDATE_MODIFIED: [],
+        UPDATE_UNCHANGED: [],
+    }
+    matches = [(None, None)] * len(df)
+    unmatched_rows = []
+    used = set()
+
+    for row_idx, (mark, item_id, environment, precondition, notes) in enumerate(
+        zip(
+            df["mark"],
+            df[item_id_col],
+            df["environment"],
+            df["precondition"],
+            df["notes"],
+        )
+    ):
+        if mark != "number":
+            continue
+        if item_id in old_items:
+            used.add(item_id)
+            if old_items[item_id]["spec"] == (environment, precondition, notes):
+                matches[row_idx] = (UPDATE_UNCHANGED, item_id)
+            else:
+                matches[row_idx] = (UPDATE_MODIFIED, item_id)
+        else:
+            unmatched_rows.append(row_idx)
+
+    # (テスト観点, 手順 / 確認, ハッシュ) ごとの、対応の取れていない実施済みの項目（シート上の並び順）
+    leftovers = {}
+    for old_id, item in old_items.items():
+        if old_id not in used:
+            for field, key in zip(("steps", "expected"), item["keys"]):
+                leftovers.setdefault((item["path"], field, key), deque()).append(old_id)
+
+    def pop_leftover(leftover_key):
+        candidates = leftovers.get(leftover_key)
+        while candidates:
+            old_id = candidates.popleft()
+            if old_id not in used:
+                return old_id
+        return None
+
+    for row_idx in unmatched_rows:
+        path = df[item_id_col].iat[row_idx].split("-")[0]
+        steps_key, expected_key = generate_similarity_keys(
+            df["steps"].iat[row_idx], df["expected"].iat[row_idx]
+        )
+        old_id = pop_leftover((path, "steps", steps_key)) or pop_leftover(
+            (path, "expected", expected_key)
+        )
+        if old_id:
+            used.add(old_id)
+            matches[row_idx] = (UPDATE_MODIFIED, old_id)
+        else:
+            matches[row_idx] = (UPDATE_INSERTED, None)
+
+    for status, old_id in matches:
+        if status == UPDATE_INSERTED:
+            report[status].append("")
+        elif status:
+            report[status].append(old_id)
+    report[UPDATE_DELETED] = [old_id for old_id in old_items if old_id not in used]
+
+    return matches, report
+
+
+def plan_rows(df: pd.DataFrame, sheet: dict, matches: list) -> list:
+    """
+    新しい仕様の行ごとに、そのまま使う実施済みシートの行の行番号を求めます（新しく書き込む行は None）
+    テスト項目行は match_items() で対応の取れた項目の行、
+    テスト観点行は種類と名称が同じ行をシート上の並び順に対応付ける
+    """
+    lv_rows = {}
+    for row, mark, key in sheet["rows"]:
+        if mark != "number":
+            lv_rows.setdefault((mark, key), deque()).append(row)
+
+    sources = []
+    for mark, environment, (_, old_id) in zip(df["mark"], df["environment"], matches):
+        if mark == "number":
+            sources.append(sheet["items"][old_id]["row"] if old_id else None)
+        else:
+            candidates = lv_rows.get((mark, environment))
+            sources.append(candidates.popleft() if candidates else None)
+    return sources
+
+
+def relocate_rows(ws, move_row) -> None:
+    """
+    シートの行を、まとめて移動・削除します
+    セル（値、スタイル、コメント、ハイパーリンク）と行の高さはそのまま移し、結合セル・入力規則・条件付き書式・
+    オートフィルターの範囲は、範囲の先頭行と末尾行の移動先に合わせる
+    （openpyxl の insert_rows / delete_rows は1回ごとに以降の全行を移動させ、範囲も調整しないため使わない）
+
+    Args:
+        ws:         シート
+        move_row:   行番号 -> 移動先の行番号（削除する行は None）
+    """
+    cells = {}
+    for (row, col), cell in ws._cells.items():
+        new_row = move_row(row)
+        if new_row is None:
+            continue
+        cell.row = new_row
+        hyperlink = getattr(cell, "_hyperlink", None)
+        if hyperlink is not None:
+            hyperlink.ref = cell.coordinate
+        cells[(new_row, col)] = cell
+    ws._cells = cells
+
+    dimensions = [(move_row(row), dim) for row, dim in ws.row_dimensions.items()]
+    ws.row_dimensions.clear()
+    for new_row, dim in dimensions:
+        if new_row is not None:
+            dim.index = new_row
+            ws.row_dimensions[new_row] = dim
+
+    def move_range(coord):
+        cr = CellRange(coord)
+        min_row, max_row = cr.min_row, cr.max_row
+        # 範囲の端の行が削除された場合は、範囲内で残る行まで狭める
+        while min_row <= max_row and move_row(min_row) is None:
+            min_row += 1
+        while max_row >= min_row and move_row(max_row) is None:
+            max_row -= 1
+        if min_row > max_row:
+            return None
+        rows = sorted([move_row(min_row), move_row(max_row)])
+        cr.min_row, cr.max_row = rows[0], min(rows[1], MAX_ROW)
+        return cr.coord
+
+    def move_ranges(sqref):
+        coords = [move_range(coord) for coord in str(sqref).split()]
+        return " ".join(coord for coord in coords if coord)
+
+    merged = [move_range(cr.coord) for cr in ws.merged_cells.ranges]
+    ws.merged_cells = MultiCellRange(
+        [MergedCellRange(ws, coord) for coord in merged if coord]
+    )
+
+    validations = []
+    for dv in ws.data_validations.dataValidation:
+        sqref = move_ranges(dv.sqref)
+        if sqref:
+            dv.sqref = MultiCellRange(sqref)
+            validations.append(dv)
+    ws.data_validations.dataValidation = validations
+
+    formatting = ConditionalFormattingList()
+    for cf in ws.conditional_formatting:
+        sqref = move_ranges(cf.sqref)
+        if sqref:
+            for rule in cf.rules:
+                formatting.add(sqref, rule)
+    ws.conditional_formatting = formatting
+
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = move_range(ws.auto_filter.ref)
+
+
+def patch_sheet(
+    ws,
+    df: pd.DataFrame,
+    sheet: dict,
+    matches: list,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+) -> None:
+    """
+    実施済みのテスト項目シートのうち、追加・削除・変更のあった行のみを書き換えます
+
+    - 変更のない項目の行、テスト観点行は、セルの内容・書式（テスト実施者が設定した塗りつぶし、コメントなど）を残して
+      新しい位置に移動する（番号のみ振り直す）
+    - 削除された項目の行は削除する
+    - 追加された項目の行は、新しく生成したシートと同じ内容・スタイルで書き込む
+    - 変更された項目の行は、仕様の列を書き換えて実施結果エリアを消去し、再実施が必要な行として塗りつぶす
+    """
+    test_env_frame_num = len(test_env_frame)
+    layout = get_sheet_layout(config_excel, test_env_frame_num)
+    total_col_count = layout["total_col_count"]
+    lv_col_num = len(config_excel["index"])
+    res_keys = list(config_excel["col_name_res_area"])
+    id_col = total_col_count + 1
+
+    # 列ごとのデータフレームの列名（テスト観点列、出力する列、実施結果エリア）
+    spec_cols = [k for k in config_excel["col_name"] if config_excel["index"].get(k)]
+    spec_cols += [k for k in config_excel["col_name"] if config_excel["output"].get(k)]
+    res_cols = [
+        k + "_" + str(env_idx + 1)
+        for env_idx in range(test_env_frame_num)
+        for k in res_keys
+    ]
+    number_cols = spec_cols.index("number") + 1
+
+    sources = plan_rows(df, sheet, matches)
+
+    # 行の移動先
+    old_header_row = sheet["header_row"]
+    old_last_row = sheet["rows"][-1][0] if sheet["rows"] else old_header_row
+    tb_start_row = get_table_start_row(summary, config_excel)
+    last_row = tb_start_row + len(df)
+    row_map = {old_header_row - 1: tb_start_row - 1, old_header_row: tb_start_row}
+    for row_idx, src in enumerate(sources):
+        if src is not None:
+            row_map[src] = tb_start_row + 1 + row_idx
+
+    def move_row(row):
+        if row in row_map:
+            return row_map[row]
+        # 概要欄（テスト項目表の位置が上がった場合、重なる行は削除する）
+        if row < old_header_row - 1:
+            return row if row < tb_start_row - 1 else None
+        # テスト項目表より下の行は、表の行数の増減に合わせて移動する
+        if row > old_last_row:
+            return row + last_row - old_last_row
+        # 削除された行
+        return None
+
+    moved = any(old != new for old, new in row_map.items())
+    if moved or len(row_map) - 2 != len(sheet["rows"]) or last_row != old_last_row:
+        relocate_rows(ws, move_row)
+        ws.freeze_panes = "A" + str(tb_start_row + 1)
+
+    # 概要行
+    for idx, one_line in enumerate(summary):
+        ws["E" + str(idx + 1)].value = one_line
+    for row in range(len(summary) + 1, tb_start_row - 1):
+        if ws["E" + str(row)].value is not None:
+            ws["E" + str(row)].value = None
+
+    # ID 列（ID の導入前に生成したシートには追加する）
+    ws.cell(row=tb_start_row, column=id_col, value=config_excel["item_id"]["header"])
+    ws.column_dimensions[col_num_to_excel_col_name(id_col)].hidden = True
+
+    style_row = create_row_styler(ws, config_excel)
+    highlight = PatternFill(
+        patternType="solid", fgColor=config_excel["update_highlight_color"]
+    )
+    old_row_keys = {
+        row: row_key
+        for (row, _, _), (row_key, _) in zip(
+            sheet["rows"],
+            iter_row_style_keys([mark for _, mark, _ in sheet["rows"]], config_excel, layout),
+        )
+    }
+
+    def write_cells(row, values, start_col=1):
+        for col_idx, value in enumerate(values):
+            if value == "" or pd.isna(value):
+                value = None
+            cell = ws.cell(row=row, column=start_col + col_idx)
+            if cell.value != value:
+                cell.value = value
+
+    records = df[spec_cols + res_cols + [config_excel["item_id"]["col_name"]]].itertuples(
+        index=False, name=None
+    )
+    for row_idx, (record, src, (status, _), (row_key, style_keys)) in enumerate(
+        zip(
+            records,
+            sources,
+            matches,
+            iter_row_style_keys(df["mark"].tolist(), config_excel, layout),
+        )
+    ):
+        row = tb_start_row + 1 + row_idx
+        spec_values = record[: len(spec_cols)]
+        res_values = record[len(spec_cols) : len(spec_cols) + len(res_cols)]
+        item_id = record[-1]
+
+        # 追加された行
+        if src is None:
+            write_cells(row, spec_values + res_values + (item_id,))
+            style_row(row, row_key, style_keys)
+            continue
+
+        # 変更された項目（実施結果エリアは消去する）
+        if status == UPDATE_MODIFIED:
+            write_cells(row, spec_values)
+            for offset in range(len(res_cols)):
+                if offset % len(res_keys):
+                    write_cells(row, [None], len(spec_cols) + 1 + offset)
+            for col_idx in range(lv_col_num, total_col_count):
+                ws.cell(row=row, column=col_idx + 1).fill = highlight
+        # 変更のない行（テスト観点と番号のみ書き換える）
+        else:
+            write_cells(row, spec_values[:number_cols])
+
+        # 実施判定は Markdown の記述（備考のチェックボックス）から決まるため、常に書き換える
+        if status:
+            for offset in range(0, len(res_cols), len(res_keys)):
+                write_cells(row, [res_values[offset]], len(spec_cols) + 1 + offset)
+            write_cells(row, [item_id], id_col)
+
+        # 前後の行の増減でテスト観点の着色や末尾行の罫線が変わった場合は、テスト観点列と罫線のみ設定し直す
+        if old_row_keys.get(src) != row_key:
+            style_row(row, row_key, style_keys, cols=range(lv_col_num))
+            style_row(
+                row,
+                row_key,
+                style_keys,
+                cols=range(lv_col_num, total_col_count),
+                border_only=True,
+            )
+
+
+def rewrite_sheet(
+    writer: pd.ExcelWriter,
+    df: pd.DataFrame,
+    sheet_name: str,
+    sheet: dict,
+    matches: list,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+) -> None:
+    """
+    テスト環境枠が変わったシートを新しい仕様で書き直し、変更のない項目の実施結果をテスト環境枠の名称ごとに書き戻します
+    （列の並びが変わるため、行単位では書き換えない）
+    """
+    res_keys = list(config_excel["col_name_res_area"])
+    wb = writer.book
+    sheet_idx = wb.sheetnames.index(sheet_name)
+    wb.remove(wb[sheet_name])
+
+    carried_formats = []
+    for env_idx, env_name in enumerate(test_env_frame):
+        for row_idx, (status, old_id) in enumerate(matches):
+            if status != UPDATE_UNCHANGED:
+                continue
+            values = sheet["items"][old_id]["results"].get(env_name)
+            if values is None:
+                continue
+            for offset, (value, number_format) in enumerate(values):
+                if value is None:
+                    continue
+                col = res_keys[offset + 1] + "_" + str(env_idx + 1)
+                df.at[row_idx, col] = value
+                if number_format != "General":
+                    carried_formats.append((row_idx, env_idx, offset + 1, number_format))
+
+    write_test_specification(
+        df, sheet_name, summary, test_env_frame, writer, config_excel, merge_cells=False
+    )
+    ws = wb[sheet_name]
+    wb.move_sheet(ws, offset=sheet_idx - wb.sheetnames.index(sheet_name))
+
+    # 日付などの表示形式を元に戻す
+    tb_start_row = get_table_start_row(summary, config_excel)
+    for row_idx, env_idx, offset, number_format in carried_formats:
+        col = len(config_excel["col_name"]) + len(res_keys) * env_idx + offset
+        ws.cell(row=tb_start_row + 1 + row_idx, column=col).number_format = number_format
+
+    # 変更された項目は再実施が必要な行として塗りつぶす
+    highlight = PatternFill(
+        patternType="solid", fgColor=config_excel["update_highlight_color"]
+    )
+    total_col_count = get_sheet_layout(config_excel, len(test_env_frame))["total_col_count"]
+    for row_idx, (status, _) in enumerate(matches):
+        if status == UPDATE_MODIFIED:
+            for col_idx in range(len(config_excel["index"]), total_col_count):
+                ws.cell(row=tb_start_row + 1 + row_idx, column=col_idx + 1).fill = highlight
+
+
+def update_workbook(
+    md_files: list, workbook_path: str, config: dict, output_fn: str = None
+) -> list[dict]:
+    """
+    実施済みの Excel テスト項目書を、Markdown の最新の仕様で更新します
+    シートは追加・削除・変更のあった行のみ書き換え（patch_sheet()）、変更のない項目の実施結果エリアの入力内容や、
+    テスト実施者が設定した書式・コメント・入力規則はそのまま残ります
+    変更された項目は実施結果エリアを消去し、再実施が必要な行として塗りつぶします
+
+    Args:
+        md_files:       Markdown ファイルのパス（ファイル名と同名のシートを更新する）
+        workbook_path:  実施済みの Excel ファイル
+        config:         設定
+        output_fn:      保存先のファイル（省略時は workbook_path を上書きする）
+
+    Returns:
+        reports:        シートごとの更新結果
+                        (sheet_name, inserted, deleted, modified, unchanged, lost_results, cleared_results)
+                        lost_results は実施結果が入力されていたが削除された項目の ID
+                        cleared_results は実施結果が入力されていたが、変更されたため消去した項目の ID
+
+    Raises:
+        SheetLayoutError, OutputFileError, および Markdown の読み込みに関する ConversionError
+    """
+    config_excel = config["excel"]
+
+    if not output_fn:
+        output_fn = workbook_path
+    diagnostics = Diagnostics(output_fn)
+    try:
+        if output_fn != workbook_path:
+            shutil.copy2(workbook_path, output_fn)
+        writer = pd.ExcelWriter(
+            output_fn,
+            mode="a",
+            engine="openpyxl",
+            if_sheet_exists="overlay",
+            engine_kwargs={"keep_vba": True},
+        )
+    except PermissionError:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_1.value)
+    wb = writer.book
+
+    reports = []
+    for md_file in md_files:
+        df, sheet_name, _, summary, test_env_frame, _ = convert_md_to_df(
+            md_file, config_md=config["md"]
+        )
+
+        if sheet_name not in wb.sheetnames:
+            matches, report = match_items(df, {}, config)
+            write_test_specification(
+                df,
+                sheet_name,
+                summary,
+                test_env_frame,
+                writer,
+                config_excel,
+                merge_cells=False,
+            )
+            wb.move_sheet(wb[sheet_name], offset=-TRAILING_SHEET_NUM)
+            old_items = {}
+        else:
+            sheet = read_executed_sheet(wb[sheet_name], config)
+            old_items = sheet["items"]
+            matches, report = match_items(df, old_items, config)
+            if sheet["env_names"] == list(test_env_frame):
+                patch_sheet(
+                    wb[sheet_name], df, sheet, matches, summary, test_env_frame, config_excel
+                )
+            else:
+                rewrite_sheet(
+                    writer, df, sheet_name, sheet, matches, summary, test_env_frame, config_excel
+                )
+
+        reports.append(
+            {
+                "sheet_name": sheet_name,
+                UPDATE_INSERTED: len(report[UPDATE_INSERTED]),
+                UPDATE_DELETED: len(report[UPDATE_DELETED]),
+                UPDATE_MODIFIED: len(report[UPDATE_MODIFIED]),
+                UPDATE_UNCHANGED: len(report[UPDATE_UNCHANGED]),
+                "lost_results": [
+                    old_id
+                    for old_id in report[UPDATE_DELETED]
+                    if old_items[old_id]["has_result"]
+                ],
+                "cleared_results": [
+                    old_id
+                    for old_id in report[UPDATE_MODIFIED]
+                    if old_items[old_id]["has_result"]
+                ],
+            }
+        )
+
+    try:
+        writer.close()
+    except PermissionError:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_1.value)
+    return reports
@@ -0,0 +1,123 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import hashlib
+import tempfile
+import openpyxl
+
+# コンパイル済みテンプレートの形式のバージョン（コンパイル処理を変更した場合は更新し、古いキャッシュを使わないようにする）
+COMPILED_TEMPLATE_VERSION = "1"
+
+# 表紙シートの名前（製品カテゴリごとのシートは `表紙_<製品カテゴリ>`、該当がない場合は `表紙_共通` を使う）
+SUMMARY_SHEET_TITLE = "表紙"
+COMMON_SUMMARY_SHEET_TITLE = "表紙_共通"
+
+# テスト項目シートより後ろに配置するテンプレートのシート数（レビュー記録、消化率、マクロ起動）
+TRAILING_SHEET_NUM = 3
+
+# 同じプロセス内で再利用するコンパイル済みテンプレート（キー: キャッシュのキー）
+_compiled_templates = {}
+
+
+def get_default_cache_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), "MdToExcel", "template_cache")
+
+
+def get_cache_key(template: bytes, product_categorie: str) -> str:
+    """
+    テンプレートの内容、製品カテゴリ、コンパイル済みテンプレートの形式から、キャッシュのキーを返します
+    """
+    digest = hashlib.sha256()
+    digest.update(COMPILED_TEMPLATE_VERSION.encode("utf-8") + b"\0")
+    digest.update(hashlib.sha256(template).digest())
+    digest.update(product_categorie.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def compile_template(template: bytes, product_categorie: str) -> bytes:
+    """
+    テンプレートから、製品カテゴリの表紙シートだけを残したテンプレートを生成します
+    表紙シートは `表紙` に改名し、`表紙_共通` を使う場合は A1 に製品カテゴリを書き込む
+    テスト項目シートは、先頭から数えて len(worksheets) - TRAILING_SHEET_NUM の位置に挿入する
+
+    Args:
+        template:           エクセルのテンプレファイルの内容
+        product_categorie:  製品カテゴリー
+
+    Returns:
+        compiled:           コンパイル済みテンプレートの内容
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(template), keep_vba=True)
+
+    summary_sheet_title = COMMON_SUMMARY_SHEET_TITLE
+    specified_summary_sheet_title = SUMMARY_SHEET_TITLE + "_" + product_categorie
+    if specified_summary_sheet_title in wb.sheetnames:
+        summary_sheet_title = specified_summary_sheet_title
+    for ws in wb.worksheets:
+        if ws.title.startswith(SUMMARY_SHEET_TITLE):
+            if ws.title != summary_sheet_title:
+                wb.remove(ws)
+            else:
+                if summary_sheet_title == COMMON_SUMMARY_SHEET_TITLE:
+                    ws.cell(row=1, column=1, value=product_categorie)
+                ws.title = SUMMARY_SHEET_TITLE
+
+    # シートのタブ選択状態を解除して先頭シートを選択
+    for ws in wb.worksheets:
+        ws.sheet_view.tabSelected = False
+    wb.active = wb.worksheets[0]
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def get_compiled_template(
+    input_path, product_categorie: str, cache_dir: str = None
+) -> bytes:
+    """
+    製品カテゴリのコンパイル済みテンプレートを返します
+    テンプレートの内容のハッシュをキーとしてディスクにキャッシュし、テンプレートを更新した場合は作り直す
+    キャッシュフォルダに書き込めない場合は、キャッシュせずにその都度生成する
+
+    Args:
+        input_path:         エクセルのテンプレファイル（パス、または内容の bytes）
+        product_categorie:  製品カテゴリー
+        cache_dir:          キャッシュフォルダ（省略時は get_default_cache_dir()）
+
+    Returns:
+        compiled:           コンパイル済みテンプレートの内容
+    """
+    if isinstance(input_path, bytes):
+        template = input_path
+    else:
+        with open(input_path, "rb") as f:
+            template = f.read()
+
+    key = get_cache_key(template, product_categorie)
+    if key in _compiled_templates:
+        return _compiled_templates[key]
+
+    cache_fn = os.path.join(cache_dir or get_default_cache_dir(), key + ".xlsm")
+    try:
+        with open(cache_fn, "rb") as f:
+            compiled = f.read()
+    except OSError:
+        compiled = compile_template(template, product_categorie)
+        try:
+            os.makedirs(os.path.dirname(cache_fn), exist_ok=True)
+            # 他のプロセスが読み込み中のファイルを壊さないよう、一時ファイルに書き込んでから置き換える
+            fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(cache_fn), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(compiled)
+            os.replace(tmp_fn, cache_fn)
+        except OSError:
+            pass
+
+    _compiled_templates[key] = compiled
+    return compiled
@@ -0,0 +1,53 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import os
+import sys
+
+# app フォルダのモジュールと resources を参照する
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+from converter import load_config  # noqa: E402
+from markdown_operator import convert_md_to_df  # noqa: E402
+from sheet_builder import split_test_items  # noqa: E402
+
+
+def _chapter(lv1_num: int, lv2_num: int, item_num: int) -> str:
+    # `#` の直後に `##` が続く章（テスト環境枠 3 個）
+    lines = ["BIG", "===", "", "```", "環境1", "環境2", "環境3", "```", ""]
+    for lv1 in range(lv1_num):
+        lines.append(f"# 観点 {lv1}")
+        for lv2 in range(lv2_num):
+            lines.append(f"## 観点 {lv1}-{lv2}")
+            for idx in range(item_num):
+                lines += [
+                    "###### ",
+                    "> 手順",
+                    f"1. 操作 {lv1}-{lv2}-{idx}",
+                    "> 確認",
+                    f"- 結果 {idx}",
+                    "> 備考",
+                    "- [ ] ",
+                ]
+    return "\n".join(lines) + "\n"
+
+
+def test_split_does_not_leave_lv1_heading_at_sheet_end():
+    config_md = load_config()["md"]
+    df = convert_md_to_df(io.StringIO(_chapter(6, 2, 10)), config_md, name="big.md")[0]
+
+    # 1つ目の `#` の範囲（23 行）の直後の `##` で分割しようとする行数
+    dfs = split_test_items(df, 24, config_md)
+
+    assert len(dfs) > 1
+    assert sum(len(part) for part in dfs) == len(df)
+    for part in dfs[:-1]:
+        assert part["mark"].iloc[-1] != "lv1"
+    for part in dfs[1:]:
+        assert part["mark"].iloc[0] in ("lv1", "lv2")
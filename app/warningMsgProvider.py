@@ -4,6 +4,8 @@ __author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.
 __version__ = "2.1.0"
 __date__ = "5 June 2024"
 
+import json
+from collections import namedtuple
 from enum import Enum
 
 
@@ -40,194 +42,368 @@ class MdOpStatus(Enum):
     ERROR_CODE_7 = 10107
     ERROR_CODE_8 = 10108
     ERROR_CODE_9 = 10109
+    ERROR_CODE_10 = 10110
+    ERROR_CODE_11 = 10111
 
 
-class WarningMsgProvider:
-    def __init__(self):
-        self.warning_target_fp = ""
-        self.error_target_fp = ""
-
-    def setTargetFP(self, file_path):
-        self.warning_target_fp = file_path
-        self.error_target_fp = file_path
-
-    def buildMsg(self, code, line_num="", arg1="", arg2=""):
-        msg = ""
-
-        if self.warning_target_fp:
-            msg += "\n"
-            msg += "→ " + self.warning_target_fp + " について以下を確認してください"+ "\n"
-            msg += "\n"
-            self.warning_target_fp = ""
-
-        ### MdToExcel.py 関連の警告とエラー
-
-        # MdToExcel.py の警告メッセージは
-        # ユーザーとの対話に使用ものが主であるため
-        # コードの可読性を維持する目的で
-        # 当該モジュールに直接記述する
-        if code == MainAppStatus.WARNING_CODE_1.value:
-            pass # Reserved
-        elif code == MainAppStatus.WARNING_CODE_2.value:
-            pass # Reserved
-        elif code == MainAppStatus.WARNING_CODE_3.value:
-            pass # Reserved
-        elif code == MainAppStatus.ERROR_CODE_1.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "設定ファイル（config.yaml）が見つかりません" + "\n"
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MainAppStatus.ERROR_CODE_2.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "指定できるファイルの拡張子は以下のいずれかのみです" + "\n"
-            msg += "（双方向の変換は同時にできません）" + "\n"
-            msg += "\n"
-            msg += "・Markdown -> Excel 変換：md" + "\n"
-            msg += "・Excel -> Markdown 変換：xlsm" + "\n"
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MainAppStatus.ERROR_CODE_3.value:
-            pass # Reserved
-
-
-        ### excel_operator.py 関連の警告とエラー
-
-        if code == ExOpStatus.WARNING_CODE_1.value:
-            pass # Reserved
-        elif code == ExOpStatus.WARNING_CODE_2.value:
-            pass # Reserved
-        elif code == ExOpStatus.WARNING_CODE_3.value:
-            pass # Reserved
-        elif code == ExOpStatus.ERROR_CODE_1.value:
-            msg += "【 エラー 】" + "\n"
-            msg += self.error_target_fp + " に保存できません" + "\n"
-            msg += "ファイルを開いていませんか？" + "\n"
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == ExOpStatus.ERROR_CODE_2.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "予期しないエラーが発生しました（管理者に報告してください）" + "\n"
-            msg += "\n"
-        elif code == ExOpStatus.ERROR_CODE_3.value:
-            pass # Reserved
-
-
-        ### markdown_operator.py 関連の警告とエラー
-
-        if code == MdOpStatus.WARNING_CODE_1.value:
-            pass # reserved
-        elif code == MdOpStatus.WARNING_CODE_2.value:
-            msg += line_num + "行目: 無効な記述があります" + "\n"
-            msg += "            " + arg1
-        elif code == MdOpStatus.WARNING_CODE_3.value:
-            msg += line_num + "行目: 無効な記述があります" + "\n"
-            msg += "            " + "セル番号 " + arg1 + ": " + arg2
-        elif code == MdOpStatus.WARNING_CODE_4.value:
-            msg += "            " + "セル番号 " + arg1 + ": " + arg2
-        elif code == MdOpStatus.WARNING_CODE_5.value:
-            msg += line_num + "行目: テスト観点のレベル（# の数）が間違っていませんか？" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_1.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "Markdownファイル（.md）が見つかりません" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_2.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "Markdownファイルの名前が不適切です" + "\n"
-            msg += "次の点を確認して修正してください" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += "・ファイル名が 31 文字以内であること" + "\n"
-            msg += "・次の使用できない文字が含まれていないこと" + "\n"
-            msg += (
-                "　コロン(:)、円記号(\)、スラッシュ(/)、疑問符(?)、アスタリスク(*)、左角かっこ([)、右角かっこ(])"
-                + "\n"
-            )
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_3.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト実施環境の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += "・同じ名前のテスト実施環境が存在していませんか？" + "\n"
-            msg += "・記述したエリアが ``` で囲まれていますか？" + "\n"
-            msg += (
-                "・テスト実施環境の名前が # （テスト観点の記号）で始まっていませんか？"
-                + "\n"
-            )
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_4.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト項目の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += "・ヘッダー行（下記）を正しく認識できませんでした" + "\n"
-            msg += "\n"
-            msg += "　1,2,3,4,5,6,番号,環境,準備,手順,確認,備考・・" + "\n"
-            msg += "\n"
-            msg += "処理を中止しました\n" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_5.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト項目の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += (
-                line_num
-                + "行目: テスト観点、またはテスト項目の番号が記載されていません"
-                + "\n"
-            )
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_6.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト項目の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += line_num + "行目: 「手順」または「確認」が空白になっています" + "\n"
-            msg += "            " + "セル番号 " + arg1 + ": " + arg2 + "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_7.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト項目の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += (
-                line_num
-                + "行目: 改行記述の（親となる）先頭行は、リスト or 番号付きリストである必要があります"
-                + "\n"
-            )
-            msg += "            " + "セル番号 " + arg1 + ": " + arg2 + "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_8.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テストのタイトル行がありません" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += "・イコールの記号で定義されるタイトル行が必要です" + "\n"
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-        elif code == MdOpStatus.ERROR_CODE_9.value:
-            msg += "【 エラー 】" + "\n"
-            msg += "テスト項目の記述に誤りがあります" + "\n"
-            msg += "\n"
-            msg += "ファイル名：" + self.error_target_fp + "\n"
-            msg += "\n"
-            msg += (
-                line_num
-                + "行目: この行の直前に「手順」もしくは「確認」が空白の項目があります"
+# 診断情報（警告・エラー）1件分
+#   メッセージは表示するときに MESSAGE_TEMPLATES から生成する
+Diagnostic = namedtuple("Diagnostic", ["code", "file", "line", "args"])
+
+
+_ERROR_HEADER = "【 エラー 】\n"
+_ERROR_FOOTER = "処理を中止しました\n"
+
+# 警告・エラーのメッセージ
+#   {file}: 対象のファイル, {line}: 行番号, {arg1} {arg2}: 付加情報
+MESSAGE_TEMPLATES = {
+    ### MdToExcel.py 関連の警告とエラー
+    MainAppStatus.ERROR_CODE_1.value: (
+        _ERROR_HEADER
+        + "設定ファイル（config.yaml）が見つかりません\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MainAppStatus.ERROR_CODE_2.value: (
+        _ERROR_HEADER
+        + "指定できるファイルの拡張子は以下のいずれかのみです\n"
+        + "（双方向の変換は同時にできません）\n"
+        + "\n"
+        + "・Markdown -> Excel 変換：md\n"
+        + "・Excel -> Markdown 変換：xlsm\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    ### excel_operator.py 関連の警告とエラー
+    ExOpStatus.ERROR_CODE_1.value: (
+        _ERROR_HEADER
+        + "{file} に保存できません\n"
+        + "ファイルを開いていませんか？\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    ExOpStatus.ERROR_CODE_2.value: (
+        _ERROR_HEADER
+        + "予期しないエラーが発生しました（管理者に報告してください）\n"
+        + "\n"
+    ),
+    ExOpStatus.ERROR_CODE_3.value: (
+        _ERROR_HEADER
+        + "出力エンジン {arg1} は使用できません\n"
+        + "（openpyxl を指定するか、xlsxwriter の場合は XlsxWriter をインストールしてください）\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    ### markdown_operator.py 関連の警告とエラー
+    MdOpStatus.WARNING_CODE_2.value: (
+        "{line}行目: 無効な記述があります\n" + "            {arg1}"
+    ),
+    MdOpStatus.WARNING_CODE_3.value: (
+        "{line}行目: 無効な記述があります\n" + "            セル番号 {arg1}: {arg2}"
+    ),
+    MdOpStatus.WARNING_CODE_4.value: "            セル番号 {arg1}: {arg2}",
+    MdOpStatus.WARNING_CODE_5.value: (
+        "{line}行目: テスト観点のレベル（# の数）が間違っていませんか？\n"
+    ),
+    MdOpStatus.ERROR_CODE_1.value: (
+        _ERROR_HEADER
+        + "Markdownファイル（.md）が見つかりません\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_2.value: (
+        _ERROR_HEADER
+        + "Markdownファイルの名前が不適切です\n"
+        + "次の点を確認して修正してください\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "・ファイル名が 31 文字以内であること\n"
+        + "・次の使用できない文字が含まれていないこと\n"
+        + "　コロン(:)、円記号(\\)、スラッシュ(/)、疑問符(?)、アスタリスク(*)、左角かっこ([)、右角かっこ(])\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_3.value: (
+        _ERROR_HEADER
+        + "テスト実施環境の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "・同じ名前のテスト実施環境が存在していませんか？\n"
+        + "・記述したエリアが ``` で囲まれていますか？\n"
+        + "・テスト実施環境の名前が # （テスト観点の記号）で始まっていませんか？\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_4.value: (
+        _ERROR_HEADER
+        + "テスト項目の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "・ヘッダー行（下記）を正しく認識できませんでした\n"
+        + "\n"
+        + "　1,2,3,4,5,6,番号,環境,準備,手順,確認,備考・・\n"
+        + "\n"
+        + "処理を中止しました\n\n"
+    ),
+    MdOpStatus.ERROR_CODE_5.value: (
+        _ERROR_HEADER
+        + "テスト項目の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: テスト観点、またはテスト項目の番号が記載されていません\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_6.value: (
+        _ERROR_HEADER
+        + "テスト項目の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: 「手順」または「確認」が空白になっています\n"
+        + "            セル番号 {arg1}: {arg2}\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_7.value: (
+        _ERROR_HEADER
+        + "テスト項目の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: 改行記述の（親となる）先頭行は、リスト or 番号付きリストである必要があります\n"
+        + "            セル番号 {arg1}: {arg2}\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_8.value: (
+        _ERROR_HEADER
+        + "テストのタイトル行がありません\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "・イコールの記号で定義されるタイトル行が必要です\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_9.value: (
+        _ERROR_HEADER
+        + "テスト項目の記述に誤りがあります\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: この行の直前に「手順」もしくは「確認」が空白の項目があります\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_10.value: (
+        _ERROR_HEADER
+        + "取り込むファイルが見つかりません\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: {arg1}\n"
+        + "\n"
+        + "・取り込むファイルのパスは、取り込みを記述したファイルのフォルダからの相対パスで指定してください\n"
+        + "・ファイルではなくデータとして受け取った Markdown（変換サーバーなど）では取り込みできません\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+    MdOpStatus.ERROR_CODE_11.value: (
+        _ERROR_HEADER
+        + "ファイルの取り込みが循環しています\n"
+        + "\n"
+        + "ファイル名：{file}\n"
+        + "\n"
+        + "{line}行目: {arg1}\n"
+        + "\n"
+        + _ERROR_FOOTER
+    ),
+}
+
+# コード -> 名前（JSON 出力用）
+CODE_NAMES = {
+    member.value: cls.__name__ + "." + member.name
+    for cls in (MainAppStatus, ExOpStatus, MdOpStatus)
+    for member in cls
+}
+
+
+def build_file_header(file: str) -> str:
+    return "\n" + "→ " + file + " について以下を確認してください" + "\n" + "\n"
+
+
+def render_msg(diagnostic: Diagnostic, with_header: bool = True) -> str:
+    """
+    診断情報からメッセージを生成します
+
+    Args:
+        diagnostic:     診断情報
+        with_header:    対象のファイルを示す見出しを付けるかどうか
+    """
+    args = list(diagnostic.args) + ["", ""]
+    msg = build_file_header(diagnostic.file) if with_header and diagnostic.file else ""
+    msg += MESSAGE_TEMPLATES.get(diagnostic.code, "").format(
+        file=diagnostic.file, line=diagnostic.line, arg1=args[0], arg2=args[1]
+    )
+    return msg
+
+
+class ConversionError(Exception):
+    """
+    変換処理を中止するエラー
+    Diagnostics.error() で生成したものは診断情報（コード、ファイル、行番号、付加情報）を持つ
+    """
+
+    def __init__(self, message: str = "", diagnostic: Diagnostic = None):
+        self.diagnostic = diagnostic
+        if diagnostic is not None and not message:
+            message = (
+                render_msg(diagnostic, with_header=False)
+                .replace(_ERROR_HEADER, "")
+                .replace(_ERROR_FOOTER, "")
+                .strip()
             )
-            msg += "\n"
-            msg += "処理を中止しました" + "\n"
-            pass
-        return msg
+        super().__init__(message)
+
+    @property
+    def code(self):
+        return self.diagnostic.code if self.diagnostic else None
+
+    @property
+    def file(self):
+        return self.diagnostic.file if self.diagnostic else ""
+
+    @property
+    def line(self):
+        return self.diagnostic.line if self.diagnostic else ""
+
+    def render(self) -> str:
+        if self.diagnostic is not None:
+            return render_msg(self.diagnostic)
+        return _ERROR_HEADER + str(self) + "\n"
+
+    def to_dict(self) -> dict:
+        return {
+            "type": type(self).__name__,
+            "code": self.code,
+            "name": CODE_NAMES.get(self.code, ""),
+            "file": self.file,
+            "line": self.line,
+            "message": str(self),
+        }
+
+
+class ConfigError(ConversionError):
+    """設定ファイルが読み込めない、または指定した出力エンジンが使用できない"""
+
+
+class InputFileError(ConversionError):
+    """入力ファイルが見つからない、またはファイル名・拡張子が不適切"""
+
+
+class MarkdownSyntaxError(ConversionError):
+    """Markdown の記述に誤りがある"""
+
+
+class WorkbookFormatError(ConversionError):
+    """Excel テスト項目書の記述に誤りがある（逆変換）"""
+
+
+class OutputFileError(ConversionError):
+    """保存先に書き込めない"""
+
+
+class UnexpectedError(ConversionError):
+    """予期しないエラー"""
+
+
+# エラーのコード -> 例外の種類
+ERROR_TYPES = {
+    MainAppStatus.ERROR_CODE_1.value: ConfigError,
+    MainAppStatus.ERROR_CODE_2.value: InputFileError,
+    ExOpStatus.ERROR_CODE_1.value: OutputFileError,
+    ExOpStatus.ERROR_CODE_2.value: UnexpectedError,
+    ExOpStatus.ERROR_CODE_3.value: ConfigError,
+    MdOpStatus.ERROR_CODE_1.value: InputFileError,
+    MdOpStatus.ERROR_CODE_2.value: InputFileError,
+    MdOpStatus.ERROR_CODE_3.value: MarkdownSyntaxError,
+    MdOpStatus.ERROR_CODE_4.value: WorkbookFormatError,
+    MdOpStatus.ERROR_CODE_5.value: WorkbookFormatError,
+    MdOpStatus.ERROR_CODE_6.value: WorkbookFormatError,
+    MdOpStatus.ERROR_CODE_7.value: WorkbookFormatError,
+    MdOpStatus.ERROR_CODE_8.value: MarkdownSyntaxError,
+    MdOpStatus.ERROR_CODE_9.value: MarkdownSyntaxError,
+    MdOpStatus.ERROR_CODE_10.value: InputFileError,
+    MdOpStatus.ERROR_CODE_11.value: MarkdownSyntaxError,
+}
+
+
+class Diagnostics:
+    """
+    変換処理1回分の警告・エラーを集める
+    変換処理ごとに生成するため、複数の変換をスレッドで同時に実行しても互いに影響しない
+    """
+
+    def __init__(self, file: str = ""):
+        self.file = file
+        self.items = []
+
+    def add(self, code: int, line="", *args, file: str = None) -> Diagnostic:
+        """
+        警告を記録します（file を指定した場合は、取り込んだファイルなど self.file 以外のファイルの警告とする）
+        """
+        diagnostic = Diagnostic(
+            code, file or self.file, str(line), tuple(str(a) for a in args)
+        )
+        self.items.append(diagnostic)
+        return diagnostic
+
+    def error(self, code: int, line="", *args, file: str = None) -> ConversionError:
+        """
+        処理を中止するための例外を生成します（警告としては記録しない）
+        """
+        diagnostic = Diagnostic(
+            code, file or self.file, str(line), tuple(str(a) for a in args)
+        )
+        return ERROR_TYPES.get(code, ConversionError)(diagnostic=diagnostic)
+
+    def extend(self, diagnostics) -> None:
+        self.items.extend(diagnostics)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def render(self) -> list[str]:
+        """
+        警告メッセージを生成します（対象のファイルが変わるごとに見出しを付ける）
+        """
+        msgs = []
+        prev_file = None
+        for diagnostic in self.items:
+            msgs.append(render_msg(diagnostic, diagnostic.file != prev_file))
+            prev_file = diagnostic.file
+        return msgs
+
+    def to_dicts(self) -> list[dict]:
+        return [
+            {
+                "code": d.code,
+                "name": CODE_NAMES.get(d.code, ""),
+                "file": d.file,
+                "line": d.line,
+                "args": list(d.args),
+                "message": render_msg(d, with_header=False),
+            }
+            for d in self.items
+        ]
+
+    def write_json(self, output_fn: str) -> None:
+        with open(output_fn, "w", encoding="utf-8") as f:
+            json.dump(self.to_dicts(), f, ensure_ascii=False, indent=2)
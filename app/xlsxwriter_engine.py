@@ -0,0 +1,728 @@
+# coding: utf-8
+
+__author__ = "Yuji Haruki (modifier) / Kohei, Watanabe <kohei.watanabe3@brother.co.jp> (original)"
+__version__ = "2.1.0"
+__date__ = "5 June 2024"
+
+import io
+import re
+import html
+import hashlib
+import zipfile
+from copy import copy
+import pandas as pd
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.colors import COLOR_INDEX
+from excel_operator import (
+    get_table_start_row,
+    get_sheet_layout,
+    iter_row_style_keys,
+    is_overwritable,
+    normalize_book,
+)
+from warningMsgProvider import ExOpStatus, Diagnostics
+from template_cache import get_compiled_template, TRAILING_SHEET_NUM
+
+try:
+    import xlsxwriter
+    from xlsxwriter.color import Color
+    from xlsxwriter.exceptions import FileCreateError
+except ImportError:  # XlsxWriter は --engine xlsxwriter を指定した場合のみ必要
+    xlsxwriter = None
+
+# 列幅の換算（Excel の既定のフォントの数字1文字の幅と左右の余白、ピクセル）
+MAX_DIGIT_WIDTH = 7
+PADDING = 5
+
+# openpyxl -> XlsxWriter の書式の値
+BORDER_STYLES = {
+    None: 0,
+    "thin": 1,
+    "medium": 2,
+    "dashed": 3,
+    "dotted": 4,
+    "thick": 5,
+    "double": 6,
+    "hair": 7,
+    "mediumDashed": 8,
+    "dashDot": 9,
+    "mediumDashDot": 10,
+    "dashDotDot": 11,
+    "mediumDashDotDot": 12,
+    "slantDashDot": 13,
+}
+FILL_PATTERNS = {
+    "solid": 1,
+    "mediumGray": 2,
+    "darkGray": 3,
+    "lightGray": 4,
+    "darkHorizontal": 5,
+    "darkVertical": 6,
+    "darkDown": 7,
+    "darkUp": 8,
+    "darkGrid": 9,
+    "darkTrellis": 10,
+    "lightHorizontal": 11,
+    "lightVertical": 12,
+    "lightDown": 13,
+    "lightUp": 14,
+    "lightGrid": 15,
+    "lightTrellis": 16,
+    "gray125": 17,
+    "gray0625": 18,
+}
+HORIZONTAL_ALIGNMENTS = {
+    "left": "left",
+    "center": "center",
+    "right": "right",
+    "fill": "fill",
+    "justify": "justify",
+    "centerContinuous": "center_across",
+    "distributed": "distributed",
+}
+VERTICAL_ALIGNMENTS = {
+    "top": "top",
+    "center": "vcenter",
+    "bottom": "bottom",
+    "justify": "vjustify",
+    "distributed": "vdistributed",
+}
+UNDERLINES = {"single": 1, "double": 2, "singleAccounting": 33, "doubleAccounting": 34}
+
+# フォントのプロパティ（XlsxWriter では全ての書式の既定値として指定する）
+FONT_PROPERTIES = [
+    "font_name",
+    "font_size",
+    "bold",
+    "italic",
+    "underline",
+    "font_strikeout",
+    "font_script",
+    "font_family",
+    "font_charset",
+    "font_scheme",
+    "font_color",
+]
+
+# テンプレートのフォームボタン（VML）
+VML_SHAPE_PATTERN = re.compile(r"<v:shape\b(.*?)</v:shape>", re.S)
+
+# 同じプロセス内で再利用するテンプレートのシートの内容（キー: コンパイル済みテンプレートのハッシュ）
+_template_models = {}
+
+
+def convert_color(color):
+    """
+    openpyxl の色を XlsxWriter の色（#RRGGBB、またはテーマ色の (番号, 0)）に変換します
+    色の指定がない（自動）場合は None を返す
+    """
+    if color is None:
+        return None
+    if color.type == "rgb":
+        if not isinstance(color.rgb, str):
+            return None
+        return "#" + color.rgb[-6:]
+    if color.type == "indexed":
+        if color.indexed >= len(COLOR_INDEX) or color.indexed >= 64:
+            return None  # システムの前景色・背景色（自動）
+        return "#" + COLOR_INDEX[color.indexed][-6:]
+    if color.type == "theme":
+        return (color.theme, 0)
+    return None
+
+
+def convert_width(width):
+    """
+    列幅（Excel のファイル上の値、余白を含む）を XlsxWriter に指定する列幅に変換します
+    XlsxWriter は指定した列幅に余白を加えてピクセル単位に丸めるため、同じピクセル数になる値を逆算する
+    """
+    if width is None:
+        return None
+    pixels = int(width * MAX_DIGIT_WIDTH + 0.5)
+    if pixels < MAX_DIGIT_WIDTH + PADDING:
+        return pixels / (MAX_DIGIT_WIDTH + PADDING)
+    return (pixels - PADDING) / MAX_DIGIT_WIDTH
+
+
+def get_format_properties(obj) -> tuple:
+    """
+    openpyxl のセル（または行・列）の書式を XlsxWriter の書式のプロパティに変換します
+
+    Returns:
+        properties:     (プロパティ名, 値) のタプル（書式の共有に使うため、ハッシュ可能な形で返す）
+    """
+    props = {}
+
+    font = obj.font
+    if font.name:
+        props["font_name"] = font.name
+    if font.sz:
+        props["font_size"] = font.sz
+    if font.b:
+        props["bold"] = True
+    if font.i:
+        props["italic"] = True
+    if font.u:
+        props["underline"] = UNDERLINES.get(font.u, 1)
+    if font.strike:
+        props["font_strikeout"] = True
+    if font.vertAlign in ["superscript", "subscript"]:
+        props["font_script"] = 1 if font.vertAlign == "superscript" else 2
+    if font.family is not None:
+        props["font_family"] = int(font.family)
+    if font.charset is not None:
+        props["font_charset"] = int(font.charset)
+    if font.scheme:
+        props["font_scheme"] = font.scheme
+    if convert_color(font.color):
+        props["font_color"] = convert_color(font.color)
+
+    fill = obj.fill
+    if getattr(fill, "patternType", None) in FILL_PATTERNS:
+        props["pattern"] = FILL_PATTERNS[fill.patternType]
+        if convert_color(fill.fgColor):
+            props["fg_color"] = convert_color(fill.fgColor)
+        # 単色の塗りつぶしでは背景色は使われない（XlsxWriter は前景色と背景色を入れ替えるため指定しない）
+        if fill.patternType != "solid" and convert_color(fill.bgColor):
+            props["bg_color"] = convert_color(fill.bgColor)
+
+    border = obj.border
+    for side in ["left", "right", "top", "bottom"]:
+        border_side = getattr(border, side)
+        if border_side is not None and border_side.style:
+            props[side] = BORDER_STYLES.get(border_side.style, 1)
+            if convert_color(border_side.color):
+                props[side + "_color"] = convert_color(border_side.color)
+    if border.diagonal is not None and border.diagonal.style:
+        props["diag_border"] = BORDER_STYLES.get(border.diagonal.style, 1)
+        props["diag_type"] = (1 if border.diagonalUp else 0) + (
+            2 if border.diagonalDown else 0
+        )
+        if convert_color(border.diagonal.color):
+            props["diag_color"] = convert_color(border.diagonal.color)
+
+    alignment = obj.alignment
+    if alignment.horizontal in HORIZONTAL_ALIGNMENTS:
+        props["align"] = HORIZONTAL_ALIGNMENTS[alignment.horizontal]
+    if alignment.vertical in VERTICAL_ALIGNMENTS:
+        props["valign"] = VERTICAL_ALIGNMENTS[alignment.vertical]
+    if alignment.wrap_text:
+        props["text_wrap"] = True
+    if alignment.shrink_to_fit:
+        props["shrink"] = True
+    if alignment.indent:
+        props["indent"] = int(alignment.indent)
+    if alignment.text_rotation:
+        # 縦書き（255）は XlsxWriter では 270 で指定する
+        props["rotation"] = (
+            270 if alignment.text_rotation == 255 else int(alignment.text_rotation)
+        )
+    if alignment.readingOrder:
+        props["reading_order"] = int(alignment.readingOrder)
+
+    if obj.number_format and obj.number_format != "General":
+        props["num_format"] = obj.number_format
+
+    protection = obj.protection
+    if protection.locked is False:
+        props["locked"] = False
+    if protection.hidden:
+        props["hidden"] = True
+
+    return tuple(props.items())
+
+
+def parse_vml_buttons(vml: str) -> list[dict]:
+    """
+    VML からフォームボタン（マクロの登録されたボタン）を取り出します
+    """
+    buttons = []
+    for match in VML_SHAPE_PATTERN.finditer(vml):
+        shape = match.group(1)
+        if 'ObjectType="Button"' not in shape:
+            continue
+        anchor = re.search(r"<x:Anchor>\s*([^<]*)</x:Anchor>", shape)
+        if anchor is None:
+            continue
+        col, col_offset, row, row_offset = [
+            int(v) for v in anchor.group(1).split(",")[:4]
+        ]
+        style = re.search(r"style='([^']*)'", shape)
+        style = style.group(1) if style else ""
+        width = re.search(r"width:([0-9.]+)pt", style)
+        height = re.search(r"height:([0-9.]+)pt", style)
+        macro = re.search(r"<x:FmlaMacro>([^<]*)</x:FmlaMacro>", shape)
+        textbox = re.search(r"<v:textbox\b[^>]*>(.*?)</v:textbox>", shape, re.S)
+        caption = ""
+        if textbox:
+            # 改行（<br>）で区切った行ごとに、タグと整形用の空白を取り除く
+            text = re.sub(r"<br\s*/?>", "\n", textbox.group(1))
+            text = html.unescape(re.sub(r"<[^>]*>", "", text))
+            caption = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+        button = {
+            "row": row,
+            "col": col,
+            "x_offset": col_offset,
+            "y_offset": row_offset,
+            "caption": caption,
+            # pt -> ピクセル
+            "width": round(float(width.group(1)) * 4 / 3) if width else 64,
+            "height": round(float(height.group(1)) * 4 / 3) if height else 20,
+        }
+        if macro:
+            button["macro"] = re.sub(r"^\[0\]!", "", macro.group(1))
+        buttons.append(button)
+    return buttons
+
+
+def load_template_model(compiled_template: bytes) -> dict:
+    """
+    コンパイル済みテンプレートから、XlsxWriter で書き写すための内容を取り出します
+    （値、書式、列幅、行の高さ、シートの設定、フォームボタン、VBA プロジェクト）
+
+    以下は書き写さない
+      - 定義された名前（テンプレートでは参照切れ、外部参照、ユーザー設定のビューのみ）
+      - 外部リンク、プリンターの設定
+    """
+    key = hashlib.sha256(compiled_template).hexdigest()
+    if key in _template_models:
+        return _template_models[key]
+
+    wb = openpyxl.load_workbook(io.BytesIO(compiled_template), keep_vba=True)
+    with zipfile.ZipFile(io.BytesIO(compiled_template)) as z:
+        vba_project = z.read("xl/vbaProject.bin")
+        vmls = {
+            name: z.read(name).decode("utf-8", "replace")
+            for name in z.namelist()
+            if name.endswith(".vml")
+        }
+
+    # 既定の書式（スタイル番号 0）
+    #  XlsxWriter はフォントの既定値を全ての書式に引き継ぐため、フォントとそれ以外に分けて保持する
+    #  色の指定がないフォントは XlsxWriter ではテーマの色になるため、自動を明示する
+    default_cell = Cell(wb.worksheets[0])
+    default_cell._style = copy(wb._cell_styles[0])
+    default_props = dict(get_format_properties(default_cell))
+    default_font_props = {"font_color": "automatic"}
+    default_font_props.update(
+        {k: v for k, v in default_props.items() if k in FONT_PROPERTIES}
+    )
+    model = {
+        "vba_project": vba_project,
+        "vba_name": wb.code_name or "ThisWorkbook",
+        "tab_ratio": wb.views[0].tabRatio if wb.views else None,
+        "default_format_properties": default_font_props,
+        "default_cell_properties": {
+            k: v for k, v in default_props.items() if k not in FONT_PROPERTIES
+        },
+        "sheets": [],
+    }
+
+    for ws in wb.worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is None and not cell.has_style:
+                    continue
+                props = get_format_properties(cell) if cell.has_style else None
+                cells.setdefault(cell.row, []).append(
+                    (cell.column - 1, cell.value, props)
+                )
+
+        rows = {}
+        for row_no, dim in ws.row_dimensions.items():
+            props = get_format_properties(dim) if dim.customFormat else None
+            if dim.ht is None and not dim.hidden and props is None:
+                continue
+            rows[row_no] = (dim.ht if dim.customHeight else None, dim.hidden, props)
+
+        columns = []
+        for dim in ws.column_dimensions.values():
+            props = get_format_properties(dim) if dim.has_style else None
+            width = dim.width if dim.customWidth else None
+            columns.append((dim.min - 1, dim.max - 1, width, dim.hidden, props))
+
+        buttons = []
+        if ws.legacy_drawing:
+            buttons = parse_vml_buttons(vmls.get(ws.legacy_drawing.lstrip("/"), ""))
+
+        sheet_format = ws.sheet_format
+        model["sheets"].append(
+            {
+                "title": ws.title,
+                "vba_name": ws.sheet_properties.codeName,
+                "tab_color": convert_color(ws.sheet_properties.tabColor),
+                "default_row_height": sheet_format.defaultRowHeight,
+                "hide_unused_rows": bool(sheet_format.zeroHeight),
+                "zoom": ws.sheet_view.zoomScale,
+                "show_grid_lines": ws.sheet_view.showGridLines is not False,
+                "paper_size": ws.page_setup.paperSize,
+                "orientation": ws.page_setup.orientation,
+                "margins": ws.page_margins,
+                "cells": cells,
+                "rows": rows,
+                "columns": columns,
+                "buttons": buttons,
+            }
+        )
+
+    _template_models[key] = model
+    return model
+
+
+class FormatCache:
+    """
+    ブック内で書式を共有します（同じプロパティの書式は1回だけ生成する）
+    """
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.formats = {}
+        # 既定の書式（書式を指定しないセルは列の書式で表示されるため、openpyxl と同じく既定の書式を明示する）
+        self.default = workbook.formats[0]
+
+    def get(self, props: tuple):
+        if props is None:
+            return None
+        if props not in self.formats:
+            # テーマ色は (番号, 0) で保持しているため Color に変換する
+            self.formats[props] = self.workbook.add_format(
+                {k: Color(v) if isinstance(v, tuple) else v for k, v in props}
+            )
+        return self.formats[props]
+
+
+def write_template_sheet(workbook, sheet: dict, formats: FormatCache) -> None:
+    """
+    テンプレートのシートを書き写します（行の順に書き出す）
+    """
+    worksheet = workbook.add_worksheet(sheet["title"])
+    if sheet["vba_name"]:
+        worksheet.set_vba_name(sheet["vba_name"])
+    if sheet["tab_color"]:
+        worksheet.set_tab_color(sheet["tab_color"])
+    if sheet["zoom"]:
+        worksheet.set_zoom(sheet["zoom"])
+    if not sheet["show_grid_lines"]:
+        worksheet.hide_gridlines(2)
+    if sheet["paper_size"]:
+        worksheet.set_paper(sheet["paper_size"])
+    if sheet["orientation"] == "landscape":
+        worksheet.set_landscape()
+    margins = sheet["margins"]
+    if margins is not None:
+        worksheet.set_margins(margins.left, margins.right, margins.top, margins.bottom)
+
+    if sheet["default_row_height"] or sheet["hide_unused_rows"]:
+        worksheet.set_default_row(
+            sheet["default_row_height"], hide_unused_rows=sheet["hide_unused_rows"]
+        )
+
+    for first_col, last_col, width, hidden, props in sheet["columns"]:
+        worksheet.set_column(
+            first_col,
+            last_col,
+            convert_width(width),
+            formats.get(props),
+            {"hidden": True} if hidden else None,
+        )
+
+    for row_no in sorted(set(sheet["rows"]) | set(sheet["cells"])):
+        if row_no in sheet["rows"]:
+            height, hidden, props = sheet["rows"][row_no]
+            worksheet.set_row(
+                row_no - 1,
+                height,
+                formats.get(props),
+                {"hidden": True} if hidden else None,
+            )
+        for col_idx, value, props in sheet["cells"].get(row_no, []):
+            if value is None:
+                worksheet.write_blank(row_no - 1, col_idx, None, formats.get(props))
+            else:
+                worksheet.write(row_no - 1, col_idx, value, formats.get(props))
+
+    for button in sheet["buttons"]:
+        options = dict(button)
+        worksheet.insert_button(options.pop("row"), options.pop("col"), options)
+
+
+def get_data_keys(config_excel: dict, test_env_frame_num: int) -> tuple[list, list]:
+    """
+    テスト項目表の列ごとに、データフレームの列名と見出しを返します
+    （openpyxl の出力と同じく、マルチインデックス化する列、出力する列、テスト環境枠の列の順）
+    """
+    col_name = config_excel["col_name"]
+    index_keys = [
+        k for k in col_name if k in config_excel["index"] and config_excel["index"][k]
+    ]
+    output_keys = [
+        k for k in col_name if k in config_excel["output"] and config_excel["output"][k]
+    ]
+    keys = index_keys + output_keys
+    labels = [str(col_name[k]) for k in keys]
+    for idx in range(test_env_frame_num):
+        for k, v in config_excel["col_name_res_area"].items():
+            keys.append(k + "_" + str(idx + 1))
+            labels.append(v)
+    return keys, labels
+
+
+def is_blank(value) -> bool:
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+def write_test_specification(
+    workbook,
+    df: pd.DataFrame,
+    sheet_name: str,
+    summary: list,
+    test_env_frame: list,
+    config_excel: dict,
+    formats: FormatCache,
+    vba_name: str,
+) -> None:
+    """
+    テスト項目シートを行の順に書き出します
+    セルの値と書式は openpyxl エンジン（excel_operator.write_test_specification()）と同じにする
+    """
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.set_vba_name(vba_name)
+
+    test_env_frame_num = len(test_env_frame)
+    layout = get_sheet_layout(config_excel, test_env_frame_num)
+    total_col_count = layout["total_col_count"]
+    tb_start_row = get_table_start_row(summary, config_excel)
+    keys, labels = get_data_keys(config_excel, test_env_frame_num)
+
+    # 列幅（テスト項目の ID の列は非表示）
+    #  openpyxl で幅を設定した列には書式（既定のフォントのみで配置なし）が付くため、同じ書式を付ける
+    column_format = formats.get(())
+    for col_idx in range(total_col_count):
+        worksheet.set_column(
+            col_idx, col_idx, convert_width(layout["width"][col_idx]), column_format
+        )
+    item_id_col = config_excel["item_id"]["col_name"]
+    has_item_id = item_id_col in df.columns
+    if has_item_id:
+        worksheet.set_column(
+            total_col_count, total_col_count, None, column_format, {"hidden": True}
+        )
+
+    # 行固定
+    worksheet.freeze_panes(tb_start_row, 0)
+
+    # 概要行の書き出し
+    for idx, one_line in enumerate(summary):
+        worksheet.write(idx, 4, one_line, formats.default)
+
+    # テスト環境枠の名称
+    for i in range(test_env_frame_num):
+        start_col = (
+            len(config_excel["col_name"]) + len(config_excel["col_name_res_area"]) * i
+        )
+        worksheet.write(
+            tb_start_row - 2, start_col - 1, test_env_frame[i], formats.default
+        )
+
+    # 見出し行
+    worksheet.set_row(tb_start_row - 1, config_excel["height"]["header"])
+    for col_idx in range(total_col_count):
+        header_format = formats.get(
+            (
+                ("font_name", config_excel["font"]),
+                ("font_size", 9),
+                ("bold", True),
+                ("font_color", "#000000"),
+                ("pattern", 1),
+                ("fg_color", "#" + layout["color"][col_idx][-6:]),
+                # テスト仕様列群と結果列群の境界は太線
+                ("left", 2 if layout["test_intention_cols"][col_idx] else 1),
+                ("right", 1),
+                ("top", 1),
+                ("bottom", 1),
+                ("align", "center"),
+                ("valign", "vcenter"),
+                ("text_wrap", True),
+                ("rotation", 270),
+            )
+        )
+        worksheet.write(tb_start_row - 1, col_idx, labels[col_idx].rstrip(), header_format)
+    if has_item_id:
+        worksheet.write(
+            tb_start_row - 1,
+            total_col_count,
+            config_excel["item_id"]["header"],
+            formats.default,
+        )
+
+    # データセル
+    data_font = (
+        ("font_name", config_excel["font"]),
+        ("font_size", 9),
+        ("font_color", "#000000"),
+    )
+
+    def create_row_formats(style_keys) -> list:
+        row_formats = []
+        for fill_color, border, alignment in style_keys:
+            props = data_font
+            if fill_color:
+                props += (("pattern", 1), ("fg_color", "#" + fill_color[-6:]))
+            props += tuple(
+                (side, BORDER_STYLES.get(style, 1))
+                for side, style in zip(["left", "right", "top", "bottom"], border)
+                if style
+            )
+            if alignment[0] in HORIZONTAL_ALIGNMENTS:
+                props += (("align", HORIZONTAL_ALIGNMENTS[alignment[0]]),)
+            if alignment[1] in VERTICAL_ALIGNMENTS:
+                props += (("valign", VERTICAL_ALIGNMENTS[alignment[1]]),)
+            if alignment[2]:
+                props += (("text_wrap", True),)
+            if alignment[3]:
+                props += (("shrink", True),)
+            row_formats.append(formats.get(props))
+        return row_formats
+
+    row_formats = {}
+    marks = df["mark"].tolist()
+    item_ids = df[item_id_col].tolist() if has_item_id else []
+    values = df[keys].itertuples(index=False, name=None)
+
+    # 行ループ
+    for row_idx, ((row_key, style_keys), row_values) in enumerate(
+        zip(iter_row_style_keys(marks, config_excel, layout), values)
+    ):
+        if row_key not in row_formats:
+            row_formats[row_key] = create_row_formats(style_keys)
+        row = tb_start_row + row_idx
+        for col_idx, (value, cell_format) in enumerate(
+            zip(row_values, row_formats[row_key])
+        ):
+            if is_blank(value):
+                worksheet.write_blank(row, col_idx, None, cell_format)
+            else:
+                worksheet.write(row, col_idx, value, cell_format)
+        # テスト項目の ID を表の右端の非表示列に埋め込む
+        if has_item_id and item_ids[row_idx]:
+            worksheet.write(row, total_col_count, item_ids[row_idx], formats.default)
+
+
+def convert_df_to_excel(
+    dfs: list[pd.DataFrame],
+    sheet_names: list[str],
+    product_categories: list[str],
+    summaries: list[list],
+    test_env_frames: list[list],
+    config_excel: dict,
+    input_path,
+    output_fn="TestSpec.xlsm",
+    overwrite=False,
+) -> None:
+    """
+    convert_md_to_df()により生成されたデータフレームを、XlsxWriter でエクセルファイルに書き出します
+    excel_operator.convert_df_to_excel() と同じ内容のブックを、テンプレートを開いて追記せずに
+    シートを1行ずつ書き出して生成する（定メモリモード、書き出した行はメモリに保持しない）
+
+    テンプレートからは、VBA プロジェクト（vbaProject.bin）と表紙・末尾のシートを書き写す
+
+    Args:
+        dfs:                convert_md_to_df()により生成されたデータフレーム
+        sheet_names          シート名
+        product_categories  製品カテゴリー
+        summares:           タイトル名、および概要欄の入力文章
+        test_env_frames:    テスト環境枠
+        config_excel:       設定
+        input_path:         エクセルのテンプレファイル（パス、または内容の bytes）
+        output_fn:          出力先のファイル、またはバイナリのファイルオブジェクト
+        overwrite:          保存先が既に存在する場合の扱い（True: 上書き / False: スキップ / 関数: 保存先のパスを渡して判定させる）
+
+    設定の reproducible が true の場合は、メモリ上に保存したブックを excel_operator.normalize_book() で
+    正規化してから書き込む
+    """
+    is_stream = hasattr(output_fn, "write")
+    if is_stream:
+        output_name = getattr(output_fn, "name", "")
+        diagnostics = Diagnostics(output_name if isinstance(output_name, str) else "")
+    else:
+        diagnostics = Diagnostics(output_fn)
+        if not is_overwritable(output_fn, overwrite):
+            return
+
+    if xlsxwriter is None:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_3.value, "", "xlsxwriter")
+
+    # 製品カテゴリの表紙シートを選定済みのテンプレートを取得
+    compiled_template = get_compiled_template(
+        input_path, product_categories[0], config_excel.get("template_cache_dir")
+    )
+    model = load_template_model(compiled_template)
+
+    reproducible = bool(config_excel.get("reproducible"))
+    book = io.BytesIO() if is_stream or reproducible else output_fn
+    workbook = xlsxwriter.Workbook(
+        book,
+        {
+            "constant_memory": True,
+            "strings_to_urls": False,
+            "default_format_properties": model["default_format_properties"],
+        },
+    )
+    # 既定の書式（XlsxWriter の書式の先頭）に、フォント以外のテンプレートの既定の書式を設定する
+    for k, v in model["default_cell_properties"].items():
+        getattr(workbook.formats[0], "set_" + k)(v)
+    workbook.add_vba_project(io.BytesIO(model["vba_project"]), is_stream=True)
+    workbook.set_vba_name(model["vba_name"])
+    if model["tab_ratio"]:
+        workbook.set_tab_ratio(model["tab_ratio"] / 10)
+    formats = FormatCache(workbook)
+
+    # シートのコード名（テンプレートのシートと重複しないようにする）
+    used_vba_names = {sheet["vba_name"] for sheet in model["sheets"]}
+    vba_names = (
+        "Sheet" + str(no) for no in range(1, 10000) if "Sheet" + str(no) not in used_vba_names
+    )
+
+    # テスト項目シートは、テンプレートの末尾のシートより前に並べる
+    insert_idx = len(model["sheets"]) - TRAILING_SHEET_NUM
+    try:
+        for sheet in model["sheets"][:insert_idx]:
+            write_template_sheet(workbook, sheet, formats)
+        for idx, df in enumerate(dfs):
+            sheet_name = (
+                sheet_names[idx] if sheet_names[idx] != "" else f"Sheet{str(idx + 1)}"
+            )
+            write_test_specification(
+                workbook,
+                df,
+                sheet_name,
+                summaries[idx],
+                test_env_frames[idx],
+                config_excel,
+                formats,
+                next(vba_names),
+            )
+        for sheet in model["sheets"][insert_idx:]:
+            write_template_sheet(workbook, sheet, formats)
+
+        # 保存
+        workbook.close()
+    except FileCreateError:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_1.value)
+    except ValueError as e:
+        raise diagnostics.error(ExOpStatus.ERROR_CODE_2.value) from e
+
+    if is_stream or reproducible:
+        data = book.getvalue()
+        if reproducible:
+            data = normalize_book(data)
+        if is_stream:
+            output_fn.write(data)
+        else:
+            try:
+                with open(output_fn, "wb") as f:
+                    f.write(data)
+            except PermissionError:
+                raise diagnostics.error(ExOpStatus.ERROR_CODE_1.value)